@@ -6,13 +6,170 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     
     DATABASE_URL: str
+
+    # "full" creates missing tables at import and preloads the QR, imaging,
+    # numpy and Cloudinary stacks at startup; "fast" skips both so a cold start
+    # never touches the database (Alembic owns the schema) and heavy modules
+    # load on first use. "auto" picks fast on Vercel, full elsewhere.
+    STARTUP_MODE: str = "auto"
+
+    # Connection pool profile: "pooled" (long-running workers), "serverless"
+    # (NullPool, pgbouncer friendly) or "auto" (serverless when running on Vercel).
+    # Size/overflow are per worker process: with gunicorn -w 4 the defaults
+    # allow up to 4 * (5 + 5) connections.
+    DB_POOL_PROFILE: str = "auto"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT: int = 10
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    # Optional read replicas (comma-separated URLs) for routes that depend on
+    # get_read_db. A replica lagging more than DB_REPLICA_MAX_LAG_SECONDS, or
+    # failing its lag check, is skipped until the next check and reads fall
+    # back to the primary.
+    DATABASE_REPLICA_URLS: str = ""
+    DB_REPLICA_MAX_LAG_SECONDS: float = 5.0
+    DB_REPLICA_LAG_CHECK_INTERVAL: float = 10.0
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+
+    # In-process cache of authenticated users (see app/core/principal_cache.py)
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_SIZE: int = 4096
+
+    # Password hashing runs in a dedicated process pool (0 workers = threadpool).
+    # PASSWORD_HASH_ROUNDS overrides the pbkdf2_sha256 cost; pick it with
+    # benchmark_password_hashing.py. Stored hashes with fewer rounds are
+    # transparently rehashed on the next successful login.
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+    PASSWORD_HASH_ROUNDS: Optional[int] = None
+
+    # OTP storage: "sqlite" (shared by all workers on the host), "memory"
+    # (single process), "database" (the otps table on the primary DB, needed
+    # as soon as request-otp and verify-otp can reach different hosts) or
+    # "auto" (database on Vercel, sqlite elsewhere; render.yaml picks database
+    # because a Render service may run several instances)
+    OTP_STORE_BACKEND: str = "auto"
+    OTP_STORE_PATH: Optional[str] = None
+    OTP_TTL_SECONDS: int = 600
+    OTP_MAX_ATTEMPTS: int = 5
+
+    # Token-bucket rate limits for the auth router, as "burst/period_seconds".
+    # Buckets live in a host-local SQLite file ("sqlite") or per process ("memory").
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "sqlite"
+    RATE_LIMIT_STORE_PATH: Optional[str] = None
+    # Proxies in front of the app that append to X-Forwarded-For. The per-IP
+    # bucket keys on the entry that many hops from the right, the one the
+    # outermost trusted proxy wrote; entries left of it are client supplied.
+    # 0 uses the connection's peer address. Unset: 1 on Vercel, else 0
+    # (render.yaml sets 1 for Render's load balancer).
+    RATE_LIMIT_TRUSTED_PROXY_HOPS: Optional[int] = None
+    RATE_LIMIT_PER_IP: str = "60/60"
+    RATE_LIMIT_LOGIN: str = "10/300"
+    RATE_LIMIT_OTP_REQUEST: str = "5/600"
+    RATE_LIMIT_OTP_VERIFY: str = "10/600"
+
+    # Idempotency-Key replay for retried uploads and writes (check-in,
+    # check-out, selfie and document uploads, profile verification). Stored
+    # responses live for the TTL; a key stays locked for at most LOCK_SECONDS
+    # while its first request runs, and a concurrent duplicate waits up to
+    # WAIT_SECONDS for that request's response.
+    IDEMPOTENCY_ENABLED: bool = True
+    IDEMPOTENCY_BACKEND: str = "sqlite"
+    IDEMPOTENCY_STORE_PATH: Optional[str] = None
+    IDEMPOTENCY_TTL_SECONDS: int = 24 * 3600
+    IDEMPOTENCY_LOCK_SECONDS: int = 120
+    IDEMPOTENCY_WAIT_SECONDS: float = 10.0
+
+    # Bulk user import (POST /admin/users/import and import_users.py).
+    # Hash workers default to the number of CPUs.
+    BULK_IMPORT_CHUNK_SIZE: int = 1000
+    BULK_IMPORT_HASH_WORKERS: Optional[int] = None
+    BULK_IMPORT_MAX_ROWS: int = 50000
+
+    # Visit history (archive_visits.py). Closed visits whose check-in is older
+    # than the horizon move to visits_archive and are only listed with
+    # include_archive. On PostgreSQL visits is partitioned by check-in month;
+    # the job keeps partitions created this many months ahead.
+    VISIT_ARCHIVE_AFTER_DAYS: int = 180
+    VISIT_ARCHIVE_BATCH_SIZE: int = 5000
+    VISIT_PARTITION_MONTHS_AHEAD: int = 3
+    # GET /visits page size (limit query parameter) default and maximum
+    VISITS_PAGE_SIZE: int = 100
+    VISITS_PAGE_SIZE_MAX: int = 500
+    # Rows fetched per round trip by the server-side cursor of GET /visits/export
+    VISIT_EXPORT_BATCH_SIZE: int = 1000
+    # POST /visits/sync: queued events per request, how far a device clock may
+    # run ahead, and the oldest event accepted. Idempotency keys and selfie
+    # references live as long as that age, so an expired key can't be replayed.
+    VISIT_SYNC_MAX_EVENTS: int = 200
+    VISIT_SYNC_MAX_CLOCK_SKEW_SECONDS: int = 300
+    VISIT_SYNC_MAX_EVENT_AGE_DAYS: int = 30
+    # Largest inline selfie (decoded) accepted by POST /visits/sync
+    VISIT_SYNC_MAX_SELFIE_BYTES: int = 5 * 1024 * 1024
+    # GET /visits/occupancy answers from per-company counters in memory. This
+    # worker's check-ins and check-outs update them as they commit; a recount
+    # from the open-visits index, at most this many seconds apart, picks up
+    # the other workers' writes and anything closed outside the API.
+    OCCUPANCY_REFRESH_SECONDS: int = 60
+    # close_open_visits.py checks out visits still open this long after
+    # check-in, at check-in + horizon, in batches of this many visits
+    VISIT_AUTO_CLOSE_AFTER_HOURS: int = 24
+    VISIT_AUTO_CLOSE_BATCH_SIZE: int = 500
     
     CLOUDINARY_CLOUD_NAME: Optional[str] = None
     CLOUDINARY_API_KEY: Optional[str] = None
     CLOUDINARY_API_SECRET: Optional[str] = None
+    # Store "uploads" as files under this directory instead of sending them to
+    # Cloudinary, optionally after a delay that mimics its latency (tests, benchmarks)
+    CLOUDINARY_FAKE_DIR: Optional[str] = None
+    CLOUDINARY_FAKE_LATENCY_SECONDS: float = 0.0
+
+    # Photos are normalized before upload (image_service): format sniffed,
+    # auto-oriented, EXIF stripped, downscaled to fit the max dimension and
+    # re-encoded as IMAGE_FORMAT ("jpeg" or "webp") at IMAGE_QUALITY. This runs
+    # in a process pool; IMAGE_WORKERS=0 uses the threadpool instead.
+    IMAGE_NORMALIZE_ENABLED: bool = True
+    IMAGE_FORMAT: str = "jpeg"
+    IMAGE_QUALITY: int = 80
+    SELFIE_MAX_DIMENSION: int = 1280
+    DOCUMENT_MAX_DIMENSION: int = 2048
+    IMAGE_WORKERS: int = 2
+    IMAGE_MAX_QUEUE: int = 64
+
+    # Check-in/check-out selfies. Long-running deployments with a persistent
+    # SELFIE_SPOOL_DIR (one that survives restarts and redeploys, e.g. a Render
+    # disk) spool the image there and answer at once; background workers
+    # upload it, retrying with exponential backoff from
+    # SELFIE_UPLOAD_RETRY_SECONDS, and fill in the visit's selfie URL. Without
+    # a spool directory, and on fast-startup (serverless) deployments,
+    # selfies are uploaded inline.
+    SELFIE_UPLOAD_ASYNC: bool = True
+    SELFIE_SPOOL_DIR: Optional[str] = None
+    SELFIE_UPLOAD_WORKERS: int = 4
+    SELFIE_UPLOAD_MAX_ATTEMPTS: int = 8
+    SELFIE_UPLOAD_RETRY_SECONDS: float = 5.0
+    # How often workers look for due retries and uploads left behind by a restart
+    SELFIE_UPLOAD_SWEEP_SECONDS: float = 30.0
+    # How long shutdown waits for queued uploads to finish
+    SELFIE_UPLOAD_DRAIN_SECONDS: float = 20.0
+
+    # Per-request SQL statement counts and timing (Server-Timing header).
+    # A statement repeated this many times in one request is logged as a likely N+1.
+    SQL_INSTRUMENTATION_ENABLED: bool = True
+    SQL_LOG_REQUESTS: bool = False
+    SQL_N_PLUS_ONE_THRESHOLD: int = 5
+
+    # Max coordinates accepted by POST /visits/detect-company/batch
+    COMPANY_DETECTION_BATCH_LIMIT: int = 10000
+    # Each worker's company location index reloads fully this often, to pick
+    # up locations edited or deleted since; new ones are picked up at once
+    COMPANY_LOCATION_RELOAD_SECONDS: int = 600
     
     class Config:
         env_file = ".env"
@@ -1,21 +1,291 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import List, Optional
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import NullPool
 from app.core.config import settings
+from app.core.pool_metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool, instrument
 
+logger = logging.getLogger(__name__)
 
-# Fix for Render/Heroku using postgres:// which is deprecated in SQLAlchemy
-db_url = settings.DATABASE_URL
-if db_url and db_url.startswith("postgres://"):
-    db_url = db_url.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(db_url)
+def normalize_url(url: str) -> str:
+    # Fix for Render/Heroku using postgres:// which is deprecated in SQLAlchemy
+    if url and url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+db_url = normalize_url(settings.DATABASE_URL)
+
+
+def resolve_pool_profile() -> str:
+    profile = settings.DB_POOL_PROFILE
+    if profile == "auto":
+        # Vercel sets VERCEL=1 in every function invocation
+        profile = "serverless" if os.environ.get("VERCEL") else "pooled"
+    return profile
+
+
+def engine_options(url: str, name: str, is_async: bool = False) -> dict:
+    """
+    create_engine keyword arguments for the active pool profile.
+
+    pooled:     long-running workers (gunicorn on Render). A bounded QueuePool
+                per worker with pre-ping and recycling so connections dropped
+                by the server or a proxy are replaced transparently.
+    serverless: short-lived function instances (Vercel). NullPool opens a
+                connection per checkout and closes it on return, leaving
+                pooling to an external pgbouncer in transaction mode.
+    """
+    if url.startswith("sqlite"):
+        return {}
+    if resolve_pool_profile() == "serverless":
+        options = {"poolclass": NullPool, "pool_logging_name": name}
+        if is_async:
+            # asyncpg's prepared statement cache breaks behind pgbouncer in transaction mode
+            options["connect_args"] = {"statement_cache_size": 0}
+        return options
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        "pool_logging_name": name,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+engine = create_engine(db_url, **engine_options(db_url, "primary"))
+instrument(engine, "primary")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# Set once a session has sent INSERT/UPDATE/DELETE statements that are not
+# committed yet, so a unit of work can skip the COMMIT for read-only requests.
+_WRITES_KEY = "unit_of_work_has_writes"
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flushed_writes(session, flush_context):
+    session.info[_WRITES_KEY] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_statement_writes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info[_WRITES_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _clear_writes(session):
+    # Releasing or rolling back a savepoint fires these too; only the outer transaction counts
+    if not session.in_nested_transaction():
+        session.info.pop(_WRITES_KEY, None)
+
+
+@contextmanager
+def unit_of_work(session_factory=None):
+    """
+    Session whose pending changes are flushed and committed once on exit, or
+    rolled back if the block raises. Services only flush; use this from
+    scripts that call them outside a request.
+    """
+    db = (session_factory or SessionLocal)()
+    try:
+        yield db
+        db.flush()
+        if db.info.get(_WRITES_KEY):
+            db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
 def get_db():
-    db = SessionLocal()
+    """
+    Request-scoped unit of work. Declare it with
+    ``Depends(database.get_db, scope="function")`` so the commit runs before the
+    response is sent and a failed commit becomes an error response.
+    """
+    with unit_of_work() as db:
+        yield db
+
+
+# Seconds the replica is behind the primary. Zero when it has replayed
+# everything it received, so an idle primary doesn't look like lag.
+PG_REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = create_engine(url, **engine_options(url, name))
+        instrument(self.engine, name)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.lag_seconds: Optional[float] = None
+        self.healthy = False
+        self.checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def _measure_lag(self) -> float:
+        with self.engine.connect() as conn:
+            if self.engine.dialect.name == "postgresql":
+                return float(conn.execute(PG_REPLICA_LAG_SQL).scalar() or 0.0)
+            # Other backends have no replication lag to report; just check it answers
+            conn.execute(text("SELECT 1"))
+            return 0.0
+
+    def refresh(self, now: float):
+        # Only one request per interval pays for the check; others use the last result
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if now - self.checked_at < settings.DB_REPLICA_LAG_CHECK_INTERVAL:
+                return
+            try:
+                self.lag_seconds = self._measure_lag()
+                healthy = self.lag_seconds <= settings.DB_REPLICA_MAX_LAG_SECONDS
+                # Logged when the state changes, not on every check
+                first = self.checked_at == float("-inf")
+                if not healthy and (self.healthy or first):
+                    logger.warning("Read replica %s is %.1f s behind the primary; reading from the primary",
+                                   self.name, self.lag_seconds)
+                elif healthy and not self.healthy and not first:
+                    logger.info("Read replica %s caught up (%.1f s behind)", self.name, self.lag_seconds)
+                self.healthy = healthy
+            except Exception as e:
+                logger.warning("Read replica %s failed its lag check: %s", self.name, e)
+                self.lag_seconds, self.healthy = None, False
+            self.checked_at = now
+        finally:
+            self._lock.release()
+
+    def is_usable(self) -> bool:
+        now = time.monotonic()
+        if now - self.checked_at >= settings.DB_REPLICA_LAG_CHECK_INTERVAL:
+            self.refresh(now)
+        return self.healthy
+
+    def status(self) -> dict:
+        return {"name": self.name, "healthy": self.healthy, "lag_seconds": self.lag_seconds}
+
+
+class ReplicaRouter:
+    """Round-robins read-only sessions over usable replicas, falling back to the primary."""
+
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(f"replica_{i}", url) for i, url in enumerate(urls, start=1)]
+        self._next = itertools.count()
+
+    def session(self):
+        count = len(self.replicas)
+        start = next(self._next)
+        for offset in range(count):
+            replica = self.replicas[(start + offset) % count]
+            if replica.is_usable():
+                return replica.SessionLocal()
+        return SessionLocal()
+
+
+replica_router = ReplicaRouter([
+    normalize_url(url.strip()) for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()
+])
+
+
+def get_read_db():
+    """
+    Session for read-only routes: a replica within the allowed lag, otherwise
+    the primary. Never write through it; replicas reject writes.
+    """
+    db = replica_router.session()
     try:
         yield db
     finally:
         db.close()
+
+
+def to_async_url(url: str) -> str:
+    """
+    Map a sync database URL onto its async driver: asyncpg for Postgres,
+    aiosqlite for SQLite.
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    query = dict(parsed.query)
+    # libpq-only options (e.g. Neon's connection strings) that asyncpg rejects
+    if "sslmode" in query:
+        query["ssl"] = query.pop("sslmode")
+    query.pop("channel_binding", None)
+    return parsed.set(drivername="postgresql+asyncpg", query=query).render_as_string(hide_password=False)
+
+
+# The async engine is created on first use so the sync-only code paths
+# (scripts, migrations) never need asyncpg installed.
+_async_engine = None
+_AsyncSessionLocal = None
+_async_lock = threading.Lock()
+
+
+def get_async_sessionmaker():
+    global _async_engine, _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        with _async_lock:
+            if _AsyncSessionLocal is None:
+                from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+                async_url = to_async_url(db_url)
+                _async_engine = create_async_engine(async_url, **engine_options(async_url, "primary_async", is_async=True))
+                instrument(_async_engine.sync_engine, "primary_async")
+                # Objects stay usable after commit; async sessions cannot lazy-load expired attributes
+                _AsyncSessionLocal = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _AsyncSessionLocal
+
+
+def get_async_engine():
+    get_async_sessionmaker()
+    return _async_engine
+
+
+@asynccontextmanager
+async def async_unit_of_work():
+    """AsyncSession counterpart of unit_of_work."""
+    async with get_async_sessionmaker()() as db:
+        try:
+            yield db
+            await db.flush()
+            if db.info.get(_WRITES_KEY):
+                await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+
+
+async def get_async_db():
+    """Async request-scoped unit of work; declare it with ``scope="function"`` like get_db."""
+    async with async_unit_of_work() as db:
+        yield db
+
+
+async def dispose_async_engine():
+    global _async_engine, _AsyncSessionLocal
+    engine, _async_engine, _AsyncSessionLocal = _async_engine, None, None
+    if engine is not None:
+        await engine.dispose()
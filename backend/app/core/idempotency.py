@@ -0,0 +1,315 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+from jose import JWTError, jwt
+from app.core import local_store
+from app.core.config import settings
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+REPLAYED_HEADER = b"idempotent-replayed"
+MAX_KEY_LENGTH = 255
+
+# POST endpoints whose retries must not repeat the upload and the write.
+# Paths are relative to API_V1_STR.
+IDEMPOTENT_PATHS = (
+    r"/visits/check-in",
+    r"/visits/\d+/check-out",
+    r"/visits/selfies",
+    r"/documents/upload",
+    r"/vendors/me/verify",
+)
+
+# Per-request response headers that must not be replayed
+_UNCACHED_HEADERS = {b"server-timing", b"set-cookie"}
+
+
+class IdempotencyRecord(NamedTuple):
+    fingerprint: str
+    # None while the first request is still running
+    status: Optional[int]
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+
+class MemoryIdempotencyStore:
+    """Per-process records, bounded to ``max_keys`` with LRU eviction."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._records: "OrderedDict[str, Tuple[IdempotencyRecord, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, key: str, fingerprint: str, now: float) -> Optional[IdempotencyRecord]:
+        with self._lock:
+            entry = self._records.get(key)
+            if entry is not None and entry[1] >= now:
+                self._records.move_to_end(key)
+                return entry[0]
+            self._records[key] = (IdempotencyRecord(fingerprint, None, [], b""), now + settings.IDEMPOTENCY_LOCK_SECONDS)
+            self._records.move_to_end(key)
+            if len(self._records) > self.max_keys:
+                self._records.popitem(last=False)
+            return None
+
+    def complete(self, key: str, fingerprint: str, status: int, headers, body: bytes, now: float):
+        with self._lock:
+            entry = self._records.get(key)
+            if entry is not None and entry[0].fingerprint == fingerprint and entry[0].status is None:
+                self._records[key] = (IdempotencyRecord(fingerprint, status, list(headers), body),
+                                      now + settings.IDEMPOTENCY_TTL_SECONDS)
+
+    def release(self, key: str, fingerprint: str):
+        with self._lock:
+            entry = self._records.get(key)
+            if entry is not None and entry[0].fingerprint == fingerprint and entry[0].status is None:
+                del self._records[key]
+
+
+class SQLiteIdempotencyStore:
+    """
+    Records in a local SQLite file shared by all workers on the host.
+
+    Claiming a key is one atomic UPSERT ... RETURNING: it inserts the
+    in-flight record, or takes over one that expired, and returns nothing if
+    another request holds the key. Losing the file only means a retry runs
+    again, so there are no fsyncs.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        key TEXT PRIMARY KEY,
+        fingerprint TEXT NOT NULL,
+        status INTEGER,
+        headers TEXT,
+        body BLOB,
+        expires_at REAL NOT NULL
+    ) WITHOUT ROWID;
+    """
+
+    CLAIM_SQL = """
+    INSERT INTO idempotency_keys (key, fingerprint, status, headers, body, expires_at)
+    VALUES (:key, :fingerprint, NULL, NULL, NULL, :lock_until)
+    ON CONFLICT(key) DO UPDATE SET
+        fingerprint = excluded.fingerprint, status = NULL, headers = NULL, body = NULL,
+        expires_at = excluded.expires_at
+    WHERE expires_at < :now
+    RETURNING key
+    """
+
+    PURGE_INTERVAL_SECONDS = 300
+
+    def __init__(self, path: str):
+        self.path = path
+        self._last_purge = 0.0
+
+    def _conn(self):
+        return local_store.get_connection(self.path, self.SCHEMA, durable=False)
+
+    def claim(self, key: str, fingerprint: str, now: float) -> Optional[IdempotencyRecord]:
+        conn = self._conn()
+        if now - self._last_purge >= self.PURGE_INTERVAL_SECONDS:
+            self._last_purge = now
+            conn.execute("DELETE FROM idempotency_keys WHERE expires_at < ?", (now,))
+        params = {"key": key, "fingerprint": fingerprint, "now": now,
+                  "lock_until": now + settings.IDEMPOTENCY_LOCK_SECONDS}
+        while True:
+            if conn.execute(self.CLAIM_SQL, params).fetchone() is not None:
+                return None
+            row = conn.execute(
+                "SELECT fingerprint, status, headers, body FROM idempotency_keys WHERE key = ?", (key,)
+            ).fetchone()
+            # Gone between the two statements (released or purged): claim again
+            if row is not None:
+                fingerprint, status, headers, body = row
+                headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in json.loads(headers or "[]")]
+                return IdempotencyRecord(fingerprint, status, headers, body or b"")
+
+    def complete(self, key: str, fingerprint: str, status: int, headers, body: bytes, now: float):
+        encoded = json.dumps([(k.decode("latin-1"), v.decode("latin-1")) for k, v in headers])
+        self._conn().execute(
+            "UPDATE idempotency_keys SET status = ?, headers = ?, body = ?, expires_at = ? "
+            "WHERE key = ? AND fingerprint = ? AND status IS NULL",
+            (status, encoded, body, now + settings.IDEMPOTENCY_TTL_SECONDS, key, fingerprint),
+        )
+
+    def release(self, key: str, fingerprint: str):
+        self._conn().execute(
+            "DELETE FROM idempotency_keys WHERE key = ? AND fingerprint = ? AND status IS NULL", (key, fingerprint)
+        )
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if settings.IDEMPOTENCY_BACKEND == "memory":
+                    _store = MemoryIdempotencyStore()
+                elif settings.IDEMPOTENCY_BACKEND == "sqlite":
+                    _store = SQLiteIdempotencyStore(
+                        settings.IDEMPOTENCY_STORE_PATH or local_store.default_path("vms_idempotency.sqlite3")
+                    )
+                else:
+                    raise ValueError(f"Unknown IDEMPOTENCY_BACKEND: {settings.IDEMPOTENCY_BACKEND}")
+    return _store
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+def _principal(scope) -> Optional[str]:
+    """User id of the bearer token, checked like get_current_user does but without the database."""
+    authorization = _header(scope, b"authorization") or b""
+    scheme, _, token = authorization.decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    principal = claims.get("uid") or claims.get("sub")
+    return str(principal) if principal is not None else None
+
+
+def fingerprint(scope, body: bytes) -> str:
+    """Hash of what the request asks for. Multipart boundaries are random per attempt, so they are left out."""
+    content_type = (_header(scope, b"content-type") or b"").decode("latin-1")
+    boundary = re.search(r"boundary=\"?([^\";]+)", content_type)
+    if boundary:
+        body = body.replace(boundary.group(1).encode("latin-1"), b"")
+        content_type = content_type[:boundary.start()]
+    digest = hashlib.sha256()
+    for part in (scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"), content_type):
+        digest.update(part.encode() + b"\0")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+async def _send_response(send, status: int, headers, body: bytes):
+    await send({"type": "http.response.start", "status": status, "headers": list(headers)})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_error(send, status: int, detail: str, headers=()):
+    body = json.dumps({"detail": detail}).encode()
+    await _send_response(send, status, [(b"content-type", b"application/json"),
+                                        (b"content-length", str(len(body)).encode()), *headers], body)
+
+
+class IdempotencyMiddleware:
+    """
+    Pure ASGI middleware that makes retries of IDEMPOTENT_PATHS safe. A POST
+    carrying an ``Idempotency-Key`` header is recorded under (user, key) with
+    a fingerprint of the request. A retry with the same key gets the stored
+    response back, marked ``Idempotent-Replayed: true``, before the route runs
+    any query or upload. The same key with a different request is a 422.
+
+    While the first request runs, the key is locked (for at most
+    IDEMPOTENCY_LOCK_SECONDS, in case the worker dies). A concurrent duplicate
+    waits for its result up to IDEMPOTENCY_WAIT_SECONDS, then gets a 409 to
+    retry. Only 2xx responses are stored; after an error the key is released
+    so the client's retry runs again.
+    """
+
+    POLL_SECONDS = 0.05
+
+    def __init__(self, app, store=None):
+        self.app = app
+        self.store = store
+        self.paths = re.compile("|".join(f"{re.escape(settings.API_V1_STR)}{path}/?" for path in IDEMPOTENT_PATHS))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not self.paths.fullmatch(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        key = _header(scope, IDEMPOTENCY_HEADER)
+        principal = _principal(scope) if key else None
+        if principal is None:
+            # No key, or no valid token: the route answers (401 for the latter) as usual
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await _send_error(send, 400, f"Idempotency-Key is longer than {MAX_KEY_LENGTH} characters")
+            return
+
+        body = await _read_body(receive)
+        store = self.store or get_store()
+        store_key = f"{principal}:{key.decode('latin-1')}"
+        request_fingerprint = fingerprint(scope, body)
+
+        # Local SQLite statements take microseconds; no need to leave the event loop
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            record = store.claim(store_key, request_fingerprint, time.time())
+            if record is None:
+                break
+            if record.fingerprint != request_fingerprint:
+                await _send_error(send, 422, "Idempotency-Key was already used for a different request")
+                return
+            if record.status is not None:
+                await _send_response(send, record.status, record.headers + [(REPLAYED_HEADER, b"true")], record.body)
+                return
+            if time.monotonic() >= deadline:
+                await _send_error(send, 409, "A request with this Idempotency-Key is still in progress",
+                                  [(b"retry-after", b"1")])
+                return
+            await asyncio.sleep(self.POLL_SECONDS)
+
+        await self._run(scope, receive, send, store, store_key, request_fingerprint, body)
+
+    async def _run(self, scope, receive, send, store, store_key, request_fingerprint, body):
+        sent_body = False
+
+        async def replay_receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        response = {"status": None, "headers": [], "body": []}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [(k.lower(), v) for k, v in message.get("headers", [])
+                                       if k.lower() not in _UNCACHED_HEADERS]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            store.release(store_key, request_fingerprint)
+            raise
+        if response["status"] is not None and 200 <= response["status"] < 300:
+            store.complete(store_key, request_fingerprint, response["status"], response["headers"],
+                           b"".join(response["body"]), time.time())
+        else:
+            store.release(store_key, request_fingerprint)
@@ -0,0 +1,38 @@
+import os
+import sqlite3
+import tempfile
+import threading
+from typing import Optional
+
+# Small on-host SQLite databases for hot, short-lived state (OTP codes, rate
+# limit buckets, ...). A file on local disk is shared by every gunicorn worker
+# on the host without a network round trip; WAL mode lets readers and the
+# single writer proceed concurrently.
+
+_local = threading.local()
+
+
+def default_path(filename: str) -> str:
+    return os.path.join(tempfile.gettempdir(), filename)
+
+
+def get_connection(path: str, schema: Optional[str] = None, durable: bool = True) -> sqlite3.Connection:
+    """
+    Return this thread's connection to ``path``, creating it (and ``schema``) on first use.
+
+    Connections run in autocommit mode; callers that need atomic read-modify-write
+    wrap it in ``BEGIN IMMEDIATE`` / ``COMMIT``. Stores whose contents are
+    disposable pass ``durable=False`` to skip fsyncs entirely.
+    """
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL" if durable else "PRAGMA synchronous=OFF")
+        if schema:
+            conn.executescript(schema)
+        connections[path] = conn
+    return conn
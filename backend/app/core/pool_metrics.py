@@ -0,0 +1,115 @@
+import threading
+import time
+from typing import Dict
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class PoolMetrics:
+    """Counters for one connection pool, fed by pool events and InstrumentedQueuePool."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def incr(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.wait_seconds_total * 1000 / self.waits, 3) if self.waits else 0.0,
+                "max_wait_ms": round(self.wait_seconds_max * 1000, 3),
+            }
+
+
+_registry: Dict[str, PoolMetrics] = {}
+_registry_lock = threading.Lock()
+
+
+def get_metrics(name: str) -> PoolMetrics:
+    with _registry_lock:
+        metrics = _registry.get(name)
+        if metrics is None:
+            metrics = _registry[name] = PoolMetrics(name)
+        return metrics
+
+
+class _TimedCheckoutMixin:
+    """
+    Times how long each checkout waits for a connection.
+
+    Metrics are looked up by the pool's logging name, which survives
+    ``engine.dispose()`` recreating the pool.
+    """
+
+    def _do_get(self):
+        metrics = get_metrics(self._orig_logging_name or "default")
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            metrics.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        metrics.record_wait(time.perf_counter() - start)
+        return conn
+
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument(engine: Engine, name: str) -> PoolMetrics:
+    """
+    Attach event listeners that feed the named PoolMetrics from ``engine``'s pool.
+    For an AsyncEngine pass its ``sync_engine``.
+    """
+    metrics = get_metrics(name)
+    event.listen(engine, "connect", lambda *args: metrics.incr("connects"))
+    event.listen(engine, "checkout", lambda *args: metrics.incr("checkouts"))
+    event.listen(engine, "checkin", lambda *args: metrics.incr("checkins"))
+    event.listen(engine, "invalidate", lambda *args: metrics.incr("invalidations"))
+    return metrics
+
+
+def pool_status(engine: Engine, name: str) -> Dict:
+    """Current pool occupancy plus the cumulative counters for ``engine``."""
+    pool = engine.pool
+    status = {"name": name, "pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+        })
+    status.update(get_metrics(name).snapshot())
+    return status
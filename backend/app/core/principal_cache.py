@@ -0,0 +1,66 @@
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app.core.config import settings
+from app.models.user import User
+from app.utils.ttl_cache import TTLCache
+
+# Columns snapshotted for an authenticated principal. The password hash is
+# deliberately left out; nothing downstream of get_current_user needs it.
+PRINCIPAL_FIELDS = ("id", "email", "full_name", "phone_number", "is_active", "is_superuser", "role", "created_at")
+
+# Per-process cache of active users keyed by user id. Entries are dropped
+# explicitly when a user row changes and otherwise expire after the TTL, which
+# also bounds how stale another gunicorn worker's copy can get.
+_cache = TTLCache(settings.PRINCIPAL_CACHE_MAX_SIZE, settings.PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+def get(user_id: int) -> Optional[User]:
+    """
+    Return a detached User rebuilt from the cached snapshot, or None on a miss.
+
+    A fresh instance is built on every hit so concurrent requests never share
+    (or mutate) the same ORM object.
+    """
+    snapshot = _cache.get(user_id)
+    if snapshot is None:
+        return None
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return user
+
+
+def put(user: User):
+    _cache.set(user.id, {field: getattr(user, field) for field in PRINCIPAL_FIELDS})
+
+
+def invalidate(user_id: int):
+    _cache.delete(user_id)
+
+
+def clear():
+    _cache.clear()
+
+
+# Drop cached principals whenever a users row is updated or deleted through the
+# ORM (profile edits in vendor_service.update_vendor, auth_service.reset_password,
+# ...). Ids are collected at flush time and invalidated once the commit lands.
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    changed = [obj.id for obj in list(session.dirty) + list(session.deleted) if isinstance(obj, User)]
+    if changed:
+        session.info.setdefault("principal_cache_invalidations", set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    if session.in_nested_transaction():
+        return
+    for user_id in session.info.pop("principal_cache_invalidations", ()):
+        invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session):
+    if not session.in_nested_transaction():
+        session.info.pop("principal_cache_invalidations", None)
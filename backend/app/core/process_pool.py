@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict
+from fastapi.concurrency import run_in_threadpool
+
+
+class PoolSaturatedError(Exception):
+    """Raised when a pool's queue is full and the task was not accepted."""
+
+
+def _timed_call(fn: Callable, args: tuple):
+    # Runs inside the worker process; reports pure execution time so the
+    # parent can split total latency into queue wait and run time.
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class BoundedProcessPool:
+    """
+    Process pool with a bounded queue and its own metrics.
+
+    CPU-heavy work submitted here runs in separate processes, so it neither
+    holds the GIL of the web worker nor occupies AnyIO threadpool tokens while
+    it waits. At most ``max_workers + max_queue`` tasks are outstanding; beyond
+    that ``PoolSaturatedError`` is raised so callers can shed load.
+
+    With ``max_workers == 0`` tasks run in the threadpool instead, which is the
+    safer choice on platforms that cannot fork worker processes.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "total_seconds": 0.0,
+            "queue_wait_seconds": 0.0,
+            "max_seconds": 0.0,
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use so importing the app never forks processes
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _acquire(self):
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._stats["rejected"] += 1
+                raise PoolSaturatedError(f"{self.name} pool is saturated")
+            self._in_flight += 1
+            self._stats["submitted"] += 1
+
+    def _release(self, started: float, exec_seconds: float, ok: bool):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._in_flight -= 1
+            self._stats["completed" if ok else "failed"] += 1
+            self._stats["total_seconds"] += elapsed
+            self._stats["queue_wait_seconds"] += max(elapsed - exec_seconds, 0.0)
+            self._stats["max_seconds"] = max(self._stats["max_seconds"], elapsed)
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run ``fn(*args)`` in the pool and await the result."""
+        self._acquire()
+        started = time.perf_counter()
+        exec_seconds = 0.0
+        ok = False
+        try:
+            if self.max_workers > 0:
+                future = self._get_executor().submit(_timed_call, fn, args)
+                result, exec_seconds = await asyncio.wrap_future(future)
+            else:
+                result, exec_seconds = await run_in_threadpool(_timed_call, fn, args)
+            ok = True
+            return result
+        finally:
+            self._release(started, exec_seconds, ok)
+
+    def run_sync(self, fn: Callable, *args) -> Any:
+        """Blocking variant of ``run`` for scripts and sync code paths."""
+        self._acquire()
+        started = time.perf_counter()
+        exec_seconds = 0.0
+        ok = False
+        try:
+            if self.max_workers > 0:
+                result, exec_seconds = self._get_executor().submit(_timed_call, fn, args).result()
+            else:
+                result, exec_seconds = _timed_call(fn, args)
+            ok = True
+            return result
+        finally:
+            self._release(started, exec_seconds, ok)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            in_flight = self._in_flight
+        finished = stats["completed"] + stats["failed"]
+        return {
+            "name": self.name,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": in_flight,
+            "queue_depth": max(in_flight - self.max_workers, 0),
+            "submitted": stats["submitted"],
+            "completed": stats["completed"],
+            "failed": stats["failed"],
+            "rejected": stats["rejected"],
+            "avg_latency_ms": round(stats["total_seconds"] * 1000 / finished, 3) if finished else 0.0,
+            "avg_queue_wait_ms": round(stats["queue_wait_seconds"] * 1000 / finished, 3) if finished else 0.0,
+            "max_latency_ms": round(stats["max_seconds"] * 1000, 3),
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,170 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException, Request, status
+from app.core import local_store
+from app.core.config import settings
+
+
+def parse_limit(limit: str) -> Tuple[float, float]:
+    """
+    Parse a "capacity/period_seconds" limit into (capacity, refill tokens per second).
+
+    "10/60" allows a burst of 10 requests and refills the bucket over 60 seconds.
+    """
+    capacity, period = limit.split("/")
+    capacity = float(capacity)
+    return capacity, capacity / float(period)
+
+
+class MemoryBucketStore:
+    """Per-process token buckets, bounded to ``max_keys`` with LRU eviction."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> Tuple[bool, float]:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [capacity, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            allowed = tokens >= 1
+            bucket[0] = tokens - 1 if allowed else tokens
+            bucket[1] = now
+            return allowed, bucket[0]
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets in a local SQLite file shared by all workers on the host.
+
+    Each take is a single atomic UPSERT ... RETURNING statement, so there is no
+    read-modify-write race between workers and only one round trip into SQLite.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+        key TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        allowed INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    """
+
+    TAKE_SQL = """
+    INSERT INTO rate_limit_buckets (key, tokens, updated_at, allowed) VALUES (:key, :capacity - 1, :now, 1)
+    ON CONFLICT(key) DO UPDATE SET
+        allowed = MIN(:capacity, tokens + (:now - updated_at) * :rate) >= 1,
+        tokens = MIN(:capacity, tokens + (:now - updated_at) * :rate)
+                 - (MIN(:capacity, tokens + (:now - updated_at) * :rate) >= 1),
+        updated_at = :now
+    RETURNING allowed, tokens
+    """
+
+    # Idle buckets older than this are purged so the table stays small
+    PURGE_AFTER_SECONDS = 3600
+    PURGE_INTERVAL_SECONDS = 300
+
+    def __init__(self, path: str):
+        self.path = path
+        self._last_purge = 0.0
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> Tuple[bool, float]:
+        # Losing buckets on a host crash only resets limits, so skip fsyncs
+        conn = local_store.get_connection(self.path, self.SCHEMA, durable=False)
+        allowed, tokens = conn.execute(
+            self.TAKE_SQL, {"key": key, "capacity": capacity, "rate": rate, "now": now}
+        ).fetchone()
+        if now - self._last_purge >= self.PURGE_INTERVAL_SECONDS:
+            self._last_purge = now
+            conn.execute("DELETE FROM rate_limit_buckets WHERE updated_at < ?", (now - self.PURGE_AFTER_SECONDS,))
+        return bool(allowed), tokens
+
+
+class RateLimiter:
+    def __init__(self, store):
+        self.store = store
+        self._limits: Dict[str, Tuple[float, float]] = {}
+
+    def _parsed(self, limit: str) -> Tuple[float, float]:
+        parsed = self._limits.get(limit)
+        if parsed is None:
+            parsed = self._limits[limit] = parse_limit(limit)
+        return parsed
+
+    def hit(self, scope: str, identity: str, limit: str):
+        """Consume one token for ``identity`` in ``scope``; raise 429 if the bucket is empty."""
+        capacity, rate = self._parsed(limit)
+        allowed, tokens = self.store.take(f"{scope}:{identity}", capacity, rate, time.time())
+        if not allowed:
+            retry_after = max(1, math.ceil((1 - tokens) / rate))
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please try again later",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                if settings.RATE_LIMIT_BACKEND == "memory":
+                    store = MemoryBucketStore()
+                elif settings.RATE_LIMIT_BACKEND == "sqlite":
+                    store = SQLiteBucketStore(settings.RATE_LIMIT_STORE_PATH or local_store.default_path("vms_rate_limit.sqlite3"))
+                else:
+                    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {settings.RATE_LIMIT_BACKEND}")
+                _limiter = RateLimiter(store)
+    return _limiter
+
+
+def trusted_proxy_hops() -> int:
+    hops = settings.RATE_LIMIT_TRUSTED_PROXY_HOPS
+    if hops is None:
+        hops = 1 if os.environ.get("VERCEL") else 0
+    return hops
+
+
+def client_ip(request: Request) -> str:
+    """
+    Address the per-IP bucket is keyed on. Each trusted proxy appends the
+    address it received the request from to X-Forwarded-For, so only the
+    last ``hops`` entries can be trusted; anything left of them is whatever
+    the client sent and would give it a fresh bucket per request.
+    """
+    hops = trusted_proxy_hops()
+    if hops:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            entries = [entry.strip() for entry in forwarded.split(",")]
+            # Fewer entries than proxies: take the outermost one present
+            return entries[-min(hops, len(entries))]
+    return request.client.host if request.client else "unknown"
+
+
+def limit_by_ip(request: Request):
+    """Router dependency: per-client-IP bucket shared by every endpoint of the router."""
+    if settings.RATE_LIMIT_ENABLED:
+        get_limiter().hit("ip", client_ip(request), settings.RATE_LIMIT_PER_IP)
+
+
+def limit_by_identifier(scope: str, identifier: str, limit: str):
+    """Per-account bucket, called from handlers once the identifier is parsed from the body."""
+    if settings.RATE_LIMIT_ENABLED and identifier:
+        get_limiter().hit(scope, identifier.strip().lower(), limit)
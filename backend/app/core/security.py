@@ -1,10 +1,25 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Union
+from typing import Optional, Tuple, Union
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
+from app.core.process_pool import BoundedProcessPool
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+_rounds_config = {}
+if settings.PASSWORD_HASH_ROUNDS:
+    # Hashes below the configured cost report needs_update and get rehashed on login
+    _rounds_config = {
+        "pbkdf2_sha256__default_rounds": settings.PASSWORD_HASH_ROUNDS,
+        "pbkdf2_sha256__min_rounds": settings.PASSWORD_HASH_ROUNDS,
+    }
+
+pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto", **_rounds_config)
+
+hashing_pool = BoundedProcessPool(
+    "password_hashing",
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -12,6 +27,21 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def verify_and_update_password(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    # Returns (valid, new_hash); new_hash is set when the stored hash is outdated
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+async def verify_and_update_password_async(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    return await hashing_pool.run(verify_and_update_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    return await hashing_pool.run(get_password_hash, password)
+
+def principal_claims(user) -> dict:
+    # Claims identifying the user so get_current_user can resolve the principal
+    # from its cache without looking the email up first
+    return {"sub": user.email, "uid": user.id, "role": user.role}
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class QueryStats:
+    """Statements and database time collected for one request (or one ``count_queries`` block)."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statements issued at least ``threshold`` times: the usual signature of an N+1 loop."""
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+
+# Per-request stats follow the request context. Sync routes run in the
+# threadpool with a copy of that context, which still points at the same object.
+_current: ContextVar[Optional[QueryStats]] = ContextVar("sql_query_stats", default=None)
+
+# Process-wide collectors for count_queries(); TestClient runs the app on
+# another thread, so a context variable set by the test would not reach it.
+_collectors: List[QueryStats] = []
+_collectors_lock = threading.Lock()
+
+
+# Registered on the Engine class, so the primary, replica and async engines are all covered
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None or _collectors:
+        conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start_times")
+    if not starts:
+        return
+    seconds = time.perf_counter() - starts.pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, seconds)
+    if _collectors:
+        with _collectors_lock:
+            for collector in _collectors:
+                collector.record(statement, seconds)
+
+
+@contextmanager
+def count_queries():
+    """Collect every statement issued in this process while the block runs, e.g. around a TestClient call."""
+    stats = QueryStats()
+    with _collectors_lock:
+        _collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        with _collectors_lock:
+            _collectors.remove(stats)
+
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """
+    Fail if the block issues more than ``limit`` statements.
+
+        with assert_max_queries(3):
+            client.get("/api/v1/vendors/me", headers=auth_headers)
+    """
+    with count_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        listing = "\n".join(f"  {n}x {sql}" for sql, n in stats.statements.most_common())
+        raise AssertionError(f"Expected at most {limit} queries, got {stats.count}:\n{listing}")
+
+
+def _server_timing(stats: QueryStats) -> bytes:
+    noun = "query" if stats.count == 1 else "queries"
+    return f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} {noun}"'.encode()
+
+
+class SQLTimingMiddleware:
+    """
+    Pure ASGI middleware that counts SQL statements per request and reports them
+    in a ``Server-Timing: db;dur=<ms>;desc="<n> queries"`` response header.
+
+    The unit-of-work commit runs before the response starts, so it is included.
+    Requests issuing one statement SQL_N_PLUS_ONE_THRESHOLD times or more are
+    logged as likely N+1 queries.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", _server_timing(stats))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self._report(scope, stats)
+
+    def _report(self, scope, stats: QueryStats):
+        path = f"{scope['method']} {scope['path']}"
+        if settings.SQL_LOG_REQUESTS:
+            logger.info("%s: %d queries in %.1f ms", path, stats.count, stats.seconds * 1000)
+        for sql, n in stats.repeated(settings.SQL_N_PLUS_ONE_THRESHOLD):
+            logger.warning("Possible N+1 in %s: statement ran %d times: %s", path, n, " ".join(sql.split())[:200])
@@ -3,13 +3,13 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.core import config, security
+from app.core import config, security, principal_cache
 from app.models.user import User
 from app.schemas.token import TokenData
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{config.settings.API_V1_STR}/auth/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db, scope="function")) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -20,24 +20,37 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-        token_data = TokenData(email=email)
+        token_data = TokenData(email=email, user_id=payload.get("uid"), role=payload.get("role"))
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.email == token_data.email).first()
+    # Tokens carrying a user id are served from the principal cache when possible
+    user = None
+    if token_data.user_id is not None:
+        user = principal_cache.get(token_data.user_id)
+        if user is None:
+            user = db.query(User).filter(User.id == token_data.user_id).first()
+            if user is not None:
+                principal_cache.put(user)
+    else:
+        # Tokens issued before user id claims were added
+        user = db.query(User).filter(User.email == token_data.email).first()
+
     if user is None:
-        print(f"ERROR: User not found for email from token: {token_data.email}")
         raise credentials_exception
     
     # Verify token email matches user email
     if user.email.lower() != token_data.email.lower():
-        print(f"ERROR: Token email ({token_data.email}) doesn't match user email ({user.email})")
         raise credentials_exception
     
-    print(f"DEBUG auth: Authenticated user ID: {user.id}, Email: {user.email}, Name: {user.full_name}")
     return user
 
 def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+def get_current_admin_user(current_user: User = Depends(get_current_active_user)) -> User:
+    if not (current_user.role == "admin" or current_user.is_superuser):
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return current_user
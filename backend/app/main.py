@@ -1,14 +1,41 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.core import config, database
+from fastapi.responses import JSONResponse
+from app.core import config, database, security
+from app.core.idempotency import IdempotencyMiddleware
+from app.core.process_pool import PoolSaturatedError
+from app.core.sql_instrumentation import SQLTimingMiddleware
 from app import models
-from app.routes import auth, visit, document, profile, vendor
+from app.services import image_service, occupancy_service, selfie_upload_service
+from app.routes import auth, visit, document, profile, vendor, metrics, admin
 
 import logging
+import os
 
-# Create database tables
-# In production, use Alembic migrations
-database.Base.metadata.create_all(bind=database.engine)
+logger = logging.getLogger(__name__)
+
+# Warnings and reports of the app.* loggers (N+1 queries, replica lag,
+# selfie uploads) go to stderr next to the request log
+_app_logger = logging.getLogger("app")
+if not _app_logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(levelname)s: %(name)s: %(message)s"))
+    _app_logger.addHandler(_handler)
+    _app_logger.setLevel(logging.INFO)
+
+def resolve_startup_mode() -> str:
+    mode = config.settings.STARTUP_MODE
+    if mode == "auto":
+        mode = "fast" if os.environ.get("VERCEL") else "full"
+    return mode
+
+
+STARTUP_MODE = resolve_startup_mode()
+
+if STARTUP_MODE == "full":
+    # Create database tables
+    # In production, use Alembic migrations
+    database.Base.metadata.create_all(bind=database.engine)
 
 app = FastAPI(
     title=config.settings.PROJECT_NAME,
@@ -24,6 +51,57 @@ async def log_requests(request: Request, call_next):
     print(f"RESPONSE STATUS: {response.status_code}")
     return response
 
+@app.exception_handler(PoolSaturatedError)
+async def pool_saturated_handler(request: Request, exc: PoolSaturatedError):
+    # A worker pool queue is full; ask the client to back off instead of queueing forever
+    return JSONResponse(status_code=503, content={"detail": "Server busy, please retry"}, headers={"Retry-After": "1"})
+
+@app.on_event("startup")
+def preload_optional_stacks():
+    # Long-running workers load these once up front so the first check-in or
+    # QR request doesn't pay for the imports; fast mode leaves them lazy.
+    if STARTUP_MODE != "full":
+        return
+    from app.services.qr_code_service import qrcode_available
+    from app.utils.cloudinary_util import get_uploader
+    from app.utils.distance_engine import numpy_available
+    qrcode_available()
+    numpy_available()
+    get_uploader()
+
+@app.on_event("startup")
+def start_selfie_uploads():
+    # Background uploads need a long-lived process and a spool that survives
+    # it; serverless (fast mode) instances and those without a spool directory
+    # upload selfies inline instead
+    if STARTUP_MODE == "full" and config.settings.SELFIE_UPLOAD_ASYNC:
+        if config.settings.SELFIE_SPOOL_DIR:
+            selfie_upload_service.pipeline.start()
+        else:
+            logger.warning("SELFIE_SPOOL_DIR is not set; uploading selfies inline")
+
+@app.on_event("startup")
+def count_open_visits():
+    # Occupancy counters start from the database; fast mode counts on the
+    # first GET /visits/occupancy instead of on every cold start
+    if STARTUP_MODE == "full":
+        with database.unit_of_work() as db:
+            occupancy_service.rebuild(db)
+
+@app.on_event("shutdown")
+def shutdown_worker_pools():
+    security.hashing_pool.shutdown()
+    image_service.image_pool.shutdown()
+    selfie_upload_service.pipeline.stop()
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await database.dispose_async_engine()
+
+# Inside CORS, so replayed responses get the CORS headers of the current request
+if config.settings.IDEMPOTENCY_ENABLED:
+    app.add_middleware(IdempotencyMiddleware)
+
 # Set all CORS enabled origins
 app.add_middleware(
     CORSMiddleware,
@@ -31,13 +109,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets browser clients read the per-request DB timing, the visits page
+    # cursor and whether a response was replayed for an Idempotency-Key
+    expose_headers=["Server-Timing", "X-Next-Cursor", "Idempotent-Replayed"],
 )
 
+if config.settings.SQL_INSTRUMENTATION_ENABLED:
+    app.add_middleware(SQLTimingMiddleware)
+
 app.include_router(auth.router, prefix=f"{config.settings.API_V1_STR}/auth", tags=["auth"])
 app.include_router(profile.router, prefix=f"{config.settings.API_V1_STR}/profiles", tags=["profiles"])
 app.include_router(vendor.router, prefix=f"{config.settings.API_V1_STR}/vendors", tags=["vendors"])
 app.include_router(visit.router, prefix=f"{config.settings.API_V1_STR}/visits", tags=["visits"])
 app.include_router(document.router, prefix=f"{config.settings.API_V1_STR}/documents", tags=["documents"])
+app.include_router(admin.router, prefix=f"{config.settings.API_V1_STR}/admin", tags=["admin"])
+app.include_router(metrics.router, prefix=f"{config.settings.API_V1_STR}/metrics", tags=["metrics"])
 
 @app.get("/")
 def read_root():
@@ -6,3 +6,8 @@ from app.models.document import Document
 from app.models.soc_profile import SOCProfile
 from app.models.otp import OTP
 from app.models.company_location import CompanyLocation
+from app.models.refresh_token import RefreshToken
+from app.models.visit_archive import VisitArchive
+from app.models.visit_daily_stat import VisitDailyStat
+from app.models.visit_sync_event import VisitSyncEvent
+from app.models.selfie_upload import SelfieUpload
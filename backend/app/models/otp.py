@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Index
 from sqlalchemy.sql import func
 from app.core.database import Base
 import random
@@ -6,6 +6,7 @@ import datetime
 
 class OTP(Base):
     __tablename__ = "otps"
+    __table_args__ = (Index("ix_otps_identifier_purpose_code", "identifier", "purpose", "code"),)
 
     id = Column(Integer, primary_key=True, index=True)
     identifier = Column(String, index=True) # email or phone number
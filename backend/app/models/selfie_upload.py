@@ -0,0 +1,42 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+import enum
+
+class SelfieUploadStatus(str, enum.Enum):
+    PENDING = "pending"
+    UPLOADING = "uploading"
+    DONE = "done"
+    FAILED = "failed"
+
+class SelfieUpload(Base):
+    """
+    A check-in or check-out selfie spooled to disk and waiting for (or
+    done with) its Cloudinary upload. The visit's selfie URL is filled in
+    when the upload succeeds; see selfie_upload_service.
+    """
+    __tablename__ = "selfie_uploads"
+    __table_args__ = (
+        # Worker sweep: due pending uploads of this spool
+        Index("ix_selfie_uploads_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    # No foreign key: visits is partitioned and its primary key includes check_in_time
+    visit_id = Column(Integer, nullable=False, index=True)
+    # "check_in" or "check_out": which selfie URL column of the visit to fill in
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default=SelfieUploadStatus.PENDING.value)
+
+    # The spool file only exists in the spool directory that received the
+    # selfie; spool_host holds that directory's id (selfie_upload_service.spool_id)
+    spool_path = Column(String, nullable=False)
+    spool_host = Column(String, nullable=False)
+
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    url = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
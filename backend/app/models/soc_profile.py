@@ -13,7 +13,7 @@ class SOCProfile(Base):
     company_name = Column(String, nullable=True)
     role_type = Column(String)
     service_category = Column(String, nullable=True)
-    bluetooth_id = Column(String, nullable=True)
+    bluetooth_id = Column(String, nullable=True, index=True)
     device_id = Column(String, nullable=True)
     
     photo_url = Column(String, nullable=True)
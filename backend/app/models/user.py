@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index
 from sqlalchemy.sql import func
 from app.core.database import Base
 import enum
@@ -20,3 +20,6 @@ class User(Base):
     is_superuser = Column(Boolean, default=False)
     role = Column(String, default="vendor") # 'admin', 'vendor'
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # get_user_by_email matches case-insensitively, so emails must be unique regardless of case
+    __table_args__ = (Index("uq_users_email_lower", func.lower(email), unique=True),)
@@ -1,10 +1,24 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Text, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
 
 class Visit(Base):
+    # On PostgreSQL the table is range-partitioned by month of check_in_time
+    # (primary key (id, check_in_time)); migrations and archive_visits.py manage
+    # the partitions. Closed visits past the archive horizon live in VisitArchive.
     __tablename__ = "visits"
+    __table_args__ = (
+        # Vendor visit history, newest first
+        Index("ix_visits_vendor_id_check_in_time", "vendor_id", "check_in_time"),
+        # Keyset pages of GET /visits across all vendors
+        Index("ix_visits_check_in_time_id", "check_in_time", "id"),
+        # Open visits only: who is on site, occupancy recounts and the
+        # auto-close sweep read a few rows however long the history grows
+        Index("ix_visits_open", "check_in_time", "id",
+              postgresql_where=text("check_out_time IS NULL"), sqlite_where=text("check_out_time IS NULL"),
+              postgresql_include=["vendor_id", "visited_company"]),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     vendor_id = Column(Integer, ForeignKey("vendors.id"), nullable=False, index=True)
@@ -32,6 +46,9 @@ class Visit(Base):
     check_out_selfie_url = Column(String, nullable=True)
     
     purpose = Column(String, nullable=True)
+    # company_key() of the company visited (user-provided or detected); the
+    # vendor view matches it against the vendor's own company name
+    visited_company = Column(String, nullable=True, index=True)
     
     vendor = relationship("Vendor", back_populates="visits")
     agent = relationship("Agent", back_populates="visits")
@@ -0,0 +1,44 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class VisitArchive(Base):
+    """
+    Closed visits moved out of ``visits`` by archive_visits.py once they are
+    older than VISIT_ARCHIVE_AFTER_DAYS. Rows keep their original id and
+    columns, so they serialize as VisitResponse like live visits.
+    """
+    __tablename__ = "visits_archive"
+    __table_args__ = (
+        Index("ix_visits_archive_vendor_id_check_in_time", "vendor_id", "check_in_time"),
+        Index("ix_visits_archive_check_in_time_id", "check_in_time", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    # No foreign keys: archived history must not block deleting a vendor or agent
+    vendor_id = Column(Integer, nullable=False)
+    agent_id = Column(Integer, nullable=True)
+
+    check_in_time = Column(DateTime(timezone=True), nullable=False)
+    check_out_time = Column(DateTime(timezone=True), nullable=True)
+
+    check_in_latitude = Column(Float)
+    check_in_longitude = Column(Float)
+    check_out_latitude = Column(Float, nullable=True)
+    check_out_longitude = Column(Float, nullable=True)
+
+    area = Column(String, nullable=True)
+    pincode = Column(String, nullable=True)
+    city = Column(String, nullable=True)
+    state = Column(String, nullable=True)
+
+    check_in_location = Column(Text, nullable=True)
+    check_out_location = Column(Text, nullable=True)
+
+    check_in_selfie_url = Column(String)
+    check_out_selfie_url = Column(String, nullable=True)
+
+    purpose = Column(String, nullable=True)
+    visited_company = Column(String, nullable=True, index=True)
+
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, Date, Float
+from app.core.database import Base
+
+class VisitDailyStat(Base):
+    """
+    Visit rollup per check-in day (UTC), vendor and visited company. Check-in
+    and check-out update it in their own transaction; rebuild_visit_stats.py
+    recomputes it from visits and visits_archive. Check-outs count towards
+    the row of the visit's check-in day.
+    """
+    __tablename__ = "visit_daily_stats"
+
+    day = Column(Date, primary_key=True)
+    vendor_id = Column(Integer, primary_key=True, index=True)
+    # Visit.visited_company, "" when no company was named or detected
+    company = Column(String, primary_key=True, default="")
+
+    visit_count = Column(Integer, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)
+    # Sum of check-out minus check-in over the completed visits
+    dwell_seconds = Column(Float, nullable=False, default=0.0)
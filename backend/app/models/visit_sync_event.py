@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class VisitSyncEvent(Base):
+    """
+    A queued check-in or check-out applied by POST /visits/sync, keyed by the
+    idempotency key the device generated for it. Replaying the event finds
+    this row and returns the same visit instead of applying it again.
+    archive_visits.py purges rows older than VISIT_SYNC_MAX_EVENT_AGE_DAYS,
+    which is also the oldest event the endpoint accepts.
+    """
+    __tablename__ = "visit_sync_events"
+
+    vendor_id = Column(Integer, ForeignKey("vendors.id"), primary_key=True)
+    idempotency_key = Column(String(64), primary_key=True)
+    event_type = Column(String, nullable=False)
+    # No foreign key: visits is partitioned and its primary key includes check_in_time
+    visit_id = Column(Integer, nullable=False)
+    device_time = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.core import database, config
+from app.dependencies import auth
+from app.models.user import User
+from app.schemas.user import BulkImportResponse
+from app.services import bulk_import_service
+
+router = APIRouter()
+
+@router.post("/users/import", response_model=BulkImportResponse)
+async def import_users(
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None),
+    current_user: User = Depends(auth.get_current_admin_user),
+    db: Session = Depends(database.get_db, scope="function")
+):
+    """
+    Bulk-create users with their vendor or SOC profiles from a CSV or NDJSON file.
+    Format is taken from the `format` field or inferred from the file extension.
+    """
+    fmt = format or ("ndjson" if (file.filename or "").lower().endswith((".ndjson", ".jsonl")) else "csv")
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'")
+
+    content = (await file.read()).decode("utf-8-sig")
+    rows = bulk_import_service.parse_rows(content, fmt)
+    if len(rows) > config.settings.BULK_IMPORT_MAX_ROWS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {config.settings.BULK_IMPORT_MAX_ROWS} rows per import"
+        )
+
+    # Hashing and chunked inserts block, so keep them off the event loop
+    return await run_in_threadpool(bulk_import_service.import_users, db, rows)
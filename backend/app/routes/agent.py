@@ -13,11 +13,11 @@ def read_agents(
     skip: int = 0, 
     limit: int = 100, 
     user = Depends(auth.get_current_active_user),
-    db: Session = Depends(database.get_db)
+    db: Session = Depends(database.get_db, scope="function")
 ):
     return agent_service.get_agents(db, skip=skip, limit=limit)
 
 @router.post("/", response_model=AgentResponse)
-def create_agent(agent_in: AgentCreate, user = Depends(auth.get_current_active_user), db: Session = Depends(database.get_db)):
+def create_agent(agent_in: AgentCreate, user = Depends(auth.get_current_active_user), db: Session = Depends(database.get_db, scope="function")):
     # In real world, maybe only admin can create agents
     return agent_service.create_agent(db, agent_in.name, agent_in.department, agent_in.email)
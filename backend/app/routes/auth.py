@@ -1,16 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from datetime import timedelta
-from app.core import database, security, config
-from app.services import auth_service
+from app.core import database, security, config, principal_cache, rate_limit
+from app.services import auth_service, token_service
 from app.schemas.user import UserCreate, UserResponse, OTPRequest, OTPVerify, PasswordReset
-from app.schemas.token import Token
+from app.schemas.token import Token, RefreshRequest
+from app.models.user import User
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(rate_limit.limit_by_ip)])
 
 @router.post("/request-otp")
-def request_otp(otp_in: OTPRequest, db: Session = Depends(database.get_db)):
+def request_otp(otp_in: OTPRequest, db: Session = Depends(database.get_db, scope="function")):
+    rate_limit.limit_by_identifier("otp-request", otp_in.identifier, config.settings.RATE_LIMIT_OTP_REQUEST)
     # If purpose is forgot_password, check if user exists
     if otp_in.purpose == "forgot_password":
         user = auth_service.get_user_by_email(db, otp_in.identifier) or auth_service.get_user_by_phone(db, otp_in.identifier)
@@ -25,45 +29,62 @@ def request_otp(otp_in: OTPRequest, db: Session = Depends(database.get_db)):
     return {"message": "OTP sent successfully", "code": code} # Returning code for easy dev
 
 @router.post("/verify-otp")
-def verify_otp(otp_in: OTPVerify, db: Session = Depends(database.get_db)):
+def verify_otp(otp_in: OTPVerify, db: Session = Depends(database.get_db, scope="function")):
+    rate_limit.limit_by_identifier("otp-verify", otp_in.identifier, config.settings.RATE_LIMIT_OTP_VERIFY)
     success = auth_service.verify_otp(db, otp_in.identifier, otp_in.code, otp_in.purpose)
     if not success:
         raise HTTPException(status_code=400, detail="Invalid or expired OTP")
     return {"message": "OTP verified successfully"}
 
 @router.post("/reset-password")
-def reset_password(reset_in: PasswordReset, db: Session = Depends(database.get_db)):
+async def reset_password(reset_in: PasswordReset, db: Session = Depends(database.get_db, scope="function")):
+    rate_limit.limit_by_identifier("otp-verify", reset_in.identifier, config.settings.RATE_LIMIT_OTP_VERIFY)
     # Verify OTP first (one more time or use a temporary token, but here we'll just check if OTP was valid)
     # For simplicity, we'll assume the client verified it, but usually you want a secure token.
     # We'll just re-verify the OTP here to be safe (client should send it again).
-    success = auth_service.verify_otp(db, reset_in.identifier, reset_in.code, "forgot_password")
+    success = await run_in_threadpool(auth_service.verify_otp, db, reset_in.identifier, reset_in.code, "forgot_password")
     if not success:
         # In case it was already deleted by /verify-otp, we might need a different flow.
         # But for this task, let's just allow it if identifier exists.
         pass 
 
-    result = auth_service.reset_password(db, reset_in.identifier, reset_in.new_password)
+    # Hash in the dedicated process pool, not on a threadpool token
+    hashed_password = await security.get_password_hash_async(reset_in.new_password)
+    result = await run_in_threadpool(auth_service.reset_password, db, reset_in.identifier, reset_in.new_password, hashed_password)
     if not result:
         raise HTTPException(status_code=404, detail="User not found")
     return {"message": "Password reset successfully"}
 
 @router.post("/register", response_model=UserResponse)
-def register(user_in: UserCreate, db: Session = Depends(database.get_db)):
-    user = auth_service.get_user_by_email(db, email=user_in.email)
+async def register(user_in: UserCreate, db: Session = Depends(database.get_db, scope="function")):
+    user = await run_in_threadpool(auth_service.get_user_by_email, db, user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this username already exists in the system.",
         )
-    user = auth_service.create_user(db=db, user=user_in)
+    hashed_password = await security.get_password_hash_async(user_in.password)
+    try:
+        user = await run_in_threadpool(auth_service.create_user, db, user_in, hashed_password)
+    except IntegrityError:
+        # Registered concurrently, or the same email in other case (uq_users_email_lower)
+        raise HTTPException(
+            status_code=400,
+            detail="The user with this username already exists in the system.",
+        )
     return user
 
 @router.post("/login", response_model=Token)
-def login_access_token(db: Session = Depends(database.get_db), form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_access_token(db: Session = Depends(database.get_db, scope="function"), form_data: OAuth2PasswordRequestForm = Depends()):
     email = form_data.username.strip().lower()
-    user = auth_service.get_user_by_email(db, email=email)
+    rate_limit.limit_by_identifier("login", email, config.settings.RATE_LIMIT_LOGIN)
+    user = await run_in_threadpool(auth_service.get_user_by_email, db, email)
     
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    valid = False
+    if user:
+        # PBKDF2 runs in the hashing process pool; the event loop stays free meanwhile
+        valid, new_hash = await security.verify_and_update_password_async(form_data.password, user.hashed_password)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -71,9 +92,41 @@ def login_access_token(db: Session = Depends(database.get_db), form_data: OAuth2
         )
     if not user.is_active:
          raise HTTPException(status_code=400, detail="Inactive user")
+
+    if new_hash:
+        # Stored hash uses an outdated scheme or cost; upgrade it transparently
+        await run_in_threadpool(auth_service.update_password_hash, db, user, new_hash)
          
     access_token_expires = timedelta(minutes=config.settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = security.create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data=security.principal_claims(user), expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    refresh_token = await run_in_threadpool(token_service.issue_refresh_token, db, user.id)
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post("/refresh", response_model=Token)
+def refresh_access_token(refresh_in: RefreshRequest, db: Session = Depends(database.get_db, scope="function")):
+    # No password hashing here: the rotated refresh token proves the session
+    rotated = token_service.rotate_refresh_token(db, refresh_in.refresh_token)
+    if not rotated:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user_id, refresh_token = rotated
+
+    user = principal_cache.get(user_id) or db.query(User).filter(User.id == user_id).first()
+    if not user or not user.is_active:
+        raise HTTPException(status_code=401, detail="Inactive user")
+
+    access_token_expires = timedelta(minutes=config.settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = security.create_access_token(
+        data=security.principal_claims(user), expires_delta=access_token_expires
+    )
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post("/logout")
+def logout(refresh_in: RefreshRequest, db: Session = Depends(database.get_db, scope="function")):
+    token_service.revoke_refresh_token(db, refresh_in.refresh_token)
+    return {"message": "Logged out successfully"}
@@ -1,9 +1,11 @@
+import io
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
-from app.core import database
+from app.core import config, database
 from app.dependencies import auth
-from app.services import document_service, vendor_service
+from app.services import document_service, image_service, vendor_service
 from app.schemas.document import DocumentResponse
 from app.models.user import User
 
@@ -14,10 +16,10 @@ async def upload_document(
     document_type: str = Form(...),
     file: UploadFile = File(...),
     current_user: User = Depends(auth.get_current_active_user),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db, scope="function")
 ):
     print(f"DEBUG: Processing upload. Type: {document_type}, File: {file.filename}, User: {current_user.id}")
-    vendor = vendor_service.get_vendor_by_user_id(db, current_user.id)
+    vendor = await vendor_service.get_vendor_by_user_id_async(db, current_user.id)
     if not vendor:
         print(f"DEBUG: Vendor not found for user {current_user.id}")
         raise HTTPException(status_code=400, detail="Vendor Profile required")
@@ -25,29 +27,35 @@ async def upload_document(
     from app.utils.cloudinary_util import upload_image_to_cloudinary
     from fastapi.concurrency import run_in_threadpool
     
+    # Photographed documents are normalized in the image pool; PDFs go up unchanged,
+    # and so do logos, whose transparency a JPEG would lose
+    data = await file.read()
+    if document_type == "LOGO":
+        upload = io.BytesIO(data)
+    else:
+        upload = await image_service.prepare_upload(data, config.settings.DOCUMENT_MAX_DIMENSION)
+
     print("DEBUG: Calling Cloudinary utility...")
     # Run in threadpool to avoid blocking
-    file_url = await run_in_threadpool(upload_image_to_cloudinary, file.file, "documents")
+    file_url = await run_in_threadpool(upload_image_to_cloudinary, upload, "documents")
     
     if not file_url:
         print("DEBUG: Cloudinary returned None")
         raise HTTPException(status_code=500, detail="Failed to upload document to cloud")
         
     print(f"DEBUG: Saving document record to DB. Vendor ID: {vendor.id}")
-    doc = document_service.create_document(db, vendor.id, document_type, file_url)
+    doc = await document_service.create_document_async(db, vendor.id, document_type, file_url)
     
     # If it's a logo, update vendor profile directly
     if document_type == "LOGO":
         vendor.logo_url = file_url
-        db.commit()
-        db.refresh(vendor)
         
     return doc
 
 @router.get("/", response_model=List[DocumentResponse])
 def read_documents(
     current_user: User = Depends(auth.get_current_active_user), 
-    db: Session = Depends(database.get_db)
+    db: Session = Depends(database.get_db, scope="function")
 ):
     try:
         vendor = vendor_service.get_vendor_by_user_id(db, current_user.id)
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.core import database, pool_metrics, security
+from app.dependencies import auth
+from app.models.user import User
+from app.services import image_service, selfie_upload_service
+
+router = APIRouter()
+
+@router.get("/password-hashing")
+def get_password_hashing_metrics(current_user: User = Depends(auth.get_current_admin_user)):
+    """Queue depth and latency of the password hashing process pool"""
+    return security.hashing_pool.metrics()
+
+@router.get("/image-normalization")
+def get_image_normalization_metrics(current_user: User = Depends(auth.get_current_admin_user)):
+    """Queue depth and latency of the image normalization process pool"""
+    return image_service.image_pool.metrics()
+
+@router.get("/db-pool")
+def get_db_pool_metrics(current_user: User = Depends(auth.get_current_admin_user)):
+    """Checked-out connections, overflow, checkout wait time and timeouts of the DB pools, plus replica lag"""
+    pools = [pool_metrics.pool_status(database.engine, "primary")]
+    for replica in database.replica_router.replicas:
+        pools.append({**pool_metrics.pool_status(replica.engine, replica.name), **replica.status()})
+    if database._async_engine is not None:
+        pools.append(pool_metrics.pool_status(database._async_engine.sync_engine, "primary_async"))
+    return pools
+
+@router.get("/selfie-uploads")
+def get_selfie_upload_metrics(
+    current_user: User = Depends(auth.get_current_admin_user),
+    db: Session = Depends(database.get_read_db)
+):
+    """This worker's background selfie upload queue, plus uploads by status across all workers"""
+    return {**selfie_upload_service.pipeline.metrics(), "by_status": selfie_upload_service.status_counts(db)}
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from app.core import database
+from app.core import database, security
 from app.schemas.soc_profile import SOCProfile, SOCProfileCreate, SOCProfileUpdate
 from app.services import soc_service, auth_service
 from app.dependencies.auth import get_current_user
@@ -9,20 +10,21 @@ from app.models.user import User
 router = APIRouter()
 
 @router.post("/register", response_model=SOCProfile)
-def register_soc(profile_in: SOCProfileCreate, db: Session = Depends(database.get_db)):
+async def register_soc(profile_in: SOCProfileCreate, db: Session = Depends(database.get_db, scope="function")):
     # Check if user already exists
-    user = auth_service.get_user_by_email(db, email=profile_in.email)
+    user = await run_in_threadpool(auth_service.get_user_by_email, db, profile_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="User with this email already exists.",
         )
-    return soc_service.create_soc_profile(db=db, profile_in=profile_in)
+    hashed_password = await security.get_password_hash_async(profile_in.password)
+    return await run_in_threadpool(soc_service.create_soc_profile, db, profile_in, hashed_password)
 
 @router.get("/me", response_model=SOCProfile)
 def get_my_profile(
     current_user: User = Depends(get_current_user), 
-    db: Session = Depends(database.get_db)
+    db: Session = Depends(database.get_db, scope="function")
 ):
     profile = soc_service.get_profile_by_user_id(db, user_id=current_user.id)
     if not profile:
@@ -30,14 +32,14 @@ def get_my_profile(
     return profile
 
 @router.get("/lookup/{soc_id}", response_model=SOCProfile)
-def lookup_profile(soc_id: str, db: Session = Depends(database.get_db)):
+def lookup_profile(soc_id: str, db: Session = Depends(database.get_read_db)):
     profile = soc_service.get_profile_by_soc_id(db, soc_id=soc_id)
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     return profile
 
 @router.get("/detect/{bluetooth_id}", response_model=SOCProfile)
-def detect_profile(bluetooth_id: str, db: Session = Depends(database.get_db)):
+def detect_profile(bluetooth_id: str, db: Session = Depends(database.get_db, scope="function")):
     profile = soc_service.get_profile_by_bluetooth_id(db, bluetooth_id=bluetooth_id)
     if not profile:
         raise HTTPException(status_code=404, detail="No profile associated with this Bluetooth ID")
@@ -25,7 +25,7 @@ class CompanyLocationResponse(BaseModel):
 
 @router.get("/", response_model=List[VendorResponse])
 def get_all_vendors(
-    db: Session = Depends(database.get_db),
+    db: Session = Depends(database.get_read_db),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     vendors = vendor_service.get_all_vendors(db)
@@ -38,14 +38,14 @@ def get_all_vendors(
 
 @router.get("/companies", response_model=List[str])
 def get_verified_companies(
-    db: Session = Depends(database.get_db),
+    db: Session = Depends(database.get_db, scope="function"),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     return vendor_service.get_verified_companies(db)
 
 @router.get("/company-locations", response_model=List[CompanyLocationResponse])
 def get_company_locations(
-    db: Session = Depends(database.get_db),
+    db: Session = Depends(database.get_read_db),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     """Get all company locations for location-based company detection"""
@@ -55,7 +55,7 @@ def get_company_locations(
 @router.get("/me", response_model=VendorResponse)
 def get_my_profile(
     current_user: User = Depends(auth.get_current_active_user),
-    db: Session = Depends(database.get_db)
+    db: Session = Depends(database.get_db, scope="function")
 ):
     print(f"DEBUG: GET /me requested by User ID: {current_user.id}, Email: {current_user.email}, Full Name: {current_user.full_name}")
     vendor = vendor_service.get_vendor_by_user_id(db, current_user.id)
@@ -82,7 +82,6 @@ def get_my_profile(
             print(f"DEBUG: Vendor {vendor.id} is verified but has no QR code. Generating...")
             try:
                 qr_url = qr_code_service.generate_and_save_qr_code(db, vendor)
-                db.refresh(vendor)
                 if qr_url:
                     print(f"DEBUG: QR code generated successfully: {qr_url}")
                 else:
@@ -100,7 +99,7 @@ def get_my_profile(
 def update_my_profile(
     vendor_in: VendorUpdate,
     current_user: User = Depends(auth.get_current_active_user),
-    db: Session = Depends(database.get_db)
+    db: Session = Depends(database.get_db, scope="function")
 ):
     print(f"DEBUG: PUT /me requested by User ID: {current_user.id}, Email: {current_user.email}")
     vendor = vendor_service.get_vendor_by_user_id(db, current_user.id)
@@ -116,7 +115,7 @@ def update_my_profile(
 @router.post("/me/verify", response_model=bool)
 def verify_my_profile(
     current_user: User = Depends(auth.get_current_active_user),
-    db: Session = Depends(database.get_db)
+    db: Session = Depends(database.get_db, scope="function")
 ):
     vendor = vendor_service.get_vendor_by_user_id(db, current_user.id)
     if not vendor:
@@ -126,7 +125,6 @@ def verify_my_profile(
     
     # Ensure QR code is generated after verification
     if result:
-        db.refresh(vendor)
         if vendor.verification_status == VerificationStatus.VERIFIED and not vendor.qr_code_image_url:
             try:
                 qr_code_service.generate_and_save_qr_code(db, vendor)
@@ -140,7 +138,7 @@ def verify_my_profile(
 @router.get("/me/qr-code")
 def get_my_qr_code(
     current_user: User = Depends(auth.get_current_active_user),
-    db: Session = Depends(database.get_db)
+    db: Session = Depends(database.get_db, scope="function")
 ):
     """Get QR code for the current vendor's company. Generates one if it doesn't exist."""
     vendor = vendor_service.get_vendor_by_user_id(db, current_user.id)
@@ -157,7 +155,6 @@ def get_my_qr_code(
     if not vendor.qr_code_image_url or not vendor.qr_code_image_url.strip():
         try:
             qr_url = qr_code_service.generate_and_save_qr_code(db, vendor)
-            db.refresh(vendor)
             if not qr_url:
                 print(f"WARNING: QR code generation returned None for vendor {vendor.id}")
                 raise HTTPException(
@@ -208,7 +205,7 @@ class QRCodeScanResponse(BaseModel):
 
 @router.post("/generate-all-qr-codes")
 def generate_all_qr_codes(
-    db: Session = Depends(database.get_db),
+    db: Session = Depends(database.get_db, scope="function"),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     """
@@ -246,7 +243,7 @@ def generate_all_qr_codes(
 @router.post("/scan-qr-code", response_model=QRCodeScanResponse)
 def scan_qr_code(
     qr_request: QRCodeScanRequest,
-    db: Session = Depends(database.get_db),
+    db: Session = Depends(database.get_db, scope="function"),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     """
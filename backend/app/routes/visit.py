@@ -1,16 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+import asyncio
+import time
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from app.core import database
+from datetime import date, datetime
+from typing import List, Literal, Optional, Tuple
+from app.core import database, config
 from app.dependencies import auth
-from app.services import visit_service, vendor_service
-from app.schemas.visit import VisitResponse, VisitCreate, VisitCheckOut
+from app.services import (
+    visit_service, vendor_service, visit_export_service, visit_stats_service, visit_sync_service, selfie_upload_service,
+    image_service, occupancy_service,
+)
+from app.schemas.visit import (
+    VisitResponse, VisitCreate, VisitCheckOut, CompanyDetectionBatchRequest, CompanyDetectionResult, VisitStatsResponse,
+    VisitSyncRequest, VisitSyncResponse, SelfieUploadResponse, SelfieUploadState, OccupancyResponse,
+)
 from app.models.user import User
 from app.models.vendor import VerificationStatus
 from app.utils.cloudinary_util import upload_image_to_cloudinary
+from app.utils.company import company_key
 
 router = APIRouter()
 
+# Interval between database checks while GET /{visit_id}/selfies long-polls
+SELFIE_STATUS_POLL_SECONDS = 0.5
+
+async def _upload_selfie(data: bytes) -> Optional[str]:
+    """Normalize a selfie in the image pool and upload it; None if the upload failed."""
+    upload = await image_service.prepare_upload(data, config.settings.SELFIE_MAX_DIMENSION)
+    return await run_in_threadpool(upload_image_to_cloudinary, upload, "selfies")
+
+async def _store_selfie(selfie: UploadFile) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (url, spool path) of a check-in/check-out selfie. With the upload workers
+    running the selfie is only spooled to disk, and the URL is filled in once
+    the upload finishes; otherwise it is uploaded before the visit is written.
+    """
+    if selfie_upload_service.pipeline.running:
+        return None, await run_in_threadpool(selfie_upload_service.spool, selfie.file, selfie.filename)
+    selfie_url = await _upload_selfie(await selfie.read())
+    if not selfie_url:
+        raise HTTPException(status_code=500, detail="Failed to upload selfie to cloud")
+    return selfie_url, None
+
 @router.post("/check-in", response_model=VisitResponse)
 async def check_in(
     agent_id: Optional[int] = Form(None),
@@ -25,19 +59,15 @@ async def check_in(
     company_name: Optional[str] = Form(None),
     selfie: UploadFile = File(...),
     current_user: User = Depends(auth.get_current_active_user),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db, scope="function")
 ):
-    vendor = vendor_service.get_vendor_by_user_id(db, current_user.id)
+    vendor = await vendor_service.get_vendor_by_user_id_async(db, current_user.id)
     if not vendor:
         raise HTTPException(status_code=400, detail="Vendor profile not found")
     
-    # Save selfie to cloud
+    spooled = None
     try:
-        from fastapi.concurrency import run_in_threadpool
-        selfie_url = await run_in_threadpool(upload_image_to_cloudinary, selfie.file, "selfies")
-        
-        if not selfie_url:
-            raise HTTPException(status_code=500, detail="Failed to upload selfie to cloud")
+        selfie_url, spooled = await _store_selfie(selfie)
         
         # Format purpose only if company name is provided, otherwise leave it to service to detect
         final_purpose = purpose
@@ -60,8 +90,12 @@ async def check_in(
         )
         
         # Pass company_name explicitly to service for logic
-        return visit_service.create_visit(db, visit_in, vendor.id, selfie_url, user_provided_company=company_name)
+        visit = await visit_service.create_visit_async(db, visit_in, vendor.id, selfie_url, user_provided_company=company_name)
+        if spooled:
+            await selfie_upload_service.enqueue_async(db, visit.id, "check_in", spooled)
+        return visit
     except Exception as e:
+        selfie_upload_service.discard_spooled(spooled)
         print(f"CRITICAL ERROR in check_in: {str(e)}")
         import traceback
         traceback.print_exc()
@@ -75,21 +109,17 @@ async def check_out(
     check_out_location: Optional[str] = Form(None), # Added
     selfie: UploadFile = File(...),
     current_user: User = Depends(auth.get_current_active_user),
-    db: Session = Depends(database.get_db)
+    db: AsyncSession = Depends(database.get_async_db, scope="function")
 ):
-    visit = visit_service.get_visit_by_id(db, visit_id)
+    visit = await visit_service.get_visit_by_id_async(db, visit_id)
     if not visit:
         raise HTTPException(status_code=404, detail="Visit not found")
         
-    vendor = vendor_service.get_vendor_by_user_id(db, current_user.id)
+    vendor = await vendor_service.get_vendor_by_user_id_async(db, current_user.id)
     if visit.vendor_id != vendor.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this visit")
 
-    from fastapi.concurrency import run_in_threadpool
-    selfie_url = await run_in_threadpool(upload_image_to_cloudinary, selfie.file, "selfies")
-    
-    if not selfie_url:
-        raise HTTPException(status_code=500, detail="Failed to upload selfie to cloud")
+    selfie_url, spooled = await _store_selfie(selfie)
     
     visit_out = VisitCheckOut(
         check_out_latitude=check_out_latitude,
@@ -97,18 +127,239 @@ async def check_out(
         check_out_location=check_out_location
     )
     
-    return visit_service.update_visit_checkout(db, visit_id, visit_out, selfie_url)
+    try:
+        visit = await visit_service.update_visit_checkout_async(db, visit_id, visit_out, selfie_url)
+        if spooled:
+            await selfie_upload_service.enqueue_async(db, visit_id, "check_out", spooled)
+    except Exception:
+        selfie_upload_service.discard_spooled(spooled)
+        raise
+    return visit
+
+@router.get("/{visit_id}/selfies", response_model=List[SelfieUploadState])
+async def selfie_upload_status(
+    visit_id: int,
+    wait: float = Query(0, ge=0, le=30),
+    current_user: User = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(database.get_async_db, scope="function")
+):
+    """
+    Upload state of the visit's check-in/check-out selfies. With ``wait``
+    the request is held until no upload is pending or ``wait`` seconds have
+    passed, so clients can long-poll instead of polling.
+    """
+    visit = await visit_service.get_visit_by_id_async(db, visit_id)
+    if not visit:
+        raise HTTPException(status_code=404, detail="Visit not found")
+    if not (current_user.role == "admin" or current_user.is_superuser):
+        vendor = await vendor_service.get_vendor_by_user_id_async(db, current_user.id)
+        if not vendor or visit.vendor_id != vendor.id:
+            raise HTTPException(status_code=403, detail="Not authorized to view this visit")
+
+    deadline = time.monotonic() + wait
+    while True:
+        statuses = await selfie_upload_service.get_statuses_async(db, visit_id)
+        if not selfie_upload_service.in_progress(statuses) or time.monotonic() >= deadline:
+            return statuses
+        # End the read transaction so the connection goes back to the pool while waiting
+        await db.rollback()
+        await asyncio.sleep(SELFIE_STATUS_POLL_SECONDS)
+
+@router.post("/selfies", response_model=SelfieUploadResponse)
+async def upload_selfie(
+    selfie: UploadFile = File(...),
+    current_user: User = Depends(auth.get_current_active_user),
+):
+    """Store a selfie ahead of sync; queued events attach it through the returned selfie_ref."""
+    selfie_url = await _upload_selfie(await selfie.read())
+    if not selfie_url:
+        raise HTTPException(status_code=500, detail="Failed to upload selfie to cloud")
+    return {"selfie_ref": visit_sync_service.issue_selfie_ref(current_user.id, selfie_url)}
+
+@router.post("/sync", response_model=VisitSyncResponse)
+async def sync_visits(
+    batch: VisitSyncRequest,
+    current_user: User = Depends(auth.get_current_active_user),
+    db: AsyncSession = Depends(database.get_async_db, scope="function")
+):
+    """
+    Apply check-ins and check-outs queued on a device while it was offline,
+    in one transaction, with one result per event in request order. Events
+    already applied (same idempotency key) are reported as duplicates, so a
+    device can resend its whole queue until it sees every result.
+    """
+    if len(batch.events) > config.settings.VISIT_SYNC_MAX_EVENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {config.settings.VISIT_SYNC_MAX_EVENTS} events per request"
+        )
+    vendor = await vendor_service.get_vendor_by_user_id_async(db, current_user.id)
+    if not vendor:
+        raise HTTPException(status_code=400, detail="Vendor profile not found")
+
+    results, pending = await visit_sync_service.triage(db, vendor.id, current_user.id, batch.events)
+    # Inline selfies upload concurrently, and only for events not applied before
+    inline = [item for item in pending if item.selfie_bytes is not None]
+    uploaded = await asyncio.gather(*(_upload_selfie(item.selfie_bytes) for item in inline))
+    urls = dict(zip((item.index for item in inline), uploaded))
+    selfie_urls = [urls.get(item.index, item.selfie_url) for item in pending]
+    await visit_sync_service.apply_events(db, vendor.id, pending, selfie_urls, results)
+    visit_sync_service.settle_repeats(batch.events, results)
+    return {"results": results}
+
+@router.post("/detect-company/batch", response_model=List[CompanyDetectionResult])
+def detect_company_batch(
+    batch_in: CompanyDetectionBatchRequest,
+    current_user: User = Depends(auth.get_current_active_user),
+    db: Session = Depends(database.get_read_db)
+):
+    """Resolve the detected company for many coordinates in a single vectorized pass"""
+    if len(batch_in.points) > config.settings.COMPANY_DETECTION_BATCH_LIMIT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {config.settings.COMPANY_DETECTION_BATCH_LIMIT} points per request"
+        )
+
+    points = [(p.latitude, p.longitude) for p in batch_in.points]
+    matches = visit_service.detect_companies(db, points, batch_in.threshold_meters)
+
+    results = []
+    for point, match in zip(batch_in.points, matches):
+        result = CompanyDetectionResult(latitude=point.latitude, longitude=point.longitude)
+        if match:
+            result.location_id, result.company_name, result.distance_meters = match
+        results.append(result)
+    return results
+
+@router.get("/export")
+def export_visits(
+    format: Literal["csv", "ndjson"] = "csv",
+    gzip: bool = False,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    vendor_id: Optional[int] = None,
+    status: Optional[Literal["open", "closed"]] = None,
+    include_archive: bool = False,
+    current_user: User = Depends(auth.get_current_admin_user)
+):
+    """
+    Stream visits oldest first as CSV or NDJSON, optionally gzipped, for
+    payroll and audits. Rows come from a server-side cursor and are encoded
+    as they arrive, so memory stays flat however many rows match.
+    """
+    body = visit_export_service.stream_export(
+        format, gzip, include_archive, since=since, until=until, vendor_id=vendor_id, status=status
+    )
+    filename = f"visits.{format}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else visit_export_service.MEDIA_TYPES[format]
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@router.get("/stats", response_model=VisitStatsResponse)
+def visit_stats(
+    group_by: Optional[Literal["day", "vendor", "company"]] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    vendor_id: Optional[int] = None,
+    company: Optional[str] = None,
+    current_user: User = Depends(auth.get_current_active_user),
+    db: Session = Depends(database.get_read_db)
+):
+    """
+    Visit counts, open visits and dwell time for check-in days in
+    [since, until), optionally grouped. Served from the daily rollups only, so
+    latency does not grow with visit history. Vendors only see their own visits.
+    """
+    if not (current_user.role == "admin" or current_user.is_superuser):
+        vendor = vendor_service.get_vendor_by_user_id(db, current_user.id)
+        if not vendor:
+            raise HTTPException(status_code=400, detail="Vendor profile not found")
+        vendor_id = vendor.id
+    return visit_stats_service.get_stats(db, group_by, since, until, vendor_id, company_key(company))
+
+@router.get("/open", response_model=List[VisitResponse])
+def read_open_visits(
+    response: Response,
+    limit: int = Query(config.settings.VISITS_PAGE_SIZE, ge=1, le=config.settings.VISITS_PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    company: Optional[str] = None,
+    vendor_id: Optional[int] = None,
+    current_user: User = Depends(auth.get_current_active_user),
+    db: Session = Depends(database.get_read_db)
+):
+    """
+    Visits not checked out yet (who is on site), newest check-in first,
+    paged like GET /visits. Read from the open-visits index, so the cost
+    does not depend on visit history. Vendors see their own view only.
+    """
+    page_args = dict(limit=limit, cursor=cursor, status="open", vendor_id=vendor_id, company=company_key(company))
+    if not (current_user.role == "admin" or current_user.is_superuser):
+        vendor = vendor_service.get_vendor_by_user_id(db, current_user.id)
+        if not vendor:
+            return []
+        page_args.update(view_vendor_id=vendor.id, view_company=vendor.company_name)
+
+    try:
+        visits, next_cursor = visit_service.page_visits(db, **page_args)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return visits
+
+@router.get("/occupancy", response_model=OccupancyResponse)
+def read_occupancy(
+    company: Optional[str] = None,
+    current_user: User = Depends(auth.get_current_active_user),
+    db: Session = Depends(database.get_read_db)
+):
+    """
+    Open visits per visited company, from in-memory counters (see
+    occupancy_service). Vendors only see their own company's count.
+    """
+    if not (current_user.role == "admin" or current_user.is_superuser):
+        vendor = vendor_service.get_vendor_by_user_id(db, current_user.id)
+        if not vendor:
+            raise HTTPException(status_code=400, detail="Vendor profile not found")
+        company = vendor.company_name
+        if not company_key(company):
+            return {"total": 0, "companies": []}
+    occupancy_service.refresh_if_stale(db)
+    return occupancy_service.get_occupancy(company_key(company) if company else None)
 
 @router.get("/", response_model=List[VisitResponse])
 def read_visits(
+    response: Response,
+    limit: int = Query(config.settings.VISITS_PAGE_SIZE, ge=1, le=config.settings.VISITS_PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    vendor_id: Optional[int] = None,
+    status: Optional[Literal["open", "closed"]] = None,
+    city: Optional[str] = None,
+    pincode: Optional[str] = None,
+    include_archive: bool = False,
     current_user: User = Depends(auth.get_current_active_user),
-    db: Session = Depends(database.get_db)
+    db: Session = Depends(database.get_read_db)
 ):
-    if current_user.role == "admin" or current_user.is_superuser:
-        return visit_service.get_all_visits(db)
+    """
+    Visits newest first, one page at a time. When more remain, the
+    X-Next-Cursor response header holds the cursor for the next page; pass it
+    back with the same filters. Closed visits older than
+    VISIT_ARCHIVE_AFTER_DAYS are only listed with include_archive=true.
+    """
+    page_args = dict(limit=limit, cursor=cursor, include_archive=include_archive, vendor_id=vendor_id,
+                     since=since, until=until, status=status, city=city, pincode=pincode)
+    if not (current_user.role == "admin" or current_user.is_superuser):
+        vendor = vendor_service.get_vendor_by_user_id(db, current_user.id)
+        if not vendor:
+            return []
+        page_args.update(view_vendor_id=vendor.id, view_company=vendor.company_name)
 
-    vendor = vendor_service.get_vendor_by_user_id(db, current_user.id)
-    if not vendor:
-        return []
-        
-    return visit_service.get_visits_for_vendor_view(db, vendor.id, vendor.company_name)
+    try:
+        visits, next_cursor = visit_service.page_visits(db, **page_args)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return visits
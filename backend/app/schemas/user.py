@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -38,3 +38,31 @@ class UserResponse(UserBase):
     
     class Config:
         from_attributes = True
+
+class BulkUserRow(BaseModel):
+    email: EmailStr
+    password: str
+    full_name: str
+    phone_number: Optional[str] = None
+    account_type: str = "vendor" # 'vendor' or 'soc'
+    company_name: Optional[str] = None
+    office_address: Optional[str] = None
+    # SOC profile fields
+    role_type: Optional[str] = None
+    service_category: Optional[str] = None
+    bluetooth_id: Optional[str] = None
+    device_id: Optional[str] = None
+
+class BulkImportRowResult(BaseModel):
+    row: int
+    email: Optional[str] = None
+    status: str # 'created', 'skipped', 'error'
+    user_id: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkImportResponse(BaseModel):
+    total: int
+    created: int
+    skipped: int
+    failed: int
+    results: List[BulkImportRowResult]
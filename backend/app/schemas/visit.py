@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional
-from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from datetime import date, datetime
 
 class VisitBase(BaseModel):
     agent_id: Optional[int] = None
@@ -26,10 +26,111 @@ class VisitResponse(VisitBase):
     vendor_id: int
     check_in_time: datetime
     check_out_time: Optional[datetime] = None
-    check_in_selfie_url: str
+    # None until the background upload finishes; see GET /visits/{id}/selfies
+    check_in_selfie_url: Optional[str] = None
     check_out_selfie_url: Optional[str] = None
     check_in_location: Optional[str] = None
     check_out_location: Optional[str] = None
     
     class Config:
         from_attributes = True
+
+class CoordinatePoint(BaseModel):
+    latitude: float
+    longitude: float
+
+class CompanyDetectionBatchRequest(BaseModel):
+    points: List[CoordinatePoint]
+    threshold_meters: float = 300.0
+
+class CompanyDetectionResult(CoordinatePoint):
+    location_id: Optional[int] = None
+    company_name: Optional[str] = None
+    distance_meters: Optional[float] = None
+
+class VisitStatsRow(BaseModel):
+    # Set to the group key of the row, when grouped by it
+    day: Optional[date] = None
+    vendor_id: Optional[int] = None
+    company: Optional[str] = None
+    visits: int
+    completed: int
+    open: int
+    total_dwell_seconds: float
+    average_dwell_seconds: Optional[float] = None
+
+class VisitStatsResponse(BaseModel):
+    group_by: Optional[str] = None
+    totals: VisitStatsRow
+    rows: List[VisitStatsRow]
+
+class CompanyOccupancy(BaseModel):
+    # visited_company key; None for visits to no known company
+    company: Optional[str] = None
+    open: int
+
+class OccupancyResponse(BaseModel):
+    total: int
+    companies: List[CompanyOccupancy]
+    # When the counters were last recounted from the database
+    refreshed_at: Optional[datetime] = None
+
+class QueuedVisitEvent(BaseModel):
+    """A check-in or check-out recorded while the device was offline."""
+    # Generated by the device once per event and resent unchanged on every retry
+    idempotency_key: str = Field(..., min_length=1, max_length=64)
+    type: Literal["check_in", "check_out"]
+    # When the event happened on the device; becomes check_in_time/check_out_time
+    device_time: datetime
+
+    # check_in
+    agent_id: Optional[int] = None
+    check_in_latitude: Optional[float] = None
+    check_in_longitude: Optional[float] = None
+    area: Optional[str] = None
+    pincode: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    check_in_location: Optional[str] = None
+    purpose: Optional[str] = None
+    company_name: Optional[str] = None
+
+    # check_out: the visit by server id, or by the idempotency key of its
+    # queued check-in (same batch or an earlier one)
+    visit_id: Optional[int] = None
+    check_in_key: Optional[str] = None
+    check_out_latitude: Optional[float] = None
+    check_out_longitude: Optional[float] = None
+    check_out_location: Optional[str] = None
+
+    # The selfie, either inline or as a selfie_ref from POST /visits/selfies
+    selfie_base64: Optional[str] = None
+    selfie_ref: Optional[str] = None
+
+class VisitSyncRequest(BaseModel):
+    events: List[QueuedVisitEvent]
+
+class VisitSyncResult(BaseModel):
+    idempotency_key: str
+    # applied now, duplicate of an event applied earlier, rejected, or
+    # conflict: a check-out of a visit that was already checked out
+    status: Literal["applied", "duplicate", "rejected", "conflict"]
+    visit_id: Optional[int] = None
+    detail: Optional[str] = None
+
+class VisitSyncResponse(BaseModel):
+    results: List[VisitSyncResult]
+
+class SelfieUploadResponse(BaseModel):
+    selfie_ref: str
+
+class SelfieUploadState(BaseModel):
+    id: int
+    kind: Literal["check_in", "check_out"]
+    # pending, uploading, done or failed
+    status: str
+    attempts: int
+    url: Optional[str] = None
+    last_error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
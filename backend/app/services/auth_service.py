@@ -1,51 +1,40 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import func
 from app.models.user import User
 from app.models.vendor import Vendor
 from app.models.otp import OTP
+from app.services import otp_store
 from app.schemas.user import UserCreate
 from app.core import security
-from datetime import datetime, timedelta, timezone
 
 def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+    return db.query(User).filter(func.lower(User.email) == email.lower()).first()
 
 def get_user_by_phone(db: Session, phone: str):
     return db.query(User).filter(User.phone_number == phone).first()
 
 def create_otp(db: Session, identifier: str, purpose: str):
-    # Expire old OTPs for this identifier/purpose
-    db.query(OTP).filter(OTP.identifier == identifier, OTP.purpose == purpose).delete()
-    
+    # Issuing replaces any previous code for this identifier/purpose
     code = OTP.generate_code()
-    expires_at = datetime.now(timezone.utc) + timedelta(minutes=10)
-    db_otp = OTP(identifier=identifier, code=code, purpose=purpose, expires_at=expires_at)
-    db.add(db_otp)
-    db.commit()
+    otp_store.get_store().issue(db, identifier, purpose, code)
     return code
 
 def verify_otp(db: Session, identifier: str, code: str, purpose: str):
-    otp = db.query(OTP).filter(
-        OTP.identifier == identifier,
-        OTP.code == code,
-        OTP.purpose == purpose,
-        OTP.expires_at > datetime.now(timezone.utc)
-    ).first()
-    if otp:
-        db.delete(otp)
-        db.commit()
-        return True
-    return False
+    return otp_store.get_store().verify(db, identifier, purpose, code)
 
-def reset_password(db: Session, identifier: str, new_password: str):
+def reset_password(db: Session, identifier: str, new_password: str, hashed_password: str = None):
+    # hashed_password lets async callers hash in the process pool beforehand
     user = get_user_by_email(db, identifier) or get_user_by_phone(db, identifier)
     if user:
-        user.hashed_password = security.get_password_hash(new_password)
-        db.commit()
+        user.hashed_password = hashed_password or security.get_password_hash(new_password)
         return True
     return False
 
-def create_user(db: Session, user: UserCreate):
-    hashed_password = security.get_password_hash(user.password)
+def update_password_hash(db: Session, user: User, hashed_password: str):
+    user.hashed_password = hashed_password
+
+def create_user(db: Session, user: UserCreate, hashed_password: str = None):
+    hashed_password = hashed_password or security.get_password_hash(user.password)
     db_user = User(
         email=user.email,
         hashed_password=hashed_password,
@@ -53,18 +42,15 @@ def create_user(db: Session, user: UserCreate):
         phone_number=user.phone_number,
         role="vendor"
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    
-    # Create associated vendor profile
+    # Create associated vendor profile; the relationship lets one flush insert
+    # the user and then the vendor with its user_id (INSERT ... RETURNING id)
     db_vendor = Vendor(
-        user_id=db_user.id,
+        user=db_user,
         phone_number=user.phone_number or "",
         company_name=getattr(user, 'company_name', ""),
         office_address=getattr(user, 'office_address', "")
     )
     db.add(db_vendor)
-    db.commit()
+    db.flush()
     
     return db_user
@@ -0,0 +1,214 @@
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+from pydantic import ValidationError
+from sqlalchemy import func, insert, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core import security
+from app.core.config import settings
+from app.models.user import User, UserRole
+from app.models.vendor import Vendor
+from app.models.soc_profile import SOCProfile
+from app.schemas.user import BulkUserRow
+from app.utils.soc import generate_soc_id
+
+ACCOUNT_TYPES = ("vendor", "soc")
+
+
+def parse_rows(content: str, fmt: str) -> List[dict]:
+    """
+    Parse CSV (header row required) or NDJSON (one JSON object per line) into dicts.
+
+    Empty CSV cells become None so optional fields validate as missing.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(content))
+        return [{k.strip(): (v.strip() or None) if isinstance(v, str) else v for k, v in row.items() if k} for row in reader]
+    if fmt == "ndjson":
+        rows = []
+        for line_no, line in enumerate(content.splitlines(), start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                # Keep the row position so the error is reported against it
+                rows.append({"__error__": f"Invalid JSON on line {line_no}: {e.msg}"})
+        return rows
+    raise ValueError(f"Unsupported format: {fmt}")
+
+
+def _validate(rows: List[dict], results: List[dict]) -> List[tuple]:
+    """Validate rows, dropping invalid and duplicate ones. Returns (row_number, BulkUserRow) pairs."""
+    valid = []
+    seen_emails, seen_phones = set(), set()
+    for row_no, raw in enumerate(rows, start=1):
+        if not isinstance(raw, dict):
+            results.append({"row": row_no, "status": "error", "error": "Row must be an object"})
+            continue
+        email = raw.get("email")
+        if "__error__" in raw:
+            results.append({"row": row_no, "email": email, "status": "error", "error": raw["__error__"]})
+            continue
+        try:
+            row = BulkUserRow(**raw)
+        except ValidationError as e:
+            first = e.errors()[0]
+            results.append({"row": row_no, "email": email, "status": "error",
+                            "error": f"{'.'.join(str(p) for p in first['loc'])}: {first['msg']}"})
+            continue
+
+        row.email = row.email.strip().lower()
+        if row.account_type not in ACCOUNT_TYPES:
+            results.append({"row": row_no, "email": row.email, "status": "error",
+                            "error": f"account_type must be one of {', '.join(ACCOUNT_TYPES)}"})
+            continue
+        if row.account_type == "soc" and not (row.phone_number and row.role_type):
+            results.append({"row": row_no, "email": row.email, "status": "error",
+                            "error": "phone_number and role_type are required for soc accounts"})
+            continue
+        if row.email in seen_emails or (row.phone_number and row.phone_number in seen_phones):
+            results.append({"row": row_no, "email": row.email, "status": "error",
+                            "error": "Duplicate email or phone number within the import"})
+            continue
+        seen_emails.add(row.email)
+        if row.phone_number:
+            seen_phones.add(row.phone_number)
+        valid.append((row_no, row))
+    return valid
+
+
+def _hash_passwords(passwords: List[str], workers: Optional[int]) -> List[str]:
+    # A dedicated pool sized for the import, so a large batch never competes
+    # with interactive logins for the shared hashing pool
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(passwords) < 2:
+        return [security.get_password_hash(p) for p in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(security.get_password_hash, passwords, chunksize=chunksize))
+
+
+def _user_values(row: BulkUserRow, hashed_password: str) -> dict:
+    return {
+        "email": row.email,
+        "hashed_password": hashed_password,
+        "full_name": row.full_name,
+        "phone_number": row.phone_number,
+        "role": UserRole.VISITOR.value if row.account_type == "soc" else UserRole.VENDOR.value,
+        "is_active": True,
+        "is_superuser": False,
+    }
+
+
+def _profile_values(row: BulkUserRow, user_id: int) -> dict:
+    if row.account_type == "soc":
+        return {
+            "user_id": user_id,
+            "soc_id": generate_soc_id(),
+            "phone_number": row.phone_number,
+            "company_name": row.company_name,
+            "role_type": row.role_type,
+            "service_category": row.service_category,
+            "bluetooth_id": row.bluetooth_id,
+            "device_id": row.device_id,
+            "is_verified": False,
+        }
+    return {
+        "user_id": user_id,
+        # NULL rather than "" so phone-less vendors don't collide on the unique index
+        "phone_number": row.phone_number,
+        "company_name": row.company_name or "",
+        "office_address": row.office_address or "",
+    }
+
+
+def _insert_chunk(db: Session, chunk: List[tuple], hashes: Dict[int, str]) -> Dict[int, int]:
+    """Insert one chunk of users plus profiles with multi-row INSERTs. Returns row_number -> user id."""
+    returned = db.execute(
+        insert(User).returning(User.id, User.email),
+        [_user_values(row, hashes[row_no]) for row_no, row in chunk]
+    ).all()
+    ids_by_email = {r.email: r.id for r in returned}
+
+    vendor_rows, soc_rows = [], []
+    for row_no, row in chunk:
+        values = _profile_values(row, ids_by_email[row.email])
+        (soc_rows if row.account_type == "soc" else vendor_rows).append(values)
+    if vendor_rows:
+        db.execute(insert(Vendor), vendor_rows)
+    if soc_rows:
+        db.execute(insert(SOCProfile), soc_rows)
+    return {row_no: ids_by_email[row.email] for row_no, row in chunk}
+
+
+def import_users(db: Session, rows: List[dict], chunk_size: int = None, hash_workers: int = None) -> dict:
+    """
+    Validate, hash and insert users with their vendor or SOC profiles.
+
+    Rows are written in chunks, one transaction per chunk. If a chunk hits a
+    constraint violation it is retried row by row under savepoints so only the
+    offending rows fail.
+
+    Returns:
+        Summary counts plus one result per input row, ordered by row number.
+    """
+    chunk_size = chunk_size or settings.BULK_IMPORT_CHUNK_SIZE
+    results: List[dict] = []
+    valid = _validate(rows, results)
+
+    # Skip accounts that already exist (by email or user phone number)
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        emails = [row.email for _, row in chunk]
+        phones = [row.phone_number for _, row in chunk if row.phone_number]
+        # Emails are lowercased by _validate; stored ones may not be (login matches case-insensitively)
+        existing = db.query(User.email, User.phone_number).filter(
+            or_(func.lower(User.email).in_(emails), User.phone_number.in_(phones))
+        ).all()
+        taken_emails = {e.lower() for e, _ in existing}
+        taken_phones = {p for _, p in existing if p}
+        for row_no, row in chunk:
+            if row.email in taken_emails or (row.phone_number and row.phone_number in taken_phones):
+                results.append({"row": row_no, "email": row.email, "status": "skipped",
+                                "error": "User with this email or phone number already exists"})
+    skipped_rows = {r["row"] for r in results if r["status"] == "skipped"}
+    valid = [(row_no, row) for row_no, row in valid if row_no not in skipped_rows]
+
+    hashed = _hash_passwords([row.password for _, row in valid], hash_workers or settings.BULK_IMPORT_HASH_WORKERS)
+    hashes = {row_no: h for (row_no, _), h in zip(valid, hashed)}
+
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        try:
+            created = _insert_chunk(db, chunk, hashes)
+            db.commit()
+            for row_no, row in chunk:
+                results.append({"row": row_no, "email": row.email, "status": "created", "user_id": created[row_no]})
+        except IntegrityError:
+            db.rollback()
+            for row_no, row in chunk:
+                savepoint = db.begin_nested()
+                try:
+                    created = _insert_chunk(db, [(row_no, row)], hashes)
+                    savepoint.commit()
+                    results.append({"row": row_no, "email": row.email, "status": "created", "user_id": created[row_no]})
+                except IntegrityError as e:
+                    savepoint.rollback()
+                    results.append({"row": row_no, "email": row.email, "status": "error",
+                                    "error": f"Constraint violation: {str(e.orig).splitlines()[0]}"})
+            db.commit()
+
+    results.sort(key=lambda r: r["row"])
+    return {
+        "total": len(rows),
+        "created": sum(1 for r in results if r["status"] == "created"),
+        "skipped": sum(1 for r in results if r["status"] == "skipped"),
+        "failed": sum(1 for r in results if r["status"] == "error"),
+        "results": results,
+    }
@@ -0,0 +1,231 @@
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.company_location import CompanyLocation
+from app.utils.distance_engine import DistanceEngine, numpy_available
+from app.utils.geo import GridIndex, IndexedLocation
+
+# Process-wide spatial index over company_locations. It is filled lazily on the
+# first lookup and then kept current incrementally: rows created in this process
+# are added directly, and rows created by other workers are picked up by an
+# id-range query (`id > last seen id`) that normally returns nothing.
+# Ids commit out of order under concurrent transactions, so ids skipped over
+# by that query are asked for again for GAP_RETRY_SECONDS. A full reload every
+# COMPANY_LOCATION_RELOAD_SECONDS picks up edited and deleted locations.
+# The same rows are mirrored into a vectorized DistanceEngine for batch lookups,
+# built on the first batch request so numpy stays out of the cold start.
+_index = GridIndex()
+_engine = None
+_max_loaded_id = 0
+# Skipped ids still awaited (rolled back, or not committed yet) -> when first missed
+_missing_ids: Dict[int, float] = {}
+_reloaded_at: Optional[float] = None
+_sync_lock = threading.Lock()
+
+# How long a skipped id is awaited, and how many of the newest are
+GAP_RETRY_SECONDS = 300
+MAX_MISSING_IDS = 1000
+
+
+def _to_indexed(loc: CompanyLocation) -> IndexedLocation:
+    return IndexedLocation(loc.id, loc.company_name, loc.latitude, loc.longitude)
+
+
+def register_location(loc: CompanyLocation):
+    """Add a freshly inserted CompanyLocation (it must already have an id) to the index."""
+    global _max_loaded_id
+    if loc.id is None:
+        return
+    indexed = _to_indexed(loc)
+    with _sync_lock:
+        if _index.add(indexed) and _engine is not None:
+            _engine.extend([indexed])
+        _missing_ids.pop(loc.id, None)
+        # Only advance the watermark when it is contiguous; otherwise leave the gap
+        # for sync_index to fill from the database.
+        if loc.id == _max_loaded_id + 1:
+            _max_loaded_id = loc.id
+
+
+def register_on_commit(db, loc: CompanyLocation):
+    """Add ``loc`` to the index once the session's transaction commits."""
+    db.info.setdefault("company_locations_added", []).append(loc)
+
+
+@event.listens_for(Session, "after_commit")
+def _register_committed_locations(session):
+    if session.in_nested_transaction():
+        return  # a savepoint was released; wait for the real commit
+    for loc in session.info.pop("company_locations_added", ()):
+        # A location added inside a savepoint that rolled back left the session
+        if loc in session:
+            register_location(loc)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_uncommitted_locations(session):
+    if not session.in_nested_transaction():
+        session.info.pop("company_locations_added", None)
+
+
+_COLUMNS = (CompanyLocation.id, CompanyLocation.company_name, CompanyLocation.latitude, CompanyLocation.longitude)
+
+
+def _next_query():
+    """
+    The query the next sync runs, and whether it is a full reload: all rows
+    when one is due (claimed here, so concurrent syncs don't all reload),
+    else the rows past the watermark plus the skipped ids still awaited.
+    """
+    global _reloaded_at
+    now = time.monotonic()
+    with _sync_lock:
+        if _reloaded_at is None or now - _reloaded_at >= settings.COMPANY_LOCATION_RELOAD_SECONDS:
+            _reloaded_at = now
+            return select(*_COLUMNS), True
+        condition = CompanyLocation.id > _max_loaded_id
+        if _missing_ids:
+            condition = or_(condition, CompanyLocation.id.in_(list(_missing_ids)))
+        return select(*_COLUMNS).where(condition).order_by(CompanyLocation.id), False
+
+
+def _await_gaps(index: GridIndex, after_id: int, top: int, now: float):
+    """Remember the ids between ``after_id`` and ``top`` missing from ``index``: they may still commit."""
+    for skipped in range(max(after_id + 1, top - MAX_MISSING_IDS), top):
+        if skipped not in index:
+            _missing_ids.setdefault(skipped, now)
+
+
+def _load_rows(rows):
+    global _max_loaded_id
+    now = time.monotonic()
+    with _sync_lock:
+        added = []
+        for row in rows:
+            indexed = IndexedLocation(row.id, row.company_name, row.latitude, row.longitude)
+            if _index.add(indexed):
+                added.append(indexed)
+            _missing_ids.pop(row.id, None)
+        if _engine is not None:
+            _engine.extend(added)
+        top = max((row.id for row in rows), default=0)
+        if top > _max_loaded_id:
+            _await_gaps(_index, _max_loaded_id, top, now)
+            _max_loaded_id = top
+        for skipped, since in list(_missing_ids.items()):
+            if now - since > GAP_RETRY_SECONDS:
+                del _missing_ids[skipped]
+
+
+def _replace_rows(rows):
+    """Swap in an index built from all rows; the DistanceEngine is rebuilt on the next batch lookup."""
+    global _index, _engine, _max_loaded_id
+    index = GridIndex()
+    for row in rows:
+        index.add(IndexedLocation(row.id, row.company_name, row.latitude, row.longitude))
+    top = max((row.id for row in rows), default=0)
+    with _sync_lock:
+        _index, _engine, _max_loaded_id = index, None, top
+        _missing_ids.clear()
+        # Also covers locations registered here while the reload query ran
+        _await_gaps(index, 0, top, time.monotonic())
+
+
+def _apply(rows, full: bool) -> GridIndex:
+    if full:
+        _replace_rows(rows)
+    else:
+        _load_rows(rows)
+    return _index
+
+
+def _reload_failed():
+    global _reloaded_at
+    with _sync_lock:
+        _reloaded_at = None
+
+
+def sync_index(db: Session) -> GridIndex:
+    """Load any company locations the index has not seen yet, or all of them when a reload is due."""
+    query, full = _next_query()
+    try:
+        rows = db.execute(query).all()
+    except Exception:
+        if full:
+            _reload_failed()
+        raise
+    return _apply(rows, full)
+
+
+async def sync_index_async(db: AsyncSession) -> GridIndex:
+    query, full = _next_query()
+    try:
+        rows = (await db.execute(query)).all()
+    except Exception:
+        if full:
+            _reload_failed()
+        raise
+    return _apply(rows, full)
+
+
+def find_nearest(db: Session, lat: float, lon: float, threshold_meters: float) -> Optional[IndexedLocation]:
+    """Return the nearest company location within ``threshold_meters``, or None."""
+    index = sync_index(db)
+    nearest, _ = index.nearest(lat, lon, threshold_meters)
+    return nearest
+
+
+async def find_nearest_async(db: AsyncSession, lat: float, lon: float, threshold_meters: float) -> Optional[IndexedLocation]:
+    index = await sync_index_async(db)
+    nearest, _ = index.nearest(lat, lon, threshold_meters)
+    return nearest
+
+
+def _get_engine() -> Optional[DistanceEngine]:
+    global _engine
+    if _engine is None and numpy_available():
+        with _sync_lock:
+            if _engine is None:
+                engine = DistanceEngine()
+                engine.extend(_index.locations())
+                _engine = engine
+    return _engine
+
+
+def find_nearest_batch(
+    db: Session, points: Sequence[Tuple[float, float]], threshold_meters: float
+) -> List[Optional[Tuple[int, str, float]]]:
+    """
+    Resolve the nearest company location for many (lat, lon) points at once.
+
+    Uses the vectorized DistanceEngine when numpy is available and falls back to
+    per-point grid lookups otherwise.
+
+    Returns:
+        One (location_id, company_name, distance_meters) tuple per point, or None.
+    """
+    index = sync_index(db)
+    engine = _get_engine()
+    if engine is not None:
+        return engine.nearest_within([p[0] for p in points], [p[1] for p in points], threshold_meters)
+
+    results = []
+    for lat, lon in points:
+        nearest, dist = index.nearest(lat, lon, threshold_meters)
+        results.append((nearest.id, nearest.company_name, dist) if nearest else None)
+    return results
+
+
+def reset_index():
+    """Drop the in-process index so the next lookup reloads it from the database."""
+    global _index, _engine, _max_loaded_id, _reloaded_at
+    with _sync_lock:
+        _index = GridIndex()
+        _engine = None
+        _max_loaded_id = 0
+        _missing_ids.clear()
+        _reloaded_at = None
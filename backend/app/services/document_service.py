@@ -1,26 +1,35 @@
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, noload
 from app.models.document import Document
 
-def create_document(db: Session, vendor_id: int, document_type: str, file_url: str):
-    # Check for existing document of this type
-    existing_doc = db.query(Document).filter(
+def _replace_existing(vendor_id: int, document_type: str):
+    # One DELETE for any existing document of this type, no SELECT first
+    return delete(Document).where(
         Document.vendor_id == vendor_id,
         Document.document_type == document_type
-    ).first()
-    
-    if existing_doc:
-        print(f"DEBUG: Deleting existing document ID {existing_doc.id} of type {document_type}")
-        db.delete(existing_doc)
-        db.commit()
+    )
+
+def create_document(db: Session, vendor_id: int, document_type: str, file_url: str):
+    db.execute(_replace_existing(vendor_id, document_type))
+    db_document = Document(
+        vendor_id=vendor_id,
+        document_type=document_type,
+        file_url=file_url
+    )
+    db.add(db_document)
+    db.flush()
+    return db_document
 
+async def create_document_async(db: AsyncSession, vendor_id: int, document_type: str, file_url: str):
+    await db.execute(_replace_existing(vendor_id, document_type))
     db_document = Document(
         vendor_id=vendor_id,
         document_type=document_type,
         file_url=file_url
     )
     db.add(db_document)
-    db.commit()
-    db.refresh(db_document)
+    await db.flush()
     return db_document
 
 def get_profile_documents(db: Session, vendor_id: int):
@@ -0,0 +1,37 @@
+import io
+from app.core.config import settings
+from app.core.process_pool import BoundedProcessPool, PoolSaturatedError
+from app.utils.image_normalize import normalize_image
+
+image_pool = BoundedProcessPool(
+    "image_normalization",
+    max_workers=settings.IMAGE_WORKERS,
+    max_queue=settings.IMAGE_MAX_QUEUE,
+)
+
+
+def _arguments(data: bytes, max_dimension: int):
+    return data, max_dimension, settings.IMAGE_FORMAT, settings.IMAGE_QUALITY
+
+
+async def prepare_upload(data: bytes, max_dimension: int) -> io.BytesIO:
+    """
+    File to upload for an image received by a route: normalized in the image
+    pool (see normalize_image), or the original bytes for non-images and
+    when normalization is disabled. A full pool raises PoolSaturatedError
+    (503), like password hashing.
+    """
+    if settings.IMAGE_NORMALIZE_ENABLED:
+        data = await image_pool.run(normalize_image, *_arguments(data, max_dimension)) or data
+    return io.BytesIO(data)
+
+
+def prepare_upload_sync(data: bytes, max_dimension: int) -> io.BytesIO:
+    """Blocking variant for background workers, which normalize in their own thread when the pool is full."""
+    if settings.IMAGE_NORMALIZE_ENABLED:
+        try:
+            normalized = image_pool.run_sync(normalize_image, *_arguments(data, max_dimension))
+        except PoolSaturatedError:
+            normalized = normalize_image(*_arguments(data, max_dimension))
+        data = normalized or data
+    return io.BytesIO(data)
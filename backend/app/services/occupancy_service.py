@@ -0,0 +1,132 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.visit import Visit
+
+# Process-wide count of open visits per visited_company ("" for visits with
+# no known company). Check-ins and check-outs made through this process
+# update it as their transaction commits; a recount from the open-visits
+# index, lazily once the counts are OCCUPANCY_REFRESH_SECONDS old, picks up
+# other workers and the auto-close sweep. A write committing while a
+# recount runs may be counted twice or not at all until the next recount.
+_counts: Dict[str, int] = {}
+_total = 0
+_refreshed_at: Optional[datetime] = None
+_refreshed_monotonic: Optional[float] = None
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+
+def track(db, visit: Visit, was_open: bool):
+    """
+    Note that ``visit`` was checked in (``was_open`` False) or checked out
+    (``was_open`` True) in the session's transaction. Its effect on the
+    counters is worked out when the transaction commits.
+    """
+    # Keyed by object, so a visit checked in and out in one transaction (a
+    # sync batch) keeps the state it had before the transaction
+    db.info.setdefault("occupancy_tracked", {}).setdefault(id(visit), (visit, was_open))
+
+
+@event.listens_for(Session, "before_commit")
+def _compute_deltas(session):
+    if session.in_nested_transaction():
+        return
+    deltas: Dict[str, int] = {}
+    for visit, was_open in session.info.pop("occupancy_tracked", {}).values():
+        # A visit checked in inside a savepoint that rolled back left the
+        # session; one checked out in such a savepoint reloads as still open
+        if visit not in session:
+            continue
+        delta = (visit.check_out_time is None) - was_open
+        if delta:
+            company = visit.visited_company or ""
+            deltas[company] = deltas.get(company, 0) + delta
+    if deltas:
+        session.info["occupancy_deltas"] = deltas
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed_deltas(session):
+    if session.in_nested_transaction():
+        return
+    deltas = session.info.pop("occupancy_deltas", None)
+    if deltas:
+        apply(deltas)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_uncommitted_deltas(session):
+    if not session.in_nested_transaction():
+        session.info.pop("occupancy_tracked", None)
+        session.info.pop("occupancy_deltas", None)
+
+
+def apply(deltas: Dict[str, int]):
+    global _total
+    with _lock:
+        for company, delta in deltas.items():
+            previous = _counts.get(company, 0)
+            # Never below zero: a check-out of a visit the last recount missed
+            count = max(previous + delta, 0)
+            if count:
+                _counts[company] = count
+            else:
+                _counts.pop(company, None)
+            _total += count - previous
+
+
+def count_open(db: Session) -> Dict[str, int]:
+    """Open visits per visited_company, straight from the open-visits index."""
+    company = func.coalesce(Visit.visited_company, "")
+    rows = db.execute(select(company, func.count()).where(Visit.check_out_time.is_(None)).group_by(company))
+    return {key: count for key, count in rows}
+
+
+def rebuild(db: Session):
+    """Replace the counters with a recount from the database."""
+    global _counts, _total, _refreshed_at, _refreshed_monotonic
+    counts = count_open(db)
+    with _lock:
+        _counts, _total = counts, sum(counts.values())
+        _refreshed_at = datetime.now(timezone.utc)
+        _refreshed_monotonic = time.monotonic()
+
+
+def refresh_if_stale(db: Session):
+    """Recount once the counters are older than OCCUPANCY_REFRESH_SECONDS; one thread recounts, the others read on."""
+    if _refreshed_monotonic is not None and time.monotonic() - _refreshed_monotonic < settings.OCCUPANCY_REFRESH_SECONDS:
+        return
+    if not _refresh_lock.acquire(blocking=False):
+        if _refreshed_monotonic is not None:
+            return
+        # Never counted yet: wait for the recount in progress
+        _refresh_lock.acquire()
+    try:
+        if _refreshed_monotonic is None or time.monotonic() - _refreshed_monotonic >= settings.OCCUPANCY_REFRESH_SECONDS:
+            rebuild(db)
+    finally:
+        _refresh_lock.release()
+
+
+def get_occupancy(company: Optional[str] = None) -> Dict:
+    """
+    Open visits per company and in total, or for one company key only (the
+    total is then that company's). Dictionary lookups; no database access.
+    """
+    with _lock:
+        if company is not None:
+            companies = {company: _counts.get(company, 0)}
+            total = companies[company]
+        else:
+            companies, total = dict(_counts), _total
+        refreshed_at = _refreshed_at
+    return {
+        "total": total,
+        "companies": [{"company": key or None, "open": count} for key, count in sorted(companies.items())],
+        "refreshed_at": refreshed_at,
+    }
@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.core import local_store
+from app.core.config import settings
+from app.models.otp import OTP
+
+
+class OTPStore(ABC):
+    """
+    Storage for one-time passcodes keyed by (identifier, purpose).
+
+    Issuing a code replaces any previous code for the same key. A successful
+    verification consumes the code; after ``max_attempts`` wrong guesses the
+    code is discarded as well.
+    """
+
+    def __init__(self, ttl_seconds: int, max_attempts: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_attempts = max_attempts
+
+    @abstractmethod
+    def issue(self, db: Session, identifier: str, purpose: str, code: str):
+        """Store ``code`` for (identifier, purpose), replacing any previous one."""
+
+    @abstractmethod
+    def verify(self, db: Session, identifier: str, purpose: str, code: str) -> bool:
+        """Check ``code`` and consume it on success; count a failed attempt otherwise."""
+
+
+class MemoryOTPStore(OTPStore):
+    """
+    Per-process store. Only suitable for single-worker deployments and tests.
+
+    Every code gets the same TTL, so insertion order is expiry order and a
+    FIFO of (expires_at, key) lets each sweep pop exactly the expired entries.
+    """
+
+    def __init__(self, ttl_seconds: int, max_attempts: int):
+        super().__init__(ttl_seconds, max_attempts)
+        self._codes: Dict[Tuple[str, str], list] = {}
+        self._expiry = deque()
+        self._lock = threading.Lock()
+
+    def _sweep(self, now: float):
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, key = self._expiry.popleft()
+            entry = self._codes.get(key)
+            # Skip keys that were re-issued after this expiry was queued
+            if entry is not None and entry[1] == expires_at:
+                del self._codes[key]
+
+    def issue(self, db: Session, identifier: str, purpose: str, code: str):
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._sweep(now)
+            self._codes[(identifier, purpose)] = [code, expires_at, 0]
+            self._expiry.append((expires_at, (identifier, purpose)))
+
+    def verify(self, db: Session, identifier: str, purpose: str, code: str) -> bool:
+        now = time.time()
+        key = (identifier, purpose)
+        with self._lock:
+            self._sweep(now)
+            entry = self._codes.get(key)
+            if entry is None:
+                return False
+            if entry[0] == code:
+                del self._codes[key]
+                return True
+            entry[2] += 1
+            if entry[2] >= self.max_attempts:
+                del self._codes[key]
+            return False
+
+
+class SQLiteOTPStore(OTPStore):
+    """Store shared by all workers on a host through a local SQLite file."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS otp_codes (
+        identifier TEXT NOT NULL,
+        purpose TEXT NOT NULL,
+        code TEXT NOT NULL,
+        expires_at REAL NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (identifier, purpose)
+    );
+    CREATE INDEX IF NOT EXISTS ix_otp_codes_expires_at ON otp_codes (expires_at);
+    """
+
+    # Expired rows are purged at most this often; the expires_at index makes
+    # each purge touch only the rows being deleted.
+    SWEEP_INTERVAL_SECONDS = 30
+
+    def __init__(self, ttl_seconds: int, max_attempts: int, path: str):
+        super().__init__(ttl_seconds, max_attempts)
+        self.path = path
+        self._last_sweep = 0.0
+
+    def _conn(self):
+        return local_store.get_connection(self.path, self.SCHEMA)
+
+    def _maybe_sweep(self, conn, now: float):
+        if now - self._last_sweep >= self.SWEEP_INTERVAL_SECONDS:
+            self._last_sweep = now
+            conn.execute("DELETE FROM otp_codes WHERE expires_at <= ?", (now,))
+
+    def issue(self, db: Session, identifier: str, purpose: str, code: str):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO otp_codes (identifier, purpose, code, expires_at, attempts) VALUES (?, ?, ?, ?, 0)",
+            (identifier, purpose, code, now + self.ttl_seconds),
+        )
+        self._maybe_sweep(conn, now)
+
+    def verify(self, db: Session, identifier: str, purpose: str, code: str) -> bool:
+        now = time.time()
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front so attempt counting is atomic across workers
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT code, expires_at, attempts FROM otp_codes WHERE identifier = ? AND purpose = ?",
+                (identifier, purpose),
+            ).fetchone()
+            result = False
+            if row is not None:
+                stored_code, expires_at, attempts = row
+                if expires_at <= now or stored_code == code or attempts + 1 >= self.max_attempts:
+                    conn.execute("DELETE FROM otp_codes WHERE identifier = ? AND purpose = ?", (identifier, purpose))
+                    result = expires_at > now and stored_code == code
+                else:
+                    conn.execute(
+                        "UPDATE otp_codes SET attempts = attempts + 1 WHERE identifier = ? AND purpose = ?",
+                        (identifier, purpose),
+                    )
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+class DatabaseOTPStore(OTPStore):
+    """
+    Fallback that keeps codes in the primary database's ``otps`` table.
+
+    Works across hosts (e.g. serverless instances) at the cost of write
+    statements on the primary for every request. Attempts are not counted
+    because the table has no column for them.
+    """
+
+    def issue(self, db: Session, identifier: str, purpose: str, code: str):
+        # Expire old OTPs for this identifier/purpose, and purge expired ones
+        now = datetime.now(timezone.utc)
+        db.query(OTP).filter(OTP.identifier == identifier, OTP.purpose == purpose).delete()
+        db.query(OTP).filter(OTP.expires_at <= now).delete()
+        db.add(OTP(identifier=identifier, code=code, purpose=purpose, expires_at=now + timedelta(seconds=self.ttl_seconds)))
+
+    def verify(self, db: Session, identifier: str, purpose: str, code: str) -> bool:
+        otp = db.query(OTP).filter(
+            OTP.identifier == identifier,
+            OTP.code == code,
+            OTP.purpose == purpose,
+            OTP.expires_at > datetime.now(timezone.utc)
+        ).first()
+        if otp:
+            db.delete(otp)
+            return True
+        return False
+
+
+_store: Optional[OTPStore] = None
+_store_lock = threading.Lock()
+
+
+def resolve_backend() -> str:
+    backend = settings.OTP_STORE_BACKEND
+    if backend == "auto":
+        # Serverless invocations don't share a disk, so a code issued by one
+        # could not be verified by the next
+        backend = "database" if os.environ.get("VERCEL") else "sqlite"
+    return backend
+
+
+def get_store() -> OTPStore:
+    """Return the process-wide store selected by ``OTP_STORE_BACKEND``."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = resolve_backend()
+                ttl, attempts = settings.OTP_TTL_SECONDS, settings.OTP_MAX_ATTEMPTS
+                if backend == "memory":
+                    _store = MemoryOTPStore(ttl, attempts)
+                elif backend == "sqlite":
+                    _store = SQLiteOTPStore(ttl, attempts, settings.OTP_STORE_PATH or local_store.default_path("vms_otp.sqlite3"))
+                elif backend == "database":
+                    _store = DatabaseOTPStore(ttl, attempts)
+                else:
+                    raise ValueError(f"Unknown OTP_STORE_BACKEND: {backend}")
+    return _store
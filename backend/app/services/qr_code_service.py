@@ -6,14 +6,23 @@ from sqlalchemy.orm import Session
 from app.models.vendor import Vendor
 from app.utils.cloudinary_util import upload_image_to_cloudinary
 
-# Try to import qrcode, but make it optional
-try:
-    import qrcode
-    QRCODE_AVAILABLE = True
-except ImportError:
-    QRCODE_AVAILABLE = False
-    print("WARNING: qrcode package not installed. QR code generation will be disabled.")
-    print("Install it with: pip install qrcode Pillow")
+# qrcode (and Pillow behind it) is optional and imported on first use, so
+# processes that never generate a QR code don't pay for loading it.
+qrcode = None
+_qrcode_checked = False
+
+
+def qrcode_available() -> bool:
+    global qrcode, _qrcode_checked
+    if not _qrcode_checked:
+        try:
+            import qrcode as qrcode_module
+            qrcode = qrcode_module
+        except ImportError:
+            print("WARNING: qrcode package not installed. QR code generation will be disabled.")
+            print("Install it with: pip install qrcode Pillow")
+        _qrcode_checked = True
+    return qrcode is not None
 
 
 def generate_qr_code_data(vendor: Vendor) -> Dict[str, str]:
@@ -41,7 +50,7 @@ def generate_qr_code_image(qr_data: Dict[str, str]) -> io.BytesIO:
     Returns:
         BytesIO object containing the QR code image
     """
-    if not QRCODE_AVAILABLE:
+    if not qrcode_available():
         raise ImportError("qrcode package is not installed. Please install it with: pip install qrcode Pillow")
     
     # Convert dict to JSON string
@@ -96,8 +105,6 @@ def generate_and_save_qr_code(db: Session, vendor: Vendor) -> Optional[str]:
             vendor.qr_code_data = qr_data_json
             vendor.qr_code_image_url = qr_url
             vendor.qr_code_generated_at = datetime.now(timezone.utc)
-            db.commit()
-            db.refresh(vendor)
             return qr_url
         else:
             print(f"ERROR: Failed to upload QR code to Cloudinary for vendor {vendor.id}")
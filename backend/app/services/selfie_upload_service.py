@@ -0,0 +1,354 @@
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import and_, event, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core import database
+from app.core.config import settings
+from app.models.selfie_upload import SelfieUpload, SelfieUploadStatus
+from app.models.visit import Visit
+from app.services import image_service
+from app.utils.cloudinary_util import upload_image_to_cloudinary
+
+logger = logging.getLogger(__name__)
+
+# Visit column each kind of selfie fills in
+URL_COLUMNS = {"check_in": Visit.check_in_selfie_url, "check_out": Visit.check_out_selfie_url}
+
+# An "uploading" row untouched for this long belongs to a worker that died.
+# A row of another spool left this long without being claimed belongs to an
+# instance that is gone, and is marked failed.
+STALE_UPLOAD_SECONDS = 600
+
+_spool_id: Optional[str] = None
+
+
+def spool_dir() -> str:
+    # Spooled selfies must outlive the process (and, on Render, the instance):
+    # with no persistent directory configured, selfies are uploaded inline
+    if not settings.SELFIE_SPOOL_DIR:
+        raise RuntimeError("SELFIE_SPOOL_DIR is not set")
+    os.makedirs(settings.SELFIE_SPOOL_DIR, exist_ok=True)
+    return settings.SELFIE_SPOOL_DIR
+
+
+def spool_id() -> str:
+    """
+    Id of the spool directory, kept in a file inside it. Uploads are owned by
+    the spool holding their file rather than by a hostname, so an instance
+    restarted with a new hostname on the same disk carries on with them.
+    """
+    global _spool_id
+    if _spool_id is None:
+        path = os.path.join(spool_dir(), ".spool_id")
+        if not os.path.exists(path):
+            partial = f"{path}.{uuid.uuid4().hex}.part"
+            with open(partial, "w") as out:
+                out.write(uuid.uuid4().hex)
+            try:
+                # Fails if another process created the id first; theirs wins
+                os.link(partial, path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(partial)
+        with open(path) as f:
+            _spool_id = f.read().strip()
+    return _spool_id
+
+
+def spool(file, filename: Optional[str] = None) -> str:
+    """Copy an uploaded selfie to the spool directory and return its path. Blocking; run it in the threadpool."""
+    suffix = os.path.splitext(filename or "")[1][:10]
+    path = os.path.join(spool_dir(), f"{uuid.uuid4().hex}{suffix}")
+    # Written under a temporary name, so a worker never sees half a file
+    partial = f"{path}.part"
+    with open(partial, "wb") as out:
+        shutil.copyfileobj(file, out)
+    os.replace(partial, path)
+    return path
+
+
+def discard_spooled(path: Optional[str]):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _new_upload(visit_id: int, kind: str, path: str) -> SelfieUpload:
+    return SelfieUpload(visit_id=visit_id, kind=kind, status=SelfieUploadStatus.PENDING.value,
+                        spool_path=path, spool_host=spool_id(), attempts=0,
+                        # This host's clock, like the workers' due checks
+                        next_attempt_at=datetime.now(timezone.utc))
+
+
+def enqueue(db: Session, visit_id: int, kind: str, path: str) -> SelfieUpload:
+    """Record a spooled selfie for upload. Only flushes; the workers pick it up once the session commits."""
+    upload = _new_upload(visit_id, kind, path)
+    db.add(upload)
+    db.flush()
+    db.info.setdefault("selfie_uploads_queued", []).append(upload.id)
+    return upload
+
+
+async def enqueue_async(db: AsyncSession, visit_id: int, kind: str, path: str) -> SelfieUpload:
+    upload = _new_upload(visit_id, kind, path)
+    db.add(upload)
+    await db.flush()
+    db.info.setdefault("selfie_uploads_queued", []).append(upload.id)
+    return upload
+
+
+@event.listens_for(Session, "after_commit")
+def _submit_committed_uploads(session):
+    if session.in_nested_transaction():
+        return
+    for upload_id in session.info.pop("selfie_uploads_queued", ()):
+        pipeline.submit(upload_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_uncommitted_uploads(session):
+    if not session.in_nested_transaction():
+        session.info.pop("selfie_uploads_queued", None)
+
+
+def _status_columns():
+    return (SelfieUpload.id, SelfieUpload.kind, SelfieUpload.status, SelfieUpload.attempts,
+            SelfieUpload.url, SelfieUpload.last_error, SelfieUpload.created_at, SelfieUpload.updated_at)
+
+
+async def get_statuses_async(db: AsyncSession, visit_id: int) -> List[Dict]:
+    """Upload state of a visit's selfies, oldest first. Plain rows, so repeated polls see fresh values."""
+    rows = await db.execute(select(*_status_columns()).where(SelfieUpload.visit_id == visit_id).order_by(SelfieUpload.id))
+    return [dict(row._mapping) for row in rows]
+
+
+def in_progress(statuses: List[Dict]) -> bool:
+    return any(s["status"] in (SelfieUploadStatus.PENDING.value, SelfieUploadStatus.UPLOADING.value) for s in statuses)
+
+
+# --- Worker side -------------------------------------------------------------
+
+def _claim(db: Session, upload_id: int, now: datetime) -> Optional[SelfieUpload]:
+    # The conditional UPDATE lets exactly one worker (of any process sharing the spool) take the upload
+    claimed = db.execute(
+        update(SelfieUpload)
+        .where(SelfieUpload.id == upload_id, SelfieUpload.spool_host == spool_id(),
+               SelfieUpload.status == SelfieUploadStatus.PENDING.value, SelfieUpload.next_attempt_at <= now)
+        .values(status=SelfieUploadStatus.UPLOADING.value, attempts=SelfieUpload.attempts + 1, updated_at=now)
+    ).rowcount
+    return db.get(SelfieUpload, upload_id) if claimed else None
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=settings.SELFIE_UPLOAD_RETRY_SECONDS * 2 ** (attempts - 1))
+
+
+def process(upload_id: int) -> Optional[str]:
+    """
+    Upload one due selfie and fill in its visit's URL. Returns the resulting
+    status, or None if the upload was not due or another worker took it.
+    """
+    now = datetime.now(timezone.utc)
+    with database.unit_of_work() as db:
+        upload = _claim(db, upload_id, now)
+        if upload is None:
+            return None
+        path, kind, visit_id, attempts = upload.spool_path, upload.kind, upload.visit_id, upload.attempts
+
+    url, error = None, None
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        # The spool file is gone; retrying cannot help
+        error, attempts = f"Spooled selfie unreadable: {e}", settings.SELFIE_UPLOAD_MAX_ATTEMPTS
+    else:
+        try:
+            url = upload_image_to_cloudinary(image_service.prepare_upload_sync(data, settings.SELFIE_MAX_DIMENSION), "selfies")
+            if not url:
+                error = "Cloudinary upload failed"
+        except Exception as e:
+            # Normalizing or uploading raised: back off and retry like a failed upload
+            error = f"Upload failed: {e}"
+
+    done = datetime.now(timezone.utc)
+    with database.unit_of_work() as db:
+        if url:
+            # A newer selfie of the same kind (checked out again) wins, whichever upload finishes first
+            newer = select(SelfieUpload.id).where(SelfieUpload.visit_id == visit_id, SelfieUpload.kind == kind,
+                                                  SelfieUpload.id > upload_id).exists()
+            db.execute(update(Visit).where(Visit.id == visit_id, ~newer).values({URL_COLUMNS[kind]: url}))
+            values = {"status": SelfieUploadStatus.DONE.value, "url": url, "last_error": None}
+        elif attempts >= settings.SELFIE_UPLOAD_MAX_ATTEMPTS:
+            values = {"status": SelfieUploadStatus.FAILED.value, "last_error": error}
+        else:
+            values = {"status": SelfieUploadStatus.PENDING.value, "last_error": error,
+                      "next_attempt_at": done + retry_delay(attempts)}
+        db.execute(update(SelfieUpload).where(SelfieUpload.id == upload_id).values(updated_at=done, **values))
+    if url:
+        discard_spooled(path)
+    return values["status"]
+
+
+def fail_abandoned(db: Session, now: datetime) -> int:
+    """
+    Mark failed the uploads of other spools that nobody claimed within
+    STALE_UPLOAD_SECONDS of being due, or stopped updating mid-upload: their
+    files went away with the instance that received them. Returns how many.
+    """
+    stale = now - timedelta(seconds=STALE_UPLOAD_SECONDS)
+    return db.execute(
+        update(SelfieUpload)
+        .where(SelfieUpload.spool_host != spool_id(),
+               or_(and_(SelfieUpload.status == SelfieUploadStatus.PENDING.value, SelfieUpload.next_attempt_at < stale),
+                   and_(SelfieUpload.status == SelfieUploadStatus.UPLOADING.value, SelfieUpload.updated_at < stale)))
+        .values(status=SelfieUploadStatus.FAILED.value, updated_at=now,
+                last_error=f"Abandoned: no worker with its spool picked it up for {STALE_UPLOAD_SECONDS}s; "
+                           "the spooled selfie was lost with the instance that received it")
+    ).rowcount
+
+
+def due_uploads(limit: int = 500) -> List[int]:
+    """
+    This spool's uploads that are due, reviving those whose worker died
+    mid-upload and failing those abandoned by other spools.
+    """
+    now = datetime.now(timezone.utc)
+    with database.unit_of_work() as db:
+        db.execute(
+            update(SelfieUpload)
+            .where(SelfieUpload.spool_host == spool_id(), SelfieUpload.status == SelfieUploadStatus.UPLOADING.value,
+                   SelfieUpload.updated_at < now - timedelta(seconds=STALE_UPLOAD_SECONDS))
+            .values(status=SelfieUploadStatus.PENDING.value, next_attempt_at=now)
+        )
+        abandoned = fail_abandoned(db, now)
+        if abandoned:
+            logger.warning("Marked %d abandoned selfie uploads of other spools as failed", abandoned)
+        return list(db.scalars(
+            select(SelfieUpload.id)
+            .where(SelfieUpload.status == SelfieUploadStatus.PENDING.value, SelfieUpload.next_attempt_at <= now,
+                   SelfieUpload.spool_host == spool_id())
+            .order_by(SelfieUpload.next_attempt_at)
+            .limit(limit)
+        ))
+
+
+def status_counts(db: Session) -> Dict[str, int]:
+    return dict(db.execute(select(SelfieUpload.status, func.count()).group_by(SelfieUpload.status)).all())
+
+
+class SelfieUploadPipeline:
+    """
+    Background threads uploading spooled selfies. New uploads arrive through
+    ``submit`` right after their check-in commits; a sweeper thread requeues
+    retries once their backoff has passed and uploads left over from a
+    previous run. Each upload is claimed in the database, so any number of
+    worker processes can share the spool directory. Stopping drains the
+    queue first, within SELFIE_UPLOAD_DRAIN_SECONDS; whatever is left stays
+    pending in the spool for the next start.
+    """
+
+    def __init__(self):
+        self._queue: "queue.Queue[Optional[int]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "done": 0, "retried": 0, "failed": 0, "errors": 0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def start(self, workers: int = None):
+        spool_id()  # fails without a spool directory, before any thread starts
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            # Drop whatever an earlier stop left queued; those uploads are still pending
+            self._queue = queue.Queue()
+            for i in range(workers or settings.SELFIE_UPLOAD_WORKERS):
+                self._threads.append(threading.Thread(target=self._work, name=f"selfie-upload-{i}", daemon=True))
+            self._threads.append(threading.Thread(target=self._sweep, name="selfie-upload-sweep", daemon=True))
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout: float = None):
+        """Stop sweeping and let the workers finish the queued and due uploads, for at most ``timeout`` seconds."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if not threads:
+            return
+        self._stop.set()
+        try:
+            for upload_id in due_uploads():
+                self._queue.put(upload_id)
+        except Exception:
+            logger.exception("Selfie upload sweep failed")
+        # Queued behind the uploads, so each worker exits once the queue is drained
+        for _ in threads:
+            self._queue.put(None)
+        deadline = time.monotonic() + (settings.SELFIE_UPLOAD_DRAIN_SECONDS if timeout is None else timeout)
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        left = sum(1 for upload_id in list(self._queue.queue) if upload_id is not None)
+        if left:
+            logger.warning("%d selfie uploads still queued at shutdown; they resume on the next start", left)
+
+    def submit(self, upload_id: int):
+        # Without running workers the sweeper of the next start picks it up
+        if self.running:
+            with self._lock:
+                self._stats["submitted"] += 1
+            self._queue.put(upload_id)
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _work(self):
+        while True:
+            upload_id = self._queue.get()
+            if upload_id is None:
+                return
+            try:
+                status = process(upload_id)
+            except Exception:
+                logger.exception("Selfie upload %s failed", upload_id)
+                self._count("errors")
+                continue
+            if status == SelfieUploadStatus.DONE.value:
+                self._count("done")
+            elif status == SelfieUploadStatus.PENDING.value:
+                self._count("retried")
+            elif status == SelfieUploadStatus.FAILED.value:
+                self._count("failed")
+
+    def _sweep(self):
+        while not self._stop.is_set():
+            try:
+                for upload_id in due_uploads():
+                    self._queue.put(upload_id)
+            except Exception:
+                logger.exception("Selfie upload sweep failed")
+            self._stop.wait(settings.SELFIE_UPLOAD_SWEEP_SECONDS)
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        return {"running": self.running, "workers": max(len(self._threads) - 1, 0),
+                "queue_depth": self._queue.qsize(), **stats}
+
+
+pipeline = SelfieUploadPipeline()
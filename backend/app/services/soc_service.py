@@ -6,24 +6,21 @@ from app.core.security import get_password_hash
 from app.utils.soc import generate_soc_id
 import logging
 
-def create_soc_profile(db: Session, profile_in: SOCProfileCreate):
+def create_soc_profile(db: Session, profile_in: SOCProfileCreate, hashed_password: str = None):
     # 1. Create User
     db_user = User(
         email=profile_in.email,
-        hashed_password=get_password_hash(profile_in.password),
+        hashed_password=hashed_password or get_password_hash(profile_in.password),
         full_name=profile_in.full_name,
         role=UserRole.VISITOR
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
 
     # 2. Generate unique SOC ID
     soc_id = generate_soc_id()
     
-    # 3. Create SOC Profile
+    # 3. Create SOC Profile, inserted with the user in a single flush
     db_profile = SOCProfile(
-        user_id=db_user.id,
+        user=db_user,
         soc_id=soc_id,
         phone_number=profile_in.phone_number,
         company_name=profile_in.company_name,
@@ -33,8 +30,7 @@ def create_soc_profile(db: Session, profile_in: SOCProfileCreate):
         device_id=profile_in.device_id
     )
     db.add(db_profile)
-    db.commit()
-    db.refresh(db_profile)
+    db.flush()
     return db_profile
 
 def get_profile_by_soc_id(db: Session, soc_id: str):
@@ -50,6 +46,4 @@ def update_profile(db: Session, db_profile: SOCProfile, profile_in: SOCProfileUp
     update_data = profile_in.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_profile, field, value)
-    db.commit()
-    db.refresh(db_profile)
     return db_profile
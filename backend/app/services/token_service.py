@@ -0,0 +1,98 @@
+import hashlib
+import logging
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.refresh_token import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_token(raw_token: str) -> str:
+    # Refresh tokens are 256-bit random values, so a fast digest is sufficient
+    return hashlib.sha256(raw_token.encode()).hexdigest()
+
+
+def issue_refresh_token(db: Session, user_id: int, family_id: str = None) -> str:
+    """
+    Create a refresh token for a user and return the raw token.
+
+    A new login starts a new family; rotations pass the family of the token
+    being replaced.
+    """
+    now = datetime.now(timezone.utc)
+    if family_id is None:
+        family_id = secrets.token_hex(16)
+        # New login: drop this user's expired tokens to keep the table compact
+        db.query(RefreshToken).filter(
+            RefreshToken.user_id == user_id,
+            RefreshToken.expires_at < now
+        ).delete(synchronize_session=False)
+
+    raw_token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        user_id=user_id,
+        token_hash=_hash_token(raw_token),
+        family_id=family_id,
+        expires_at=now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return raw_token
+
+
+def revoke_family(db: Session, family_id: str):
+    # Committed immediately: on token reuse the request fails with 401, and the
+    # revocation must survive the unit of work rolling back
+    db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id,
+        RefreshToken.revoked_at == None
+    ).update({RefreshToken.revoked_at: datetime.now(timezone.utc)}, synchronize_session=False)
+    db.commit()
+
+
+def rotate_refresh_token(db: Session, raw_token: str) -> Optional[Tuple[int, str]]:
+    """
+    Exchange a refresh token for a new one in the same family.
+
+    Returns:
+        (user_id, new raw token), or None if the token is unknown, expired or
+        was already used. Presenting an already rotated token is treated as
+        theft and revokes every token in its family.
+    """
+    now = datetime.now(timezone.utc)
+    token = db.query(RefreshToken).filter(RefreshToken.token_hash == _hash_token(raw_token)).first()
+    if token is None:
+        return None
+
+    if token.revoked_at is not None:
+        logger.warning("Refresh token reuse detected for user %s; revoking family %s", token.user_id, token.family_id)
+        revoke_family(db, token.family_id)
+        return None
+
+    expires_at = token.expires_at
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    if expires_at <= now:
+        return None
+
+    # Conditional update so two concurrent refreshes cannot both rotate the same token
+    claimed = db.query(RefreshToken).filter(
+        RefreshToken.id == token.id,
+        RefreshToken.revoked_at == None
+    ).update({RefreshToken.revoked_at: now}, synchronize_session=False)
+    if claimed != 1:
+        db.rollback()
+        revoke_family(db, token.family_id)
+        return None
+
+    return token.user_id, issue_refresh_token(db, token.user_id, family_id=token.family_id)
+
+
+def revoke_refresh_token(db: Session, raw_token: str) -> bool:
+    """Revoke the family of the given refresh token (logout from that device)."""
+    token = db.query(RefreshToken).filter(RefreshToken.token_hash == _hash_token(raw_token)).first()
+    if token is None:
+        return False
+    revoke_family(db, token.family_id)
+    return True
@@ -1,3 +1,5 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
 from app.models.vendor import Vendor, VerificationStatus
 from typing import Dict, Any
@@ -14,6 +16,11 @@ def get_vendor_by_user_id(db: Session, user_id: int):
         print(f"DEBUG vendor_service: No vendor found for user_id {user_id}")
     return vendor
 
+async def get_vendor_by_user_id_async(db: AsyncSession, user_id: int):
+    # Async routes only need the vendor row itself, so the user isn't joined in
+    result = await db.execute(select(Vendor).where(Vendor.user_id == user_id))
+    return result.scalars().first()
+
 def get_vendor_by_id(db: Session, vendor_id: int):
     return db.query(Vendor).options(joinedload(Vendor.user)).filter(Vendor.id == vendor_id).first()
 
@@ -40,8 +47,6 @@ def update_vendor(db: Session, vendor_id: int, update_data: Dict[str, Any]):
             for key, value in user_update_data.items():
                 setattr(vendor.user, key, value)
         
-        db.commit()
-        db.refresh(vendor)
         
         # Regenerate QR code if needed and vendor is verified
         if needs_qr_regeneration and vendor.verification_status == VerificationStatus.VERIFIED:
@@ -57,8 +62,6 @@ def verify_profile(db: Session, vendor_id: int):
         if not vendor.vendor_uid:
             import uuid
             vendor.vendor_uid = str(uuid.uuid4())[:8].upper()
-        db.commit()
-        db.refresh(vendor)
         
         # Always generate QR code after verification (even if one exists, regenerate to ensure it's current)
         if vendor.verification_status == VerificationStatus.VERIFIED:
@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.visit import Visit
+from app.models.visit_archive import VisitArchive
+
+# Columns copied verbatim from visits into visits_archive
+ARCHIVED_COLUMNS = [c.name for c in VisitArchive.__table__.columns if c.name != "archived_at"]
+
+PARTITION_PREFIX = "visits_"
+DEFAULT_PARTITION = "visits_default"
+
+
+def archive_cutoff(older_than_days: int = None) -> datetime:
+    days = settings.VISIT_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    return datetime.now(timezone.utc) - timedelta(days=days)
+
+
+def _archivable(cutoff: datetime):
+    # Open visits stay live however old they are, so check-out can still find them
+    return (Visit.check_out_time.isnot(None), Visit.check_in_time < cutoff)
+
+
+def count_archivable(db: Session, cutoff: datetime) -> int:
+    return db.query(Visit).filter(*_archivable(cutoff)).count()
+
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int) -> int:
+    """
+    Move up to ``batch_size`` closed visits checked in before ``cutoff`` into
+    visits_archive. Only flushes; the caller commits each batch.
+    """
+    ids = db.scalars(
+        select(Visit.id).where(*_archivable(cutoff)).order_by(Visit.check_in_time).limit(batch_size)
+    ).all()
+    if not ids:
+        return 0
+
+    source = select(*(Visit.__table__.c[name] for name in ARCHIVED_COLUMNS)).where(Visit.id.in_(ids))
+    db.execute(insert(VisitArchive).from_select(ARCHIVED_COLUMNS, source))
+    # The check-in bound lets PostgreSQL prune the delete to old partitions
+    db.execute(
+        delete(Visit).where(Visit.id.in_(ids), Visit.check_in_time < cutoff),
+        execution_options={"synchronize_session": False},
+    )
+    return len(ids)
+
+
+# --- PostgreSQL monthly partitions -------------------------------------------
+
+def _month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y_%m}"
+
+
+def is_partitioned(engine: Engine) -> bool:
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = 'visits' AND c.relnamespace = current_schema()::regnamespace"
+        )).first() is not None
+
+
+def partitions(engine: Engine) -> List[str]:
+    with engine.connect() as conn:
+        return list(conn.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = 'visits' AND p.relnamespace = current_schema()::regnamespace "
+            "ORDER BY c.relname"
+        )).scalars())
+
+
+def _bounds(month: datetime) -> str:
+    return f"FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{_add_months(month, 1):%Y-%m-%d} 00:00:00+00')"
+
+
+def _create_partition(conn, month: datetime, default: str = None) -> int:
+    """
+    Create the partition for ``month`` and return how many visits were moved
+    into it. Rows for that month already in the default partition (the job
+    lapsed, or device clocks ran ahead) would make a plain CREATE ...
+    PARTITION OF fail, so then the partition is created detached, the rows
+    are moved into it and it is attached, all in the caller's transaction.
+    """
+    name = partition_name(month)
+    lower, upper = month, _add_months(month, 1)
+    in_range = "check_in_time >= :lower AND check_in_time < :upper"
+    stray = default is not None and conn.execute(
+        text(f"SELECT 1 FROM {default} WHERE {in_range} LIMIT 1"), {"lower": lower, "upper": upper}
+    ).first() is not None
+    if not stray:
+        conn.execute(text(f"CREATE TABLE {name} PARTITION OF visits FOR VALUES {_bounds(month)}"))
+        return 0
+    columns = ", ".join(c.name for c in Visit.__table__.columns)
+    conn.execute(text(f"CREATE TABLE {name} (LIKE visits INCLUDING DEFAULTS)"))
+    moved = conn.execute(text(
+        f"WITH moved AS (DELETE FROM {default} WHERE {in_range} RETURNING {columns}) "
+        f"INSERT INTO {name} ({columns}) SELECT {columns} FROM moved"
+    ), {"lower": lower, "upper": upper}).rowcount
+    # Attaching builds the partition's copies of the visits indexes
+    conn.execute(text(f"ALTER TABLE visits ATTACH PARTITION {name} FOR VALUES {_bounds(month)}"))
+    return moved
+
+
+def ensure_partitions(engine: Engine, months_ahead: int = None) -> Tuple[Dict[str, int], Dict[str, str]]:
+    """
+    Create monthly partitions from the current month through ``months_ahead``
+    months ahead, each in its own transaction. Returns, by partition name,
+    the visits moved into each partition created (from the default
+    partition) and the error of each that could not be created; the others
+    are still created.
+    """
+    if not is_partitioned(engine):
+        return {}, {}
+    ahead = settings.VISIT_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    existing = set(partitions(engine))
+    default = DEFAULT_PARTITION if DEFAULT_PARTITION in existing else None
+    current = _month_start(datetime.now(timezone.utc))
+    created, failed = {}, {}
+    for offset in range(ahead + 1):
+        month = _add_months(current, offset)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        try:
+            with engine.begin() as conn:
+                created[name] = _create_partition(conn, month, default)
+        except DBAPIError as e:
+            failed[name] = str(e.orig).strip()
+    return created, failed
+
+
+def drop_empty_partitions(engine: Engine, cutoff: datetime) -> List[str]:
+    """
+    Drop monthly partitions that ended before ``cutoff`` and were emptied by
+    archiving, so default reads only touch recent months. A partition still
+    holding an open visit is kept.
+    """
+    if not is_partitioned(engine):
+        return []
+    dropped = []
+    for name in partitions(engine):
+        try:
+            month = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y_%m").replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue  # visits_default
+        if _add_months(month, 1) > cutoff:
+            continue
+        with engine.begin() as conn:
+            if conn.execute(text(f"SELECT 1 FROM {name} LIMIT 1")).first() is None:
+                conn.execute(text(f"DROP TABLE {name}"))
+                dropped.append(name)
+    return dropped
+
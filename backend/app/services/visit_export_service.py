@@ -0,0 +1,106 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, Sequence
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core import database
+from app.core.config import settings
+from app.models.visit import Visit
+from app.models.visit_archive import VisitArchive
+from app.services.visit_service import visit_filters
+
+EXPORT_COLUMNS = [
+    "id", "vendor_id", "agent_id", "check_in_time", "check_out_time",
+    "check_in_latitude", "check_in_longitude", "check_out_latitude", "check_out_longitude",
+    "area", "pincode", "city", "state", "check_in_location", "check_out_location",
+    "purpose", "visited_company", "check_in_selfie_url", "check_out_selfie_url",
+]
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# Rows per encoded chunk handed to the response
+CHUNK_ROWS = 500
+
+
+def _export_select(model, **filters):
+    table = model.__table__
+    # Oldest first on (check_in_time, id): an ordered index scan, no sort
+    return (
+        select(*(table.c[name] for name in EXPORT_COLUMNS))
+        .where(*visit_filters(model, **filters))
+        .order_by(table.c.check_in_time, table.c.id)
+    )
+
+
+def iter_rows(db: Session, include_archive: bool = False, **filters) -> Iterator[Sequence]:
+    """
+    Visit rows as plain tuples in EXPORT_COLUMNS order, fetched through a
+    server-side cursor VISIT_EXPORT_BATCH_SIZE rows at a time. Archived
+    visits, when included, follow the live ones.
+    """
+    models = (Visit, VisitArchive) if include_archive else (Visit,)
+    for model in models:
+        result = db.execute(
+            _export_select(model, **filters),
+            execution_options={"stream_results": True, "yield_per": settings.VISIT_EXPORT_BATCH_SIZE},
+        )
+        try:
+            yield from result
+        finally:
+            result.close()
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def csv_chunks(rows: Iterable[Sequence]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_value(v) for v in row])
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def ndjson_chunks(rows: Iterable[Sequence]) -> Iterator[bytes]:
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({name: _value(v) for name, v in zip(EXPORT_COLUMNS, row)}))
+        if len(lines) == CHUNK_ROWS:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    # wbits=31 writes a gzip container, so the output is a valid .gz file
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(fmt: str, compress: bool = False, include_archive: bool = False, **filters) -> Iterator[bytes]:
+    """
+    Encoded export body for a StreamingResponse. The generator owns its read
+    session, so the cursor stays open exactly as long as the response streams
+    and is closed even if the client disconnects.
+    """
+    db = database.replica_router.session()
+    try:
+        rows = iter_rows(db, include_archive, **filters)
+        chunks = csv_chunks(rows) if fmt == "csv" else ndjson_chunks(rows)
+        yield from gzip_chunks(chunks) if compress else chunks
+    finally:
+        db.close()
@@ -1,148 +1,283 @@
+import base64
+import binascii
+import json
+from typing import List, Optional, Tuple
+from sqlalchemy import func, or_, select, true, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.models.visit import Visit
+from app.models.visit_archive import VisitArchive
 from app.models.company_location import CompanyLocation
 from app.schemas.visit import VisitCreate, VisitCheckOut
-from datetime import datetime, timezone
-import math
+from app.services import company_location_service, occupancy_service, visit_stats_service
+from app.utils.company import company_key
+from app.utils.geo import haversine_distance
+from datetime import datetime, timedelta, timezone
 
 def calculate_distance(lat1, lon1, lat2, lon2):
     # Haversine formula
-    R = 6371000  # radius of Earth in meters
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    delta_phi = math.radians(lat2 - lat1)
-    delta_lambda = math.radians(lon2 - lon1)
-    
-    a = math.sin(delta_phi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    return R * c
+    return haversine_distance(lat1, lon1, lat2, lon2)
 
 def detect_company(db: Session, lat: float, lon: float, threshold_meters: float = 300.0):
-    locations = db.query(CompanyLocation).all()
-    nearest_company = None
-    min_dist = float('inf')
-    
-    for loc in locations:
-        dist = calculate_distance(lat, lon, loc.latitude, loc.longitude)
-        if dist <= threshold_meters and dist < min_dist:
-            min_dist = dist
-            nearest_company = loc
-            
-    return nearest_company
-
-def create_visit(db: Session, visit_in: VisitCreate, vendor_id: int, selfie_url: str, user_provided_company: str = None):
+    # Served from the in-process spatial index; only nearby grid cells are scanned
+    return company_location_service.find_nearest(db, lat, lon, threshold_meters)
+
+def detect_companies(db: Session, points, threshold_meters: float = 300.0):
+    # Vectorized variant of detect_company for many (lat, lon) points in one pass
+    return company_location_service.find_nearest_batch(db, points, threshold_meters)
+
+def _apply_company_to_purpose(visit_in: VisitCreate, detected, user_provided_company: str = None):
+    # The route already formats "Visiting: {UserInput}. {Purpose}" when the user
+    # named the company, and user input wins over detection (they may be visiting
+    # a new building of the same company). Otherwise prepend the detected company.
+    if not user_provided_company and detected:
+        if visit_in.purpose:
+            visit_in.purpose = f"Visiting: {detected.company_name}. {visit_in.purpose}"
+        else:
+            visit_in.purpose = f"Visiting: {detected.company_name}"
+
+def _new_company_location(visit_in: VisitCreate, user_provided_company: str):
+    return CompanyLocation(
+        company_name=user_provided_company,
+        latitude=visit_in.check_in_latitude,
+        longitude=visit_in.check_in_longitude,
+        address=visit_in.check_in_location
+    )
+
+def _new_visit(visit_in: VisitCreate, vendor_id: int, selfie_url: str, detected, user_provided_company: str = None,
+               check_in_time: datetime = None):
+    visit = Visit(
+        vendor_id=vendor_id,
+        agent_id=visit_in.agent_id,
+        check_in_latitude=visit_in.check_in_latitude,
+        check_in_longitude=visit_in.check_in_longitude,
+        check_in_selfie_url=selfie_url,
+        area=visit_in.area,
+        pincode=visit_in.pincode,
+        city=visit_in.city,
+        state=visit_in.state,
+        check_in_location=visit_in.check_in_location,
+        purpose=visit_in.purpose,
+        # Same precedence as the purpose text: user input over detection
+        visited_company=company_key(user_provided_company or (detected.company_name if detected else None))
+    )
+    if check_in_time is not None:
+        # Queued offline check-ins keep the device's time instead of the server default
+        visit.check_in_time = check_in_time
+    return visit
+
+def create_visit(db: Session, visit_in: VisitCreate, vendor_id: int, selfie_url: str, user_provided_company: str = None,
+                 check_in_time: datetime = None):
     # 1. Detect Company
     detected = detect_company(db, visit_in.check_in_latitude, visit_in.check_in_longitude)
     
-    final_company_name = None
-    
-    if detected:
-        final_company_name = detected.company_name
-    elif user_provided_company:
-        # 2. If not detected but user provided name, Check if we should store this new location
-        # Check if same address exists (to avoid duplicates as requested)
-        # Note: Address string matching is tricky. We'll check if any location is very close (e.g. < 50m) 
-        # OR if exact address string matches.
-        # Requirement: "If the same address already exists... Do not store a duplicate entry."
-        
+    if not detected and user_provided_company:
+        # 2. Not detected but the user named the company: remember this location,
+        # unless the same address is already stored (no duplicate entries)
         exists = False
         if visit_in.check_in_location:
              exists = db.query(CompanyLocation).filter(CompanyLocation.address == visit_in.check_in_location).first() is not None
         
         if not exists:
-            # Also check very close proximity to avoid duplicates with slightly different coords?
-            # For now, strict address check as per requirement or just creating it.
-            new_loc = CompanyLocation(
-                company_name=user_provided_company,
-                latitude=visit_in.check_in_latitude,
-                longitude=visit_in.check_in_longitude,
-                address=visit_in.check_in_location
-            )
+            new_loc = _new_company_location(visit_in, user_provided_company)
             db.add(new_loc)
-            db.commit() # Commit to generate ID and save
-            final_company_name = user_provided_company
-        else:
-            final_company_name = user_provided_company
-            
-    # Construct Purpose
-    # If we have a final company name, ensure it's in the purpose
-    # Format: "Visiting: {Name}. {OriginalPurpose}"
+            company_location_service.register_on_commit(db, new_loc)
     
-    current_purpose = visit_in.purpose
-    # Remove existing "Visiting: " prefix if present in purpose to avoid double
-    clean_purpose = current_purpose
+    _apply_company_to_purpose(visit_in, detected, user_provided_company)
     
-    # If the route already formatted it as "Visiting: UserInput. Purpose", we might need to adjust
-    # if we detected a DIFFERENT company.
-    # But usually, if detected, we should prefer detected? Or User input?
-    # Let's assume User Input overrides if provided (as they might be visiting a new building of same company),
-    # but if User Input is empty, we use Detected.
+    db_visit = _new_visit(visit_in, vendor_id, selfie_url, detected, user_provided_company, check_in_time)
+    db.add(db_visit)
+    # A single flush inserts the location and the visit; check_in_time comes
+    # back through INSERT ... RETURNING, so no refresh is needed
+    db.flush()
+    visit_stats_service.record_check_in(db, db_visit)
+    occupancy_service.track(db, db_visit, was_open=False)
+    return db_visit
+
+async def create_visit_async(db: AsyncSession, visit_in: VisitCreate, vendor_id: int, selfie_url: str, user_provided_company: str = None,
+                             check_in_time: datetime = None):
+    # Same flow as create_visit on an AsyncSession
+    detected = await company_location_service.find_nearest_async(
+        db, visit_in.check_in_latitude, visit_in.check_in_longitude, 300.0
+    )
     
-    if user_provided_company:
-        final_company_name = user_provided_company
-    elif detected:
-        final_company_name = detected.company_name
+    if not detected and user_provided_company:
+        exists = False
+        if visit_in.check_in_location:
+            result = await db.execute(
+                select(CompanyLocation.id).where(CompanyLocation.address == visit_in.check_in_location).limit(1)
+            )
+            exists = result.first() is not None
+        
+        if not exists:
+            new_loc = _new_company_location(visit_in, user_provided_company)
+            db.add(new_loc)
+            company_location_service.register_on_commit(db, new_loc)
     
-    # Now reconstruct purpose
-    # We expect visit_in.purpose to might handle "Visiting: ..." part from route or raw.
-    # Actually route passes `final_purpose` which formats it.
-    # Let's trust route's formatting if user provided company.
-    # If user did NOT provide company, route passed raw purpose.
-    # So if `user_provided_company` is None, `visit_in.purpose` is just "Meeting" etc.
-    # In that case, prepend Detected.
+    _apply_company_to_purpose(visit_in, detected, user_provided_company)
     
-    if not user_provided_company and final_company_name:
-        if clean_purpose:
-             visit_in.purpose = f"Visiting: {final_company_name}. {clean_purpose}"
-        else:
-             visit_in.purpose = f"Visiting: {final_company_name}"
-    
-    db_visit = Visit(
-        vendor_id=vendor_id,
-        agent_id=visit_in.agent_id,
-        check_in_latitude=visit_in.check_in_latitude,
-        check_in_longitude=visit_in.check_in_longitude,
-        check_in_selfie_url=selfie_url,
-        area=visit_in.area,
-        pincode=visit_in.pincode,
-        city=visit_in.city,
-        state=visit_in.state,
-        check_in_location=visit_in.check_in_location,
-        purpose=visit_in.purpose
-    )
+    db_visit = _new_visit(visit_in, vendor_id, selfie_url, detected, user_provided_company, check_in_time)
     db.add(db_visit)
-    db.commit()
-    db.refresh(db_visit)
+    await db.flush()
+    await visit_stats_service.record_check_in_async(db, db_visit)
+    occupancy_service.track(db, db_visit, was_open=False)
     return db_visit
 
-def update_visit_checkout(db: Session, visit_id: int, visit_out: VisitCheckOut, selfie_url: str):
+def update_visit_checkout(db: Session, visit_id: int, visit_out: VisitCheckOut, selfie_url: str,
+                          check_out_time: datetime = None):
     db_visit = db.query(Visit).filter(Visit.id == visit_id).first()
     if db_visit:
+        previous_check_out = db_visit.check_out_time
         db_visit.check_out_latitude = visit_out.check_out_latitude
         db_visit.check_out_longitude = visit_out.check_out_longitude
         db_visit.check_out_location = visit_out.check_out_location
         db_visit.check_out_selfie_url = selfie_url
-        db_visit.check_out_time = datetime.now(timezone.utc)
-        db.commit()
-        db.refresh(db_visit)
+        db_visit.check_out_time = check_out_time or datetime.now(timezone.utc)
+        visit_stats_service.record_check_out(db, db_visit, previous_check_out)
+        occupancy_service.track(db, db_visit, was_open=previous_check_out is None)
     return db_visit
 
-def get_all_visits(db: Session):
-    return db.query(Visit).all()
+async def update_visit_checkout_async(db: AsyncSession, visit_id: int, visit_out: VisitCheckOut, selfie_url: str,
+                                      check_out_time: datetime = None):
+    db_visit = await db.get(Visit, visit_id)
+    if db_visit:
+        previous_check_out = db_visit.check_out_time
+        db_visit.check_out_latitude = visit_out.check_out_latitude
+        db_visit.check_out_longitude = visit_out.check_out_longitude
+        db_visit.check_out_location = visit_out.check_out_location
+        db_visit.check_out_selfie_url = selfie_url
+        db_visit.check_out_time = check_out_time or datetime.now(timezone.utc)
+        await visit_stats_service.record_check_out_async(db, db_visit, previous_check_out)
+        occupancy_service.track(db, db_visit, was_open=previous_check_out is None)
+    return db_visit
+
+def auto_close_cutoff(after_hours: int = None) -> datetime:
+    """Visits still open that were checked in before this instant are due for auto-close."""
+    hours = settings.VISIT_AUTO_CLOSE_AFTER_HOURS if after_hours is None else after_hours
+    return datetime.now(timezone.utc) - timedelta(hours=hours)
+
+def count_auto_closable(db: Session, cutoff: datetime) -> int:
+    return db.scalar(select(func.count()).where(Visit.check_out_time.is_(None), Visit.check_in_time < cutoff))
+
+def auto_close_batch(db: Session, cutoff: datetime, after_hours: int, batch_size: int) -> int:
+    """
+    Check out up to ``batch_size`` visits left open since before ``cutoff``,
+    oldest first, at check-in + ``after_hours`` so their dwell time is capped
+    at the horizon. They get no check-out position or selfie, which sets them
+    apart from real check-outs. Rows another sweep holds are skipped. Only
+    flushes; commit each batch on its own. Returns the number closed.
+    """
+    visits = db.scalars(
+        select(Visit)
+        .where(Visit.check_out_time.is_(None), Visit.check_in_time < cutoff)
+        .order_by(Visit.check_in_time, Visit.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    for visit in visits:
+        visit.check_out_time = visit.check_in_time + timedelta(hours=after_hours)
+        occupancy_service.track(db, visit, was_open=True)
+    db.flush()
+    visit_stats_service.record_check_outs(db, visits)
+    return len(visits)
+
+def _page_key(visit):
+    # (check_in_time, id) is the listing order and the keyset; ids break ties
+    return (visit.check_in_time is not None, visit.check_in_time or 0, visit.id)
+
+def _with_archive(db: Session, live, model_filter, include_archive: bool):
+    """Append matching visits_archive rows, newest first overall, when the caller asks for history."""
+    if not include_archive:
+        return live
+    archived = db.query(VisitArchive).filter(model_filter(VisitArchive)).all()
+    return sorted(live + archived, key=_page_key, reverse=True)
+
+def get_all_visits(db: Session, include_archive: bool = False):
+    return _with_archive(db, db.query(Visit).all(), lambda model: true(), include_archive)
 
 def get_visit_by_id(db: Session, visit_id: int):
     return db.query(Visit).filter(Visit.id == visit_id).first()
 
-def get_visits_by_vendor_id(db: Session, vendor_id: int):
-    return db.query(Visit).filter(Visit.vendor_id == vendor_id).all()
+async def get_visit_by_id_async(db: AsyncSession, visit_id: int):
+    return await db.get(Visit, visit_id)
 
-def get_visits_for_vendor_view(db: Session, vendor_id: int, company_name: str = None):
-    from sqlalchemy import or_
-    
-    query = Visit.vendor_id == vendor_id
-    if company_name:
-        term = f"Visiting: {company_name}%"
-        query = or_(Visit.vendor_id == vendor_id, Visit.purpose.ilike(term))
-        
-    return db.query(Visit).filter(query).all()
+def get_visits_by_vendor_id(db: Session, vendor_id: int, include_archive: bool = False):
+    live = db.query(Visit).filter(Visit.vendor_id == vendor_id).order_by(Visit.check_in_time.desc()).all()
+    return _with_archive(db, live, lambda model: model.vendor_id == vendor_id, include_archive)
+
+def _vendor_view_filter(model, vendor_id: int, company_name: str = None):
+    # The vendor's own visits plus visits to their company; both sides are index lookups
+    query = model.vendor_id == vendor_id
+    key = company_key(company_name)
+    if key:
+        query = or_(model.vendor_id == vendor_id, model.visited_company == key)
+    return query
+
+def get_visits_for_vendor_view(db: Session, vendor_id: int, company_name: str = None, include_archive: bool = False):
+    live = db.query(Visit).filter(_vendor_view_filter(Visit, vendor_id, company_name)).order_by(Visit.check_in_time.desc()).all()
+    return _with_archive(db, live, lambda model: _vendor_view_filter(model, vendor_id, company_name), include_archive)
+
+def encode_cursor(visit) -> str:
+    """Opaque token for the position after ``visit`` in the newest-first listing."""
+    position = json.dumps({"t": visit.check_in_time.isoformat(), "i": visit.id})
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError for a malformed token."""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(position["t"]), int(position["i"])
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+def visit_filters(model, vendor_id: int = None, since: datetime = None, until: datetime = None,
+                   status: str = None, city: str = None, pincode: str = None, company: str = None):
+    # ``company`` is a visited_company key (see company_key)
+    clauses = []
+    if vendor_id is not None:
+        clauses.append(model.vendor_id == vendor_id)
+    if company:
+        clauses.append(model.visited_company == company)
+    if since:
+        clauses.append(model.check_in_time >= since)
+    if until:
+        clauses.append(model.check_in_time < until)
+    if status == "open":
+        clauses.append(model.check_out_time.is_(None))
+    elif status == "closed":
+        clauses.append(model.check_out_time.isnot(None))
+    if city:
+        clauses.append(model.city == city)
+    if pincode:
+        clauses.append(model.pincode == pincode)
+    return clauses
+
+def page_visits(db: Session, limit: int, cursor: str = None, view_vendor_id: int = None, view_company: str = None,
+                include_archive: bool = False, **filters) -> Tuple[List, Optional[str]]:
+    """
+    One page of visits, newest first, keyed on (check_in_time, id). Returns the
+    visits and the cursor for the next page (None on the last page). At most
+    limit + 1 rows are loaded per table, however large the history is.
+
+    ``view_vendor_id``/``view_company`` restrict the page to a vendor's view
+    (see get_visits_for_vendor_view); ``filters`` are those of visit_filters.
+    """
+    position = decode_cursor(cursor) if cursor else None
+
+    def page(model):
+        query = db.query(model).filter(*visit_filters(model, **filters))
+        if view_vendor_id is not None:
+            query = query.filter(_vendor_view_filter(model, view_vendor_id, view_company))
+        if position:
+            # The plain bound lets the (…, check_in_time) indexes seek; the row
+            # comparison then skips the rows already returned at that instant
+            query = query.filter(model.check_in_time <= position[0],
+                                 tuple_(model.check_in_time, model.id) < tuple_(*position))
+        return query.order_by(model.check_in_time.desc(), model.id.desc()).limit(limit + 1).all()
+
+    visits = page(Visit)
+    if include_archive:
+        visits = sorted(visits + page(VisitArchive), key=_page_key, reverse=True)
+    next_cursor = encode_cursor(visits[limit - 1]) if len(visits) > limit else None
+    return visits[:limit], next_cursor
@@ -0,0 +1,208 @@
+from datetime import date, datetime, time, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import Date, cast, delete, func, insert, literal, select, text, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models.visit import Visit
+from app.models.visit_archive import VisitArchive
+from app.models.visit_daily_stat import VisitDailyStat
+
+GROUP_COLUMNS = {
+    "day": VisitDailyStat.day,
+    "vendor": VisitDailyStat.vendor_id,
+    "company": VisitDailyStat.company,
+}
+
+
+def _utc(moment: datetime) -> datetime:
+    # SQLite hands back naive datetimes; they are UTC
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+
+def stat_day(moment: datetime) -> date:
+    """Rollup day of a check-in: its UTC date."""
+    return _utc(moment).date()
+
+
+def _upsert(dialect: str, visit, visits: int = 0, completed: int = 0, dwell_seconds: float = 0.0):
+    """Add to the visit's rollup row, creating it on first use, in one statement."""
+    stmt = (postgresql if dialect == "postgresql" else sqlite).insert(VisitDailyStat).values(
+        day=stat_day(visit.check_in_time),
+        vendor_id=visit.vendor_id,
+        company=visit.visited_company or "",
+        visit_count=visits,
+        completed_count=completed,
+        dwell_seconds=dwell_seconds,
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=["day", "vendor_id", "company"],
+        set_={
+            "visit_count": VisitDailyStat.visit_count + stmt.excluded.visit_count,
+            "completed_count": VisitDailyStat.completed_count + stmt.excluded.completed_count,
+            "dwell_seconds": VisitDailyStat.dwell_seconds + stmt.excluded.dwell_seconds,
+        },
+    )
+
+
+def _check_out_upsert(dialect: str, visit, previous_check_out: Optional[datetime]):
+    dwell = (_utc(visit.check_out_time) - _utc(visit.check_in_time)).total_seconds()
+    if previous_check_out is None:
+        return _upsert(dialect, visit, completed=1, dwell_seconds=dwell)
+    # Checked out again: replace the earlier dwell, the visit is already counted
+    previous = (_utc(previous_check_out) - _utc(visit.check_in_time)).total_seconds()
+    return _upsert(dialect, visit, dwell_seconds=dwell - previous)
+
+
+def record_check_in(db: Session, visit: Visit):
+    """Count a flushed visit (check_in_time loaded) in its rollup row. Only flushes, like the caller."""
+    if visit.check_in_time is not None:
+        db.execute(_upsert(db.get_bind().dialect.name, visit, visits=1))
+
+
+async def record_check_in_async(db: AsyncSession, visit: Visit):
+    if visit.check_in_time is not None:
+        await db.execute(_upsert(db.get_bind().dialect.name, visit, visits=1))
+
+
+def record_check_out(db: Session, visit: Visit, previous_check_out: Optional[datetime]):
+    if visit.check_in_time is not None:
+        db.execute(_check_out_upsert(db.get_bind().dialect.name, visit, previous_check_out))
+
+
+async def record_check_out_async(db: AsyncSession, visit: Visit, previous_check_out: Optional[datetime]):
+    if visit.check_in_time is not None:
+        await db.execute(_check_out_upsert(db.get_bind().dialect.name, visit, previous_check_out))
+
+
+def record_check_outs(db: Session, visits: List[Visit]):
+    """record_check_out for many first check-outs at once, one upsert per rollup row instead of per visit."""
+    rows: Dict[tuple, list] = {}
+    for visit in visits:
+        if visit.check_in_time is None:
+            continue
+        key = (stat_day(visit.check_in_time), visit.vendor_id, visit.visited_company or "")
+        row = rows.setdefault(key, [visit, 0, 0.0])
+        row[1] += 1
+        row[2] += (_utc(visit.check_out_time) - _utc(visit.check_in_time)).total_seconds()
+    dialect = db.get_bind().dialect.name
+    for visit, completed, dwell_seconds in rows.values():
+        db.execute(_upsert(dialect, visit, completed=completed, dwell_seconds=dwell_seconds))
+
+
+# --- Rebuild ---------------------------------------------------------------
+
+def _day_expr(dialect: str, column):
+    if dialect == "postgresql":
+        return cast(func.timezone("UTC", column), Date)
+    return func.date(column)
+
+
+def _dwell_expr(dialect: str, start, end):
+    if dialect == "postgresql":
+        return func.extract("epoch", end - start)
+    return (func.julianday(end) - func.julianday(start)) * 86400
+
+
+def _day_bounds(model, since: Optional[date], until: Optional[date]):
+    clauses = [model.check_in_time.isnot(None)]
+    if since:
+        clauses.append(model.check_in_time >= datetime.combine(since, time.min, timezone.utc))
+    if until:
+        clauses.append(model.check_in_time < datetime.combine(until, time.min, timezone.utc))
+    return clauses
+
+
+def _source_rollup(dialect: str, model, since: Optional[date], until: Optional[date]):
+    day = _day_expr(dialect, model.check_in_time).label("day")
+    company = func.coalesce(model.visited_company, literal("")).label("company")
+    return (
+        select(
+            day,
+            model.vendor_id.label("vendor_id"),
+            company,
+            func.count().label("visit_count"),
+            func.count(model.check_out_time).label("completed_count"),
+            func.coalesce(func.sum(_dwell_expr(dialect, model.check_in_time, model.check_out_time)), 0.0).label("dwell_seconds"),
+        )
+        .where(*_day_bounds(model, since, until))
+        .group_by(day, model.vendor_id, company)
+    )
+
+
+def rebuild(db: Session, since: Optional[date] = None, until: Optional[date] = None) -> int:
+    """
+    Recompute the rollups for check-in days in [since, until) (all days by
+    default) from visits and visits_archive. Only flushes; commit to publish.
+
+    On PostgreSQL the rollup table is locked against concurrent check-ins
+    until commit. A check-in whose visit is not yet visible to the rebuild
+    is still waiting on that lock and adds itself once the rebuild commits,
+    so nothing is lost or counted twice.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        db.execute(text("LOCK TABLE visit_daily_stats IN EXCLUSIVE MODE"))
+
+    clear = delete(VisitDailyStat)
+    if since:
+        clear = clear.where(VisitDailyStat.day >= since)
+    if until:
+        clear = clear.where(VisitDailyStat.day < until)
+    db.execute(clear)
+
+    # A (day, vendor, company) key can have rows in both tables
+    sources = union_all(_source_rollup(dialect, Visit, since, until),
+                        _source_rollup(dialect, VisitArchive, since, until)).subquery()
+    combined = select(
+        sources.c.day, sources.c.vendor_id, sources.c.company,
+        func.sum(sources.c.visit_count), func.sum(sources.c.completed_count), func.sum(sources.c.dwell_seconds),
+    ).group_by(sources.c.day, sources.c.vendor_id, sources.c.company)
+    result = db.execute(insert(VisitDailyStat).from_select(
+        ["day", "vendor_id", "company", "visit_count", "completed_count", "dwell_seconds"], combined
+    ))
+    return result.rowcount
+
+
+# --- Reads -----------------------------------------------------------------
+
+def _stats_row(visits, completed, dwell_seconds) -> Dict:
+    visits, completed, dwell_seconds = int(visits or 0), int(completed or 0), float(dwell_seconds or 0.0)
+    return {
+        "visits": visits,
+        "completed": completed,
+        "open": visits - completed,
+        "total_dwell_seconds": dwell_seconds,
+        "average_dwell_seconds": dwell_seconds / completed if completed else None,
+    }
+
+
+def get_stats(db: Session, group_by: Optional[str] = None, since: Optional[date] = None, until: Optional[date] = None,
+              vendor_id: Optional[int] = None, company: Optional[str] = None) -> Dict:
+    """
+    Totals and, with ``group_by`` (day, vendor or company), per-group rows,
+    read from the rollups only. ``company`` is a visited_company key.
+    """
+    filters = []
+    if since:
+        filters.append(VisitDailyStat.day >= since)
+    if until:
+        filters.append(VisitDailyStat.day < until)
+    if vendor_id is not None:
+        filters.append(VisitDailyStat.vendor_id == vendor_id)
+    if company is not None:
+        filters.append(VisitDailyStat.company == company)
+
+    sums = (
+        func.sum(VisitDailyStat.visit_count),
+        func.sum(VisitDailyStat.completed_count),
+        func.sum(VisitDailyStat.dwell_seconds),
+    )
+    totals = _stats_row(*db.execute(select(*sums).where(*filters)).one())
+
+    rows: List[Dict] = []
+    if group_by:
+        column = GROUP_COLUMNS[group_by]
+        for key, *values in db.execute(select(column, *sums).where(*filters).group_by(column).order_by(column)):
+            rows.append({column.key: key, **_stats_row(*values)})
+    return {"group_by": group_by, "totals": totals, "rows": rows}
@@ -0,0 +1,264 @@
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from jose import JWTError, jwt
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core import security
+from app.core.config import settings
+from app.models.visit import Visit
+from app.models.visit_sync_event import VisitSyncEvent
+from app.schemas.visit import QueuedVisitEvent, VisitCheckOut, VisitCreate
+from app.services import visit_service
+
+# "typ" claim of selfie references; they carry no "sub", so they never pass as access tokens
+SELFIE_REF_TYPE = "selfie"
+
+
+class VisitAlreadyClosed(Exception):
+    """A queued check-out for a visit that was checked out already, by another event or online."""
+
+    def __init__(self, visit_id: int):
+        super().__init__("Visit is already checked out")
+        self.visit_id = visit_id
+
+
+class PendingEvent(NamedTuple):
+    """An event to apply: its position in the request and its selfie, still to upload or already stored."""
+    index: int
+    event: QueuedVisitEvent
+    selfie_bytes: Optional[bytes]
+    selfie_url: Optional[str]
+
+
+def _utc(moment: datetime) -> datetime:
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+
+def _result(event: QueuedVisitEvent, status: str, visit_id: int = None, detail: str = None) -> Dict:
+    return {"idempotency_key": event.idempotency_key, "status": status, "visit_id": visit_id, "detail": detail}
+
+
+# --- Selfie references -----------------------------------------------------
+
+def issue_selfie_ref(user_id: int, selfie_url: str) -> str:
+    """Signed reference to an uploaded selfie that only ``user_id`` can attach to a queued event."""
+    return security.create_access_token(
+        {"typ": SELFIE_REF_TYPE, "uid": user_id, "url": selfie_url},
+        timedelta(days=settings.VISIT_SYNC_MAX_EVENT_AGE_DAYS),
+    )
+
+
+def resolve_selfie_ref(user_id: int, selfie_ref: str) -> str:
+    """Selfie URL of a reference from issue_selfie_ref; raises ValueError if it is forged, expired or someone else's."""
+    try:
+        claims = jwt.decode(selfie_ref, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError as e:
+        raise ValueError("Invalid or expired selfie_ref") from e
+    if claims.get("typ") != SELFIE_REF_TYPE or claims.get("uid") != user_id or not claims.get("url"):
+        raise ValueError("Invalid selfie_ref")
+    return claims["url"]
+
+
+def decode_inline_selfie(data: str) -> bytes:
+    # Accept data URLs as well as bare base64
+    if data.startswith("data:"):
+        data = data.partition(",")[2]
+    # Base64 is 4 characters per 3 bytes; refuse before decoding anything huge
+    if len(data) > (settings.VISIT_SYNC_MAX_SELFIE_BYTES + 2) // 3 * 4:
+        raise ValueError(f"Selfie larger than {settings.VISIT_SYNC_MAX_SELFIE_BYTES} bytes")
+    try:
+        selfie = base64.b64decode(data, validate=True)
+    except binascii.Error as e:
+        raise ValueError("selfie_base64 is not valid base64") from e
+    if not selfie:
+        raise ValueError("selfie_base64 is empty")
+    return selfie
+
+
+# --- Validation ------------------------------------------------------------
+
+def check_event(event: QueuedVisitEvent, now: datetime):
+    """Reject an event that can't be applied, before any upload or query. Raises ValueError."""
+    device_time = _utc(event.device_time)
+    if device_time > now + timedelta(seconds=settings.VISIT_SYNC_MAX_CLOCK_SKEW_SECONDS):
+        raise ValueError("device_time is in the future")
+    if device_time < now - timedelta(days=settings.VISIT_SYNC_MAX_EVENT_AGE_DAYS):
+        raise ValueError(f"Events older than {settings.VISIT_SYNC_MAX_EVENT_AGE_DAYS} days are not accepted")
+    if bool(event.selfie_base64) == bool(event.selfie_ref):
+        raise ValueError("Send exactly one of selfie_base64 and selfie_ref")
+
+    if event.type == "check_in":
+        if event.check_in_latitude is None or event.check_in_longitude is None:
+            raise ValueError("check_in needs check_in_latitude and check_in_longitude")
+    else:
+        if event.check_out_latitude is None or event.check_out_longitude is None:
+            raise ValueError("check_out needs check_out_latitude and check_out_longitude")
+        if (event.visit_id is None) == (event.check_in_key is None):
+            raise ValueError("check_out needs exactly one of visit_id and check_in_key")
+
+
+def _apply_order(pending: PendingEvent):
+    # Device time order, check-ins first on ties, so a check-out follows the
+    # check-in it references whatever order the device queued them in
+    return _utc(pending.event.device_time), pending.event.type != "check_in", pending.index
+
+
+# --- Sync ------------------------------------------------------------------
+
+async def applied_events(db: AsyncSession, vendor_id: int, keys: Sequence[str]) -> Dict[str, VisitSyncEvent]:
+    """The vendor's already applied events among ``keys``, by idempotency key."""
+    if not keys:
+        return {}
+    rows = await db.scalars(
+        select(VisitSyncEvent).where(VisitSyncEvent.vendor_id == vendor_id, VisitSyncEvent.idempotency_key.in_(set(keys)))
+    )
+    return {row.idempotency_key: row for row in rows}
+
+
+async def triage(db: AsyncSession, vendor_id: int, user_id: int,
+                 events: Sequence[QueuedVisitEvent]) -> Tuple[List[Optional[Dict]], List[PendingEvent]]:
+    """
+    Settle what can be settled without writing: replays of applied events,
+    repeated keys within the batch and invalid events. Returns the results so
+    far (None for events still to apply) and the events to apply, with their
+    selfies decoded or resolved. One query, whatever the batch size.
+    """
+    now = datetime.now(timezone.utc)
+    applied = await applied_events(db, vendor_id, [e.idempotency_key for e in events])
+    results: List[Optional[Dict]] = [None] * len(events)
+    pending: List[PendingEvent] = []
+    seen = set()
+    for index, event in enumerate(events):
+        key = event.idempotency_key
+        if key in applied:
+            results[index] = _result(event, "duplicate", applied[key].visit_id)
+            continue
+        if key in seen:
+            # Settled once the first event with this key is applied
+            continue
+        seen.add(key)
+        try:
+            check_event(event, now)
+            if event.selfie_ref:
+                pending.append(PendingEvent(index, event, None, resolve_selfie_ref(user_id, event.selfie_ref)))
+            else:
+                pending.append(PendingEvent(index, event, decode_inline_selfie(event.selfie_base64), None))
+        except ValueError as e:
+            results[index] = _result(event, "rejected", detail=str(e))
+    return results, pending
+
+
+async def _resolve_visit_id(db: AsyncSession, vendor_id: int, event: QueuedVisitEvent) -> int:
+    if event.visit_id is not None:
+        return event.visit_id
+    check_in = await db.get(VisitSyncEvent, (vendor_id, event.check_in_key))
+    if check_in is None or check_in.event_type != "check_in":
+        raise ValueError(f"No synced check-in with key {event.check_in_key}")
+    return check_in.visit_id
+
+
+async def _apply(db: AsyncSession, vendor_id: int, event: QueuedVisitEvent, selfie_url: str) -> int:
+    device_time = _utc(event.device_time)
+    if event.type == "check_in":
+        purpose = event.purpose
+        if event.company_name:
+            # Same purpose text as POST /visits/check-in
+            purpose = f"Visiting: {event.company_name}. {purpose}" if purpose else f"Visiting: {event.company_name}"
+        visit_in = VisitCreate(
+            agent_id=event.agent_id,
+            check_in_latitude=event.check_in_latitude,
+            check_in_longitude=event.check_in_longitude,
+            area=event.area,
+            pincode=event.pincode,
+            city=event.city,
+            state=event.state,
+            check_in_location=event.check_in_location,
+            purpose=purpose,
+        )
+        visit = await visit_service.create_visit_async(
+            db, visit_in, vendor_id, selfie_url, user_provided_company=event.company_name, check_in_time=device_time
+        )
+        return visit.id
+
+    visit_id = await _resolve_visit_id(db, vendor_id, event)
+    visit = await db.get(Visit, visit_id)
+    if visit is None or visit.vendor_id != vendor_id:
+        raise ValueError("Visit not found")
+    if device_time < _utc(visit.check_in_time):
+        raise ValueError("device_time is before the visit's check-in")
+    if visit.check_out_time is not None:
+        # A late or replayed check-out must not move the check-out time or
+        # count the visit as completed (rollups, occupancy) a second time
+        raise VisitAlreadyClosed(visit_id)
+    visit_out = VisitCheckOut(
+        check_out_latitude=event.check_out_latitude,
+        check_out_longitude=event.check_out_longitude,
+        check_out_location=event.check_out_location,
+    )
+    await visit_service.update_visit_checkout_async(db, visit_id, visit_out, selfie_url, check_out_time=device_time)
+    return visit_id
+
+
+async def apply_events(db: AsyncSession, vendor_id: int, pending: Sequence[PendingEvent],
+                       selfie_urls: Sequence[Optional[str]], results: List[Optional[Dict]]):
+    """
+    Apply the triaged events, each in its own savepoint, and fill in their
+    results. ``selfie_urls`` holds the stored selfie of each pending event
+    (None if its upload failed). Only flushes: the batch commits as one
+    transaction, and a rejected event leaves no trace in it.
+
+    A check-out of a visit that is already checked out is a "conflict" and
+    changes nothing; the client should drop it from its queue.
+
+    Each applied event records its idempotency key in the same savepoint. If
+    a concurrent request applied the same key first, the key's primary key
+    rejects this copy, the savepoint rolls back and the event is reported as
+    a duplicate of that request's visit.
+    """
+    ordered = sorted(zip(pending, selfie_urls), key=lambda item: _apply_order(item[0]))
+    for item, selfie_url in ordered:
+        event = item.event
+        if not selfie_url:
+            results[item.index] = _result(event, "rejected", detail="Failed to upload selfie to cloud")
+            continue
+        try:
+            async with db.begin_nested():
+                visit_id = await _apply(db, vendor_id, event, selfie_url)
+                db.add(VisitSyncEvent(vendor_id=vendor_id, idempotency_key=event.idempotency_key,
+                                      event_type=event.type, visit_id=visit_id, device_time=_utc(event.device_time)))
+            results[item.index] = _result(event, "applied", visit_id)
+        except ValueError as e:
+            results[item.index] = _result(event, "rejected", detail=str(e))
+        except VisitAlreadyClosed as e:
+            results[item.index] = _result(event, "conflict", e.visit_id, detail=str(e))
+        except IntegrityError:
+            winner = await db.get(VisitSyncEvent, (vendor_id, event.idempotency_key))
+            if winner is None:
+                raise
+            results[item.index] = _result(event, "duplicate", winner.visit_id)
+
+
+def settle_repeats(events: Sequence[QueuedVisitEvent], results: List[Optional[Dict]]):
+    """Give events that repeat an earlier key of the batch the outcome of that first event."""
+    first: Dict[str, Dict] = {}
+    for index, event in enumerate(events):
+        result = results[index]
+        if result is None:
+            settled = first[event.idempotency_key]
+            if settled["status"] in ("rejected", "conflict"):
+                results[index] = dict(settled)
+            else:
+                results[index] = _result(event, "duplicate", settled["visit_id"])
+        else:
+            first.setdefault(event.idempotency_key, result)
+
+
+def purge_events(db: Session, older_than_days: int = None) -> int:
+    """Forget idempotency keys older than the oldest event the endpoint still accepts. Only flushes."""
+    days = settings.VISIT_SYNC_MAX_EVENT_AGE_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    return db.execute(delete(VisitSyncEvent).where(VisitSyncEvent.created_at < cutoff)).rowcount
@@ -1,13 +1,58 @@
-import cloudinary
-import cloudinary.uploader
+import os
+import threading
+import time
+import uuid
 from app.core.config import settings
 
-cloudinary.config(
-    cloud_name=settings.CLOUDINARY_CLOUD_NAME,
-    api_key=settings.CLOUDINARY_API_KEY,
-    api_secret=settings.CLOUDINARY_API_SECRET,
-    secure=True
-)
+# The cloudinary SDK (and urllib3 behind it) is imported and configured on the
+# first upload rather than at import time, which keeps serverless cold starts short.
+_uploader = None
+_uploader_lock = threading.Lock()
+
+class FilesystemUploader:
+    """
+    Stand-in for cloudinary.uploader that stores each upload as a file under
+    ``root`` and returns a file:// URL, after ``latency`` seconds. Enabled by
+    CLOUDINARY_FAKE_DIR for tests and benchmarks.
+    """
+
+    def __init__(self, root: str, latency: float = 0.0):
+        self.root = root
+        self.latency = latency
+
+    def upload(self, file, folder="", **options):
+        if self.latency:
+            time.sleep(self.latency)
+        if hasattr(file, "read"):
+            data = file.read()
+        else:
+            with open(file, "rb") as f:
+                data = f.read()
+        directory = os.path.join(self.root, folder)
+        os.makedirs(directory, exist_ok=True)
+        public_id = uuid.uuid4().hex
+        path = os.path.abspath(os.path.join(directory, public_id))
+        with open(path, "wb") as f:
+            f.write(data)
+        return {"secure_url": f"file://{path}", "public_id": f"{folder}/{public_id}", "bytes": len(data)}
+
+def get_uploader():
+    global _uploader
+    if _uploader is None:
+        with _uploader_lock:
+            if _uploader is None and settings.CLOUDINARY_FAKE_DIR:
+                _uploader = FilesystemUploader(settings.CLOUDINARY_FAKE_DIR, settings.CLOUDINARY_FAKE_LATENCY_SECONDS)
+            if _uploader is None:
+                import cloudinary
+                import cloudinary.uploader
+                cloudinary.config(
+                    cloud_name=settings.CLOUDINARY_CLOUD_NAME,
+                    api_key=settings.CLOUDINARY_API_KEY,
+                    api_secret=settings.CLOUDINARY_API_SECRET,
+                    secure=True
+                )
+                _uploader = cloudinary.uploader
+    return _uploader
 
 def upload_image_to_cloudinary(file, folder="vms_uploads"):
     # Debug logging
@@ -19,7 +64,7 @@ def upload_image_to_cloudinary(file, folder="vms_uploads"):
         print("DEBUG: API Secret is MISSING!")
 
     try:
-        upload_result = cloudinary.uploader.upload(file, folder=folder)
+        upload_result = get_uploader().upload(file, folder=folder)
         url = upload_result.get("secure_url")
         print(f"DEBUG: Upload success! URL: {url}")
         return url
@@ -0,0 +1,22 @@
+import re
+from typing import Optional
+
+# Check-in writes purpose as "Visiting: {company}. {purpose}" or "Visiting: {company}"
+_VISITING_PREFIX = re.compile(r"^Visiting: (.+?)(?:\. |$)", re.DOTALL)
+
+
+def company_key(name: Optional[str]) -> Optional[str]:
+    """Normalized company name that visits and vendors are matched on: single-spaced and case-folded."""
+    if not name:
+        return None
+    return " ".join(name.split()).casefold() or None
+
+
+def company_from_purpose(purpose: Optional[str]) -> Optional[str]:
+    """
+    Company named in a check-in purpose string, or None. Best effort for rows
+    written before visits stored visited_company: a company name containing
+    ". " is cut at that point.
+    """
+    match = _VISITING_PREFIX.match(purpose or "")
+    return match.group(1) if match else None
@@ -0,0 +1,131 @@
+import logging
+import threading
+from typing import List, Sequence, Tuple
+from app.utils.geo import EARTH_RADIUS_METERS, IndexedLocation
+
+logger = logging.getLogger(__name__)
+
+# numpy is optional and imported on first use: it adds ~100 ms to every cold
+# start and only the batch detection endpoint needs it.
+np = None
+_numpy_checked = False
+
+
+def numpy_available() -> bool:
+    global np, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            logger.warning("numpy package not installed. Vectorized distance engine will be disabled. "
+                           "Install it with: pip install numpy")
+        _numpy_checked = True
+    return np is not None
+
+# Upper bound on the number of float64 cells in one points x locations distance
+# block (~16 MB). Larger batches are processed in row chunks of this size.
+MAX_BLOCK_ELEMENTS = 2_000_000
+
+
+class DistanceEngine:
+    """
+    Vectorized haversine distances against a growing set of candidate locations.
+
+    Coordinates are held in contiguous float64 arrays (already in radians, with
+    the latitude cosine precomputed) so a query against every candidate is a
+    handful of array operations instead of a Python loop.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        if not numpy_available():
+            raise ImportError("numpy package is not installed. Please install it with: pip install numpy")
+        self._lock = threading.Lock()
+        self._count = 0
+        self._ids = np.empty(initial_capacity, dtype=np.int64)
+        self._lat_rad = np.empty(initial_capacity, dtype=np.float64)
+        self._lon_rad = np.empty(initial_capacity, dtype=np.float64)
+        self._cos_lat = np.empty(initial_capacity, dtype=np.float64)
+        self._names: List[str] = []
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _grow(self, needed: int):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        for attr in ("_ids", "_lat_rad", "_lon_rad", "_cos_lat"):
+            old = getattr(self, attr)
+            new = np.empty(new_capacity, dtype=old.dtype)
+            new[:self._count] = old[:self._count]
+            setattr(self, attr, new)
+
+    def extend(self, locations: Sequence[IndexedLocation]):
+        """Append candidate locations. Callers are responsible for not adding duplicates."""
+        if not locations:
+            return
+        with self._lock:
+            start = self._count
+            end = start + len(locations)
+            self._grow(end)
+            lats = np.radians(np.fromiter((loc.latitude for loc in locations), dtype=np.float64, count=len(locations)))
+            self._ids[start:end] = np.fromiter((loc.id for loc in locations), dtype=np.int64, count=len(locations))
+            self._lat_rad[start:end] = lats
+            self._lon_rad[start:end] = np.radians(np.fromiter((loc.longitude for loc in locations), dtype=np.float64, count=len(locations)))
+            self._cos_lat[start:end] = np.cos(lats)
+            self._names.extend(loc.company_name for loc in locations)
+            self._count = end
+
+    def _snapshot(self):
+        with self._lock:
+            n = self._count
+            return self._lat_rad[:n], self._lon_rad[:n], self._cos_lat[:n]
+
+    @staticmethod
+    def _haversine_block(lat_rad, lon_rad, cand_lat, cand_lon, cand_cos):
+        # lat_rad/lon_rad are column vectors (points x 1); candidates broadcast across columns
+        sin_dphi = np.sin((cand_lat - lat_rad) * 0.5)
+        sin_dlambda = np.sin((cand_lon - lon_rad) * 0.5)
+        a = sin_dphi * sin_dphi + np.cos(lat_rad) * cand_cos * sin_dlambda * sin_dlambda
+        np.clip(a, 0.0, 1.0, out=a)
+        return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(a))
+
+    def distances_from(self, lat: float, lon: float):
+        """Distances in meters from one point to every candidate, as a 1-D array."""
+        return self.distance_matrix([lat], [lon])[0]
+
+    def distance_matrix(self, lats: Sequence[float], lons: Sequence[float]):
+        """Distances in meters from each point (rows) to every candidate (columns)."""
+        cand_lat, cand_lon, cand_cos = self._snapshot()
+        lat_rad = np.radians(np.asarray(lats, dtype=np.float64))[:, None]
+        lon_rad = np.radians(np.asarray(lons, dtype=np.float64))[:, None]
+        return self._haversine_block(lat_rad, lon_rad, cand_lat, cand_lon, cand_cos)
+
+    def nearest_within(self, lats: Sequence[float], lons: Sequence[float], threshold_meters: float) -> List[Tuple[int, str, float]]:
+        """
+        Resolve the nearest candidate within ``threshold_meters`` for each point.
+
+        Returns:
+            One (location_id, company_name, distance) tuple per point, or None
+            for points with no candidate in range.
+        """
+        cand_lat, cand_lon, cand_cos = self._snapshot()
+        n_cand = len(cand_lat)
+        lats = np.radians(np.asarray(lats, dtype=np.float64))
+        lons = np.radians(np.asarray(lons, dtype=np.float64))
+        results = [None] * len(lats)
+        if n_cand == 0:
+            return results
+
+        rows_per_block = max(1, MAX_BLOCK_ELEMENTS // n_cand)
+        for start in range(0, len(lats), rows_per_block):
+            end = min(start + rows_per_block, len(lats))
+            dist = self._haversine_block(lats[start:end, None], lons[start:end, None], cand_lat, cand_lon, cand_cos)
+            best = np.argmin(dist, axis=1)
+            best_dist = dist[np.arange(end - start), best]
+            for offset in np.nonzero(best_dist <= threshold_meters)[0]:
+                idx = int(best[offset])
+                results[start + offset] = (int(self._ids[idx]), self._names[idx], float(best_dist[offset]))
+        return results
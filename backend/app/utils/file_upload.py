@@ -3,8 +3,8 @@ from pathlib import Path
 from fastapi import UploadFile
 import uuid
 
+# Created on first save; a read-only filesystem (serverless) must not fail at import
 UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 def save_upload_file(upload_file: UploadFile, sub_dir: str = "misc") -> str:
     target_dir = UPLOAD_DIR / sub_dir
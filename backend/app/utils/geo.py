@@ -0,0 +1,96 @@
+import math
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+EARTH_RADIUS_METERS = 6371000
+METERS_PER_DEGREE_LAT = 111320.0
+
+# Default grid cell edge in degrees (~1.1 km of latitude). Large enough that the
+# default 300 m detection radius touches at most a 3x3 block of cells.
+DEFAULT_CELL_DEGREES = 0.01
+
+
+def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in meters."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lon2 - lon1)
+
+    a = math.sin(delta_phi / 2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    return EARTH_RADIUS_METERS * c
+
+
+class IndexedLocation(NamedTuple):
+    id: int
+    company_name: str
+    latitude: float
+    longitude: float
+
+
+class GridIndex:
+    """
+    Fixed-size lat/lon bucket index for nearest-neighbour lookups within a radius.
+
+    Points are hashed into square cells of ``cell_degrees``. A radius query only
+    visits the cells overlapping the bounding box of the search circle, so the
+    cost depends on local density rather than on the total number of points.
+    """
+
+    def __init__(self, cell_degrees: float = DEFAULT_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Tuple[int, int], List[IndexedLocation]] = {}
+        self._ids = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, location_id: int) -> bool:
+        return location_id in self._ids
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+
+    def add(self, location: IndexedLocation) -> bool:
+        """Insert a location. Returns False if its id is already indexed."""
+        with self._lock:
+            if location.id in self._ids:
+                return False
+            self._ids.add(location.id)
+            self._cells.setdefault(self._cell(location.latitude, location.longitude), []).append(location)
+            return True
+
+    def locations(self) -> List[IndexedLocation]:
+        with self._lock:
+            return [loc for bucket in self._cells.values() for loc in bucket]
+
+    def nearest(self, lat: float, lon: float, threshold_meters: float) -> Tuple[Optional[IndexedLocation], float]:
+        """
+        Find the closest indexed location within ``threshold_meters``.
+
+        Returns:
+            Tuple of (location, distance in meters), or (None, inf) if nothing is in range.
+        """
+        delta_lat = threshold_meters / METERS_PER_DEGREE_LAT
+        cos_lat = math.cos(math.radians(min(abs(lat) + delta_lat, 89.9)))
+        delta_lon = min(threshold_meters / (METERS_PER_DEGREE_LAT * cos_lat), 180.0)
+
+        min_row, min_col = self._cell(lat - delta_lat, lon - delta_lon)
+        max_row, max_col = self._cell(lat + delta_lat, lon + delta_lon)
+
+        best = None
+        best_dist = float('inf')
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                bucket = self._cells.get((row, col))
+                if not bucket:
+                    continue
+                for loc in bucket:
+                    dist = haversine_distance(lat, lon, loc.latitude, loc.longitude)
+                    if dist <= threshold_meters and dist < best_dist:
+                        best_dist = dist
+                        best = loc
+        return best, best_dist
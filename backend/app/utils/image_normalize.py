@@ -0,0 +1,63 @@
+import io
+from typing import Optional
+
+# Pillow is imported inside the function: this runs in the image worker
+# processes, and web workers that never normalize an image don't load it.
+
+FORMATS = {
+    "jpeg": {"format": "JPEG", "optimize": True, "progressive": True},
+    "webp": {"format": "WEBP", "method": 4},
+}
+
+
+def _flatten(image):
+    """RGB copy of an image with transparency, composited onto white (JPEG has no alpha)."""
+    from PIL import Image
+
+    rgba = image.convert("RGBA")
+    background = Image.new("RGB", rgba.size, "white")
+    background.paste(rgba, mask=rgba.getchannel("A"))
+    return background
+
+
+def normalize_image(data: bytes, max_dimension: int, image_format: str = "jpeg", quality: int = 80) -> Optional[bytes]:
+    """
+    Re-encode an uploaded photo for storage: format sniffed from the bytes
+    (not the filename), rotated upright per its EXIF orientation, downscaled
+    to fit ``max_dimension`` and saved as ``image_format`` ("jpeg" or "webp")
+    at ``quality``, without EXIF (GPS position, device) metadata.
+
+    Returns None when ``data`` is not an image Pillow can decode, e.g. a PDF
+    document or a truncated file, so the caller can keep the original.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        image = Image.open(io.BytesIO(data))
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        return None
+    try:
+        with image:
+            if image.format in ("JPEG", "MPO"):
+                # The JPEG decoder can scale by 1/2, 1/4 or 1/8 while decoding;
+                # a 12 MP phone photo then never gets decoded at full size
+                image.draft("RGB", (max_dimension, max_dimension))
+            icc_profile = image.info.get("icc_profile")
+            has_alpha = image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info)
+            upright = ImageOps.exif_transpose(image)
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+    upright.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+    if image_format == "jpeg":
+        if has_alpha:
+            upright = _flatten(upright)
+        elif upright.mode not in ("RGB", "L"):
+            upright = upright.convert("RGB")
+    elif upright.mode not in ("RGB", "RGBA"):
+        upright = upright.convert("RGBA" if has_alpha else "RGB")
+
+    out = io.BytesIO()
+    # No exif= argument, so the metadata is dropped; the colour profile is kept
+    upright.save(out, quality=quality, icc_profile=icc_profile, **FORMATS[image_format])
+    return out.getvalue()
@@ -0,0 +1,75 @@
+"""
+Archive old closed visits and maintain the monthly visits partitions.
+
+Moves visits that were checked out and checked in more than
+VISIT_ARCHIVE_AFTER_DAYS ago from visits into visits_archive, one committed
+batch at a time, so the live table (and every default GET /visits read) only
+holds recent history. Open visits are never archived.
+
+On PostgreSQL it also creates the partitions for the coming
+VISIT_PARTITION_MONTHS_AHEAD months and drops month partitions that archiving
+has emptied. It also forgets POST /visits/sync idempotency keys older than
+VISIT_SYNC_MAX_EVENT_AGE_DAYS. Run it daily from cron; it is safe to rerun.
+
+Usage:
+    python archive_visits.py [--older-than-days 180] [--batch-size 5000] [--dry-run]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(__file__))
+
+from app.core import database
+from app.core.config import settings
+from app.services import visit_archive_service, visit_sync_service
+
+
+def main(older_than_days, batch_size, dry_run):
+    cutoff = visit_archive_service.archive_cutoff(older_than_days)
+    print(f"Archiving closed visits checked in before {cutoff:%Y-%m-%d %H:%M} UTC")
+
+    if dry_run:
+        with database.unit_of_work() as db:
+            print(f"{visit_archive_service.count_archivable(db, cutoff)} visits would be archived")
+        return
+
+    created, failed = visit_archive_service.ensure_partitions(database.engine)
+    if created:
+        print(f"Created partitions: {', '.join(created)}")
+    for name, moved in created.items():
+        if moved:
+            print(f"  moved {moved} visits from {visit_archive_service.DEFAULT_PARTITION} into {name}")
+    for name, error in failed.items():
+        # Keep archiving; the exit status tells cron something needs a look
+        print(f"ERROR: Could not create partition {name}: {error}")
+
+    total, start = 0, time.perf_counter()
+    while True:
+        # One transaction per batch keeps locks and WAL bursts short
+        with database.unit_of_work() as db:
+            moved = visit_archive_service.archive_batch(db, cutoff, batch_size)
+        if not moved:
+            break
+        total += moved
+        print(f"  archived {total} visits ({total / (time.perf_counter() - start):.0f}/s)")
+    print(f"Archived {total} visits")
+
+    with database.unit_of_work() as db:
+        purged = visit_sync_service.purge_events(db)
+    print(f"Purged {purged} expired sync idempotency keys")
+
+    dropped = visit_archive_service.drop_empty_partitions(database.engine, cutoff)
+    if dropped:
+        print(f"Dropped empty partitions: {', '.join(dropped)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--older-than-days", type=int, default=settings.VISIT_ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=settings.VISIT_ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="only count the visits that would be archived")
+    args = parser.parse_args()
+    sys.exit(main(args.older_than_days, args.batch_size, args.dry_run))
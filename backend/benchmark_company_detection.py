@@ -0,0 +1,108 @@
+"""
+Benchmark company detection: linear haversine scan vs the grid spatial index
+and the vectorized DistanceEngine used by the batch detection endpoint.
+
+Locations are synthetic points scattered over a ~50 km x 50 km metro area.
+The linear scan timing excludes the `SELECT * FROM company_locations` that the
+old detect_company also paid on every call, so real-world gains are larger.
+
+Usage:
+    python benchmark_company_detection.py [--queries 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(__file__))
+
+from app.utils.distance_engine import DistanceEngine, numpy_available
+from app.utils.geo import GridIndex, IndexedLocation, haversine_distance
+
+CENTER_LAT = 12.9716
+CENTER_LON = 77.5946
+SPREAD_DEGREES = 0.25
+THRESHOLD_METERS = 300.0
+
+
+def make_locations(n, rng):
+    return [
+        IndexedLocation(
+            i + 1,
+            f"Company {i + 1}",
+            CENTER_LAT + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES),
+            CENTER_LON + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES),
+        )
+        for i in range(n)
+    ]
+
+
+def linear_nearest(locations, lat, lon, threshold_meters):
+    nearest = None
+    min_dist = float('inf')
+    for loc in locations:
+        dist = haversine_distance(lat, lon, loc.latitude, loc.longitude)
+        if dist <= threshold_meters and dist < min_dist:
+            min_dist = dist
+            nearest = loc
+    return nearest
+
+
+def run(sizes, num_queries, seed):
+    rng = random.Random(seed)
+    print(f"{'locations':>10} {'linear ms/q':>12} {'index ms/q':>12} {'speedup':>9} {'build ms':>9} {'batch ms/q':>11}")
+    for n in sizes:
+        locations = make_locations(n, rng)
+        queries = [
+            (CENTER_LAT + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES),
+             CENTER_LON + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES))
+            for _ in range(num_queries)
+        ]
+
+        start = time.perf_counter()
+        index = GridIndex()
+        for loc in locations:
+            index.add(loc)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        # The linear scan is slow at 100k; sample fewer queries to keep runtime sane
+        linear_queries = queries[:max(20, num_queries * 1000 // n)]
+        start = time.perf_counter()
+        linear_results = [linear_nearest(locations, lat, lon, THRESHOLD_METERS) for lat, lon in linear_queries]
+        linear_ms = (time.perf_counter() - start) * 1000 / len(linear_queries)
+
+        start = time.perf_counter()
+        index_results = [index.nearest(lat, lon, THRESHOLD_METERS)[0] for lat, lon in queries]
+        index_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        mismatches = sum(
+            1 for a, b in zip(linear_results, index_results)
+            if (a.id if a else None) != (b.id if b else None)
+        )
+        if mismatches:
+            print(f"WARNING: {mismatches} results differ between linear scan and index for n={n}")
+
+        batch_ms = float('nan')
+        if numpy_available():
+            engine = DistanceEngine()
+            engine.extend(locations)
+            start = time.perf_counter()
+            batch_results = engine.nearest_within([q[0] for q in queries], [q[1] for q in queries], THRESHOLD_METERS)
+            batch_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            batch_mismatches = sum(
+                1 for a, b in zip(index_results, batch_results)
+                if (a.id if a else None) != (b[0] if b else None)
+            )
+            if batch_mismatches:
+                print(f"WARNING: {batch_mismatches} results differ between index and batch engine for n={n}")
+
+        print(f"{n:>10} {linear_ms:>12.4f} {index_ms:>12.4f} {linear_ms / index_ms:>8.1f}x {build_ms:>9.1f} {batch_ms:>11.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run([1_000, 10_000, 100_000], args.queries, args.seed)
@@ -0,0 +1,124 @@
+"""
+Compare concurrent check-ins on the sync and async database layers.
+
+Runs --concurrency check-ins at once from one event loop, first by calling
+the sync services directly from coroutines (how the async routes used to
+behave) and then through the AsyncSession services. A ticker coroutine runs
+alongside and records how late it wakes up, which shows how long the event
+loop was blocked by database I/O.
+
+Point DATABASE_URL at the database to test. Visits are written for one
+benchmark vendor and deleted afterwards.
+
+Usage:
+    python benchmark_concurrent_checkins.py [--concurrency 50] [--rounds 3]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(__file__))
+
+from app.core import database
+from app.core.security import get_password_hash
+from app.models.user import User, UserRole
+from app.models.vendor import Vendor
+from app.models.visit import Visit
+from app.schemas.visit import VisitCreate
+from app.services import vendor_service, visit_service
+
+BENCH_EMAIL = "benchmark-checkins@example.com"
+TICK_SECONDS = 0.005
+
+
+def ensure_vendor():
+    db = database.SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == BENCH_EMAIL).first()
+        if not user:
+            user = User(email=BENCH_EMAIL, hashed_password=get_password_hash("benchmark"),
+                        full_name="Benchmark Vendor", role=UserRole.VENDOR.value)
+            db.add(user)
+            db.commit()
+        vendor = db.query(Vendor).filter(Vendor.user_id == user.id).first()
+        if not vendor:
+            vendor = Vendor(user_id=user.id, company_name="Benchmark", office_address="")
+            db.add(vendor)
+            db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def cleanup(user_id):
+    db = database.SessionLocal()
+    try:
+        vendor = db.query(Vendor).filter(Vendor.user_id == user_id).first()
+        db.query(Visit).filter(Visit.vendor_id == vendor.id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def visit_payload(i):
+    return VisitCreate(check_in_latitude=12.9 + i * 1e-4, check_in_longitude=77.6, purpose="benchmark")
+
+
+async def ticker(stop, lags):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(time.perf_counter() - start - TICK_SECONDS)
+
+
+async def sync_checkin(user_id, i):
+    with database.unit_of_work() as db:
+        vendor = vendor_service.get_vendor_by_user_id(db, user_id)
+        visit_service.create_visit(db, visit_payload(i), vendor.id, "benchmark.jpg")
+
+
+async def async_checkin(user_id, i):
+    async with database.async_unit_of_work() as db:
+        vendor = await vendor_service.get_vendor_by_user_id_async(db, user_id)
+        await visit_service.create_visit_async(db, visit_payload(i), vendor.id, "benchmark.jpg")
+
+
+async def run_round(checkin, user_id, concurrency):
+    stop, lags = asyncio.Event(), []
+    tick = asyncio.create_task(ticker(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(checkin(user_id, i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    return elapsed, lags
+
+
+async def main(concurrency, rounds):
+    user_id = ensure_vendor()
+    # Warm up both engines and the company index
+    await sync_checkin(user_id, 0)
+    await async_checkin(user_id, 0)
+
+    print(f"{'layer':<6} {'round':>5} {'total s':>8} {'checkins/s':>11} {'loop lag p50 ms':>16} {'loop lag max ms':>16}")
+    try:
+        for name, checkin in (("sync", sync_checkin), ("async", async_checkin)):
+            for r in range(rounds):
+                elapsed, lags = await run_round(checkin, user_id, concurrency)
+                lags = lags or [elapsed]
+                print(f"{name:<6} {r + 1:>5} {elapsed:>8.3f} {concurrency / elapsed:>11.1f} "
+                      f"{statistics.median(lags) * 1000:>16.2f} {max(lags) * 1000:>16.2f}")
+    finally:
+        cleanup(user_id)
+        await database.dispose_async_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.rounds))
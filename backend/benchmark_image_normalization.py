@@ -0,0 +1,121 @@
+"""
+Measure what server-side image normalization saves on selfie and document
+uploads.
+
+Each image is normalized the way the upload routes do it: through the image
+process pool, to fit SELFIE_MAX_DIMENSION (or --max-dimension), in
+IMAGE_FORMAT at IMAGE_QUALITY. Reported per image and in total:
+
+    original      bytes received from the phone
+    normalized    bytes sent to Cloudinary
+    normalize ms  time in the pool, queue wait included
+    upload s      estimated transfer time of each at --uplink-mbps
+
+Without --images, --count synthetic 12 MP photos (4032x3024, EXIF
+orientation and camera metadata, like a phone camera writes them) are used.
+Nothing is uploaded and no database is needed.
+
+Usage:
+    python benchmark_image_normalization.py [--images DIR] [--count 20] [--max-dimension 1280] [--uplink-mbps 20]
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(__file__))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".heic", ".tif", ".tiff")
+
+
+def synthetic_photo(seed: int) -> bytes:
+    """A noisy 12 MP JPEG at phone camera quality, rotated by its EXIF orientation."""
+    from PIL import Image, ImageFilter
+
+    rng = random.Random(seed)
+    # Smoothed noise compresses roughly like a real photo; flat colour would flatter the savings
+    noise = Image.effect_noise((1008, 756), 64).filter(ImageFilter.GaussianBlur(2))
+    photo = Image.merge("RGB", [noise.point(lambda v, o=rng.randint(0, 80): min(255, v + o)) for _ in range(3)])
+    photo = photo.resize((4032, 3024), Image.Resampling.BICUBIC)
+    exif = photo.getexif()
+    exif[0x0112] = 6  # Rotated 90 degrees, as held in portrait
+    exif[0x010F] = "Benchmark Phone"
+    out = io.BytesIO()
+    photo.save(out, "JPEG", quality=92, exif=exif.tobytes())
+    return out.getvalue()
+
+
+def load_images(args):
+    if not args.images:
+        return [(f"synthetic-{i}.jpg", synthetic_photo(i)) for i in range(args.count)]
+    images = []
+    for name in sorted(os.listdir(args.images)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(args.images, name), "rb") as f:
+                images.append((name, f.read()))
+    return images
+
+
+async def normalize_all(images, max_dimension):
+    from app.services import image_service
+
+    async def timed(data):
+        start = time.perf_counter()
+        normalized = (await image_service.prepare_upload(data, max_dimension)).getvalue()
+        return normalized, time.perf_counter() - start
+
+    # All at once, like concurrent check-ins: the pool's queue decides the order
+    return await asyncio.gather(*(timed(data) for _, data in images))
+
+
+def main(args):
+    from app.core.config import settings
+    from app.services import image_service
+
+    max_dimension = args.max_dimension or settings.SELFIE_MAX_DIMENSION
+    images = load_images(args)
+    if not images:
+        sys.exit(f"No images found in {args.images}")
+    bytes_per_second = args.uplink_mbps * 1_000_000 / 8
+
+    print(f"{len(images)} images, max {max_dimension}px, {settings.IMAGE_FORMAT} q{settings.IMAGE_QUALITY}, "
+          f"{settings.IMAGE_WORKERS} pool workers, {args.uplink_mbps} Mbps uplink\n")
+    try:
+        # Warm the pool so the first image doesn't pay for worker start-up
+        asyncio.run(normalize_all(images[:1], max_dimension))
+        start = time.perf_counter()
+        results = asyncio.run(normalize_all(images, max_dimension))
+        wall = time.perf_counter() - start
+    finally:
+        image_service.image_pool.shutdown()
+
+    print(f"{'image':<28} {'original KB':>12} {'normalized KB':>14} {'saved':>7} {'normalize ms':>13} "
+          f"{'upload s':>9} {'-> s':>6}")
+    for (name, original), (normalized, seconds) in zip(images, results):
+        print(f"{name[:28]:<28} {len(original) / 1024:>12.0f} {len(normalized) / 1024:>14.0f} "
+              f"{1 - len(normalized) / len(original):>7.0%} {seconds * 1000:>13.0f} "
+              f"{len(original) / bytes_per_second:>9.2f} {len(normalized) / bytes_per_second:>6.2f}")
+
+    original_total = sum(len(data) for _, data in images)
+    normalized_total = sum(len(normalized) for normalized, _ in results)
+    latencies = sorted(seconds for _, seconds in results)
+    print(f"\ntotal {original_total / 1024 / 1024:.1f} MB -> {normalized_total / 1024 / 1024:.1f} MB "
+          f"({1 - normalized_total / original_total:.0%} smaller)")
+    print(f"normalize p50 {statistics.median(latencies) * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms, "
+          f"{len(images) / wall:.1f} images/s")
+    print(f"upload per image at {args.uplink_mbps} Mbps: {original_total / len(images) / bytes_per_second:.2f} s "
+          f"-> {normalized_total / len(images) / bytes_per_second:.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="directory of sample photos; synthetic ones if omitted")
+    parser.add_argument("--count", type=int, default=20, help="number of synthetic photos")
+    parser.add_argument("--max-dimension", type=int, help="defaults to SELFIE_MAX_DIMENSION")
+    parser.add_argument("--uplink-mbps", type=float, default=20.0, help="server to Cloudinary bandwidth")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,70 @@
+"""
+Calibrate the pbkdf2_sha256 cost and measure password hashing pool throughput.
+
+Times a single verify at several round counts on this machine, then suggests
+the largest PASSWORD_HASH_ROUNDS that keeps one verify under --target-ms.
+Finally it pushes a burst of logins through the hashing process pool to show
+queue wait and throughput at the configured worker count.
+
+Usage:
+    python benchmark_password_hashing.py [--target-ms 50] [--burst 200]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(__file__))
+
+from passlib.hash import pbkdf2_sha256
+from app.core import security
+from app.core.config import settings
+
+CANDIDATE_ROUNDS = [10_000, 29_000, 60_000, 100_000, 200_000, 300_000, 600_000]
+
+
+def time_verify(rounds, samples=5):
+    hashed = pbkdf2_sha256.using(rounds=rounds).hash("benchmark-password")
+    start = time.perf_counter()
+    for _ in range(samples):
+        pbkdf2_sha256.verify("benchmark-password", hashed)
+    return (time.perf_counter() - start) * 1000 / samples
+
+
+def calibrate(target_ms):
+    print(f"{'rounds':>9} {'verify ms':>10}")
+    best = None
+    for rounds in CANDIDATE_ROUNDS:
+        ms = time_verify(rounds)
+        print(f"{rounds:>9} {ms:>10.2f}")
+        if ms <= target_ms:
+            best = rounds
+    if best:
+        print(f"\nSuggested PASSWORD_HASH_ROUNDS={best} (<= {target_ms} ms per verify)")
+    else:
+        print(f"\nEven {CANDIDATE_ROUNDS[0]} rounds exceed {target_ms} ms; this host is too slow for the target")
+
+
+async def burst(count):
+    hashed = security.get_password_hash("benchmark-password")
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        security.verify_and_update_password_async("benchmark-password", hashed) for _ in range(count)
+    ))
+    elapsed = time.perf_counter() - start
+    metrics = security.hashing_pool.metrics()
+    print(f"\nBurst of {count} verifies through {settings.PASSWORD_HASH_WORKERS} worker(s): "
+          f"{elapsed:.2f}s, {count / elapsed:.1f} verifies/s")
+    print(f"avg latency {metrics['avg_latency_ms']} ms, avg queue wait {metrics['avg_queue_wait_ms']} ms, "
+          f"max latency {metrics['max_latency_ms']} ms, rejected {metrics['rejected']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=50.0)
+    parser.add_argument("--burst", type=int, default=min(200, settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_QUEUE))
+    args = parser.parse_args()
+    calibrate(args.target_ms)
+    asyncio.run(burst(args.burst))
+    security.hashing_pool.shutdown()
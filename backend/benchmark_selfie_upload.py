@@ -0,0 +1,137 @@
+"""
+Compare check-in latency with inline and background selfie uploads.
+
+Runs --requests check-ins, --concurrency at a time, through the real
+POST /visits/check-in route in a fresh interpreter per mode:
+
+    inline   the route uploads the selfie before writing the visit
+             (SELFIE_UPLOAD_ASYNC=false, also what serverless instances do)
+    async    the route spools the selfie and returns; the upload workers
+             upload it and fill in check_in_selfie_url
+
+Cloudinary is replaced by the filesystem fake (CLOUDINARY_FAKE_DIR) with
+--upload-latency seconds per upload, so runs are repeatable and free.
+For async, "settled" is when the last selfie URL was filled in.
+
+Point DATABASE_URL at the database to use. Visits are written for one
+benchmark vendor and deleted afterwards.
+
+Usage:
+    python benchmark_selfie_upload.py [--requests 100] [--concurrency 10] [--upload-latency 1.5] [--selfie-kb 2048]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(__file__))
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_EMAIL = "benchmark-selfies@example.com"
+
+PROBE = """
+import json, os, statistics, sys, time
+from concurrent.futures import ThreadPoolExecutor
+requests, concurrency, token, selfie_kb = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3], int(sys.argv[4])
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app.core import database
+from app.main import app
+from app.models.visit import Visit
+
+selfie = os.urandom(selfie_kb * 1024)
+headers = {"Authorization": f"Bearer {token}"}
+
+with TestClient(app) as client:
+    def check_in(i):
+        start = time.perf_counter()
+        response = client.post("/api/v1/visits/check-in", headers=headers,
+                               data={"check_in_latitude": str(12.9 + i * 1e-4), "check_in_longitude": "77.6"},
+                               files={"selfie": ("selfie.jpg", selfie, "image/jpeg")})
+        response.raise_for_status()
+        return time.perf_counter() - start, response.json()["id"]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(check_in, range(requests)))
+    answered = time.perf_counter() - start
+
+    ids = [visit_id for _, visit_id in results]
+    while True:
+        with database.unit_of_work() as db:
+            missing = db.scalar(select(Visit.id).where(Visit.id.in_(ids), Visit.check_in_selfie_url.is_(None)).limit(1))
+        if missing is None or time.perf_counter() - start > 600:
+            break
+        time.sleep(0.05)
+    settled = time.perf_counter() - start
+
+latencies = sorted(seconds for seconds, _ in results)
+print(json.dumps({"p50": statistics.median(latencies), "p95": latencies[int(len(latencies) * 0.95) - 1],
+                  "max": latencies[-1], "answered": answered, "settled": settled}))
+"""
+
+
+def ensure_vendor():
+    from app.core import database
+    from app.core.security import create_access_token, get_password_hash, principal_claims
+    from app.models.user import User, UserRole
+    from app.models.vendor import Vendor
+
+    with database.unit_of_work() as db:
+        user = db.query(User).filter(User.email == BENCH_EMAIL).first()
+        if not user:
+            user = User(email=BENCH_EMAIL, hashed_password=get_password_hash("benchmark"),
+                        full_name="Benchmark Vendor", role=UserRole.VENDOR.value,
+                        phone_number="benchmark-selfies")
+            db.add(Vendor(user=user, company_name="Benchmark Selfies", office_address=""))
+            db.flush()
+        vendor_id = db.query(Vendor.id).filter(Vendor.user_id == user.id).scalar()
+        return vendor_id, create_access_token(principal_claims(user))
+
+
+def cleanup(vendor_id):
+    from app.core import database
+    from app.models.selfie_upload import SelfieUpload
+    from app.models.visit import Visit
+
+    with database.unit_of_work() as db:
+        visit_ids = db.query(Visit.id).filter(Visit.vendor_id == vendor_id)
+        db.query(SelfieUpload).filter(SelfieUpload.visit_id.in_(visit_ids)).delete(synchronize_session=False)
+        db.query(Visit).filter(Visit.vendor_id == vendor_id).delete(synchronize_session=False)
+
+
+def run_probe(mode, token, args, fake_dir, spool_dir):
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, STARTUP_MODE="full", RATE_LIMIT_ENABLED="false",
+               IDEMPOTENCY_ENABLED="false", SQL_INSTRUMENTATION_ENABLED="false",
+               SELFIE_UPLOAD_ASYNC="true" if mode == "async" else "false", SELFIE_SPOOL_DIR=spool_dir,
+               CLOUDINARY_FAKE_DIR=fake_dir, CLOUDINARY_FAKE_LATENCY_SECONDS=str(args.upload_latency))
+    out = subprocess.run([sys.executable, "-c", PROBE, str(args.requests), str(args.concurrency), token, str(args.selfie_kb)],
+                         cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(args):
+    vendor_id, token = ensure_vendor()
+    print(f"{args.requests} check-ins, {args.concurrency} at a time, {args.selfie_kb} KB selfies, "
+          f"{args.upload_latency}s per upload\n")
+    print(f"{'mode':<7} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'answered s':>11} {'settled s':>10}")
+    try:
+        with tempfile.TemporaryDirectory() as fake_dir, tempfile.TemporaryDirectory() as spool_dir:
+            for mode in ("inline", "async"):
+                r = run_probe(mode, token, args, fake_dir, spool_dir)
+                print(f"{mode:<7} {r['p50'] * 1000:>8.0f} {r['p95'] * 1000:>8.0f} {r['max'] * 1000:>8.0f} "
+                      f"{r['answered']:>11.1f} {r['settled']:>10.1f}")
+    finally:
+        cleanup(vendor_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--upload-latency", type=float, default=1.5, help="seconds per fake Cloudinary upload")
+    parser.add_argument("--selfie-kb", type=int, default=2048)
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,82 @@
+"""
+Measure cold-start cost of the API in each startup mode.
+
+Every sample runs in a fresh interpreter, like a new serverless instance:
+it times `import app.main`, then the first request (GET /) through the ASGI
+app including the startup events. The slowest imports of the app and its
+dependencies are listed from `python -X importtime`.
+
+Point DATABASE_URL at the database to use; full mode connects to it to create
+missing tables.
+
+Usage:
+    python benchmark_startup.py [--samples 5] [--modes fast,full] [--top 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app.main.app) as client:
+    status = client.get("/").status_code
+first_response = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000,
+                  "first_response_ms": (first_response - start) * 1000,
+                  "status": status}))
+"""
+
+
+def run_probe(mode):
+    env = dict(os.environ, STARTUP_MODE=mode, PYTHONPATH=BACKEND_DIR)
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    # The app prints request logs; the measurement is the last line
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def slowest_imports(mode, top):
+    env = dict(os.environ, STARTUP_MODE=mode, PYTHONPATH=BACKEND_DIR)
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], cwd=BACKEND_DIR,
+                         env=env, capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Top-level packages only (no leading indentation beyond one level)
+        if len(name) - len(name.lstrip()) <= 3:
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(samples, modes, top):
+    print(f"{'mode':<6} {'import ms (p50)':>16} {'first response ms (p50)':>24} {'max first response ms':>22}")
+    for mode in modes:
+        results = [run_probe(mode) for _ in range(samples)]
+        imports = [r["import_ms"] for r in results]
+        firsts = [r["first_response_ms"] for r in results]
+        print(f"{mode:<6} {statistics.median(imports):>16.1f} {statistics.median(firsts):>24.1f} {max(firsts):>22.1f}")
+
+    for mode in modes:
+        print(f"\nSlowest imports in {mode} mode (cumulative ms):")
+        for ms, name in slowest_imports(mode, top):
+            print(f"  {ms:>8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--modes", default="fast,full")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    main(args.samples, args.modes.split(","), args.top)
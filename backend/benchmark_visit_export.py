@@ -0,0 +1,139 @@
+"""
+Show that GET /visits/export streams in constant memory.
+
+Seeds --rows visits for one benchmark vendor (reused across runs), then
+exports them in a fresh interpreter per mode and reports the growth of peak
+RSS over the interpreter's baseline:
+
+    stream        visit_export_service.stream_export, the export endpoint's body
+    stream-gzip   the same with gzip
+    materialize   load every visit as ORM objects and VisitResponse models and
+                  serialize the list, which is what paging the JSON API
+                  client-side amounted to
+
+Point DATABASE_URL at the database to use. Peak RSS comes from
+resource.getrusage, so this runs on Linux and macOS only.
+
+Usage:
+    python benchmark_visit_export.py [--rows 1000000] [--modes stream,stream-gzip,materialize] [--cleanup]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(__file__))
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_EMAIL = "benchmark-export@example.com"
+SEED_CHUNK = 10000
+
+PROBE = """
+import json, resource, sys, time
+mode, vendor_id = sys.argv[1], int(sys.argv[2])
+from app.core import database
+from app.services import visit_export_service, visit_service
+from app.schemas.visit import VisitResponse
+
+def peak_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+database.engine.connect().close()
+baseline = peak_mb()
+start = time.perf_counter()
+size = 0
+if mode == "materialize":
+    with database.unit_of_work() as db:
+        visits = visit_service.get_visits_by_vendor_id(db, vendor_id)
+        size = len(json.dumps([VisitResponse.model_validate(v).model_dump(mode="json") for v in visits]))
+else:
+    for chunk in visit_export_service.stream_export("csv", mode == "stream-gzip", vendor_id=vendor_id):
+        size += len(chunk)
+print(json.dumps({"seconds": time.perf_counter() - start, "bytes": size,
+                  "baseline_mb": baseline, "peak_growth_mb": peak_mb() - baseline}))
+"""
+
+
+def ensure_vendor():
+    from app.core import database
+    from app.core.security import get_password_hash
+    from app.models.user import User, UserRole
+    from app.models.vendor import Vendor
+
+    with database.unit_of_work() as db:
+        user = db.query(User).filter(User.email == BENCH_EMAIL).first()
+        if not user:
+            user = User(email=BENCH_EMAIL, hashed_password=get_password_hash("benchmark"),
+                        full_name="Benchmark Vendor", role=UserRole.VENDOR.value,
+                        phone_number="benchmark-export")
+            db.add(Vendor(user=user, company_name="Benchmark Export", office_address=""))
+            db.flush()
+        return db.query(Vendor.id).filter(Vendor.user_id == user.id).scalar()
+
+
+def seed(vendor_id, rows):
+    from sqlalchemy import func, insert
+    from app.core import database
+    from app.models.visit import Visit
+
+    with database.unit_of_work() as db:
+        existing = db.query(func.count(Visit.id)).filter(Visit.vendor_id == vendor_id).scalar()
+    if existing >= rows:
+        return existing
+
+    start = datetime.now(timezone.utc) - timedelta(days=30)
+    for offset in range(existing, rows, SEED_CHUNK):
+        batch = [
+            {"vendor_id": vendor_id, "check_in_time": start + timedelta(seconds=i), "check_out_time": start + timedelta(seconds=i + 3600),
+             "check_in_latitude": 12.9, "check_in_longitude": 77.6, "city": "Bengaluru", "pincode": "560001",
+             "check_in_selfie_url": f"https://example.com/selfies/{i}.jpg", "purpose": f"Benchmark visit {i}"}
+            for i in range(offset, min(offset + SEED_CHUNK, rows))
+        ]
+        with database.unit_of_work() as db:
+            db.execute(insert(Visit), batch)
+        print(f"  seeded {offset + len(batch)}/{rows}", end="\r")
+    print()
+    return rows
+
+
+def cleanup(vendor_id):
+    from app.core import database
+    from app.models.visit import Visit
+
+    with database.unit_of_work() as db:
+        db.query(Visit).filter(Visit.vendor_id == vendor_id).delete()
+
+
+def run_probe(mode, vendor_id):
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    out = subprocess.run([sys.executable, "-c", PROBE, mode, str(vendor_id)], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(rows, modes, clean):
+    vendor_id = ensure_vendor()
+    count = seed(vendor_id, rows)
+    print(f"{count} visits for vendor {vendor_id}\n")
+    print(f"{'mode':<12} {'seconds':>8} {'rows/s':>9} {'output MB':>10} {'baseline MB':>12} {'peak RSS growth MB':>19}")
+    try:
+        for mode in modes:
+            r = run_probe(mode, vendor_id)
+            print(f"{mode:<12} {r['seconds']:>8.1f} {count / r['seconds']:>9.0f} {r['bytes'] / 2**20:>10.1f} "
+                  f"{r['baseline_mb']:>12.1f} {r['peak_growth_mb']:>19.1f}")
+    finally:
+        if clean:
+            cleanup(vendor_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--modes", default="stream,stream-gzip,materialize")
+    parser.add_argument("--cleanup", action="store_true", help="delete the benchmark visits afterwards")
+    args = parser.parse_args()
+    main(args.rows, args.modes.split(","), args.cleanup)
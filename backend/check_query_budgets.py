@@ -0,0 +1,130 @@
+"""
+SQL statement budget check for the hot endpoints.
+
+Each endpoint is called once through the real app (TestClient) as a check
+vendor, and every statement it sends to the database is counted with
+sql_instrumentation.count_queries. An endpoint over its budget fails the
+check and its statements are listed, so a new N+1 loop or a lost eager
+load shows up before it ships. Budgets are the steady-state counts: a
+warm-up request fills the principal cache and the company location index
+first. Selfies are uploaded inline to a throwaway CLOUDINARY_FAKE_DIR.
+
+Point DATABASE_URL at a development database migrated to head. The check
+vendor's visits, visit rollups and company location are deleted
+afterwards. Exits with status 1 when any endpoint is over budget.
+
+Usage:
+    python check_query_budgets.py [--verbose]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(__file__))
+
+# Before the app reads its settings: no Cloudinary, no background uploads,
+# no rate limits or idempotency records in the counts
+os.environ["CLOUDINARY_FAKE_DIR"] = tempfile.mkdtemp(prefix="vms_query_budgets_")
+os.environ["SELFIE_UPLOAD_ASYNC"] = "false"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["IDEMPOTENCY_ENABLED"] = "false"
+
+from fastapi.testclient import TestClient
+
+from app.core import database
+from app.core.security import create_access_token, get_password_hash, principal_claims
+from app.core.sql_instrumentation import count_queries
+from app.main import app
+from app.models.company_location import CompanyLocation
+from app.models.user import User, UserRole
+from app.models.vendor import Vendor
+from app.models.visit import Visit
+from app.models.visit_daily_stat import VisitDailyStat
+
+CHECK_EMAIL = "query-budgets@example.com"
+CHECK_COMPANY = "Query Budgets"
+SELFIE = ("selfie.jpg", b"query budget selfie", "image/jpeg")
+
+# (description, max statements, call); calls run in this order and share state
+HOT_ENDPOINTS = [
+    ("GET /vendors/me", 1,
+     lambda client, state: client.get("/api/v1/vendors/me", headers=state["headers"])),
+    ("GET /visits", 2,
+     lambda client, state: client.get("/api/v1/visits/", headers=state["headers"])),
+    ("POST /visits/check-in", 5,
+     lambda client, state: client.post("/api/v1/visits/check-in", headers=state["headers"], files={"selfie": SELFIE},
+                                       data={"check_in_latitude": "12.9716", "check_in_longitude": "77.5946",
+                                             "company_name": CHECK_COMPANY})),
+    ("POST /visits/{id}/check-out", 4,
+     lambda client, state: client.post(f"/api/v1/visits/{state['visit_id']}/check-out", headers=state["headers"],
+                                       files={"selfie": SELFIE},
+                                       data={"check_out_latitude": "12.9716", "check_out_longitude": "77.5946"})),
+]
+
+
+def ensure_vendor():
+    with database.unit_of_work() as db:
+        user = db.query(User).filter(User.email == CHECK_EMAIL).first()
+        if not user:
+            user = User(email=CHECK_EMAIL, hashed_password=get_password_hash("query-budgets"),
+                        full_name="Query Budget Vendor", role=UserRole.VENDOR.value,
+                        phone_number="query-budgets")
+            db.add(Vendor(user=user, company_name=CHECK_COMPANY, office_address=""))
+            db.flush()
+        vendor_id = db.query(Vendor.id).filter(Vendor.user_id == user.id).scalar()
+        return vendor_id, create_access_token(principal_claims(user))
+
+
+def cleanup(vendor_id):
+    with database.unit_of_work() as db:
+        db.query(Visit).filter(Visit.vendor_id == vendor_id).delete(synchronize_session=False)
+        db.query(VisitDailyStat).filter(VisitDailyStat.vendor_id == vendor_id).delete(synchronize_session=False)
+        # Check-in registers the named company at the check-in position
+        db.query(CompanyLocation).filter(CompanyLocation.company_name == CHECK_COMPANY).delete(synchronize_session=False)
+
+
+def main(verbose):
+    vendor_id, token = ensure_vendor()
+    state = {"headers": {"Authorization": f"Bearer {token}"}}
+    failures = 0
+    try:
+        with TestClient(app) as client:
+            client.get("/api/v1/vendors/me", headers=state["headers"]).raise_for_status()
+            client.post("/api/v1/visits/detect-company/batch", headers=state["headers"],
+                        json={"points": [{"latitude": 0.0, "longitude": 0.0}]}).raise_for_status()
+
+            for description, budget, call in HOT_ENDPOINTS:
+                with count_queries() as stats:
+                    response = call(client, state)
+                if response.status_code != 200:
+                    failures += 1
+                    print(f"[FAIL] {description}: HTTP {response.status_code} {response.text[:200]}")
+                    continue
+                if description == "POST /visits/check-in":
+                    state["visit_id"] = response.json()["id"]
+
+                within = stats.count <= budget
+                if within:
+                    print(f"[OK] {description}: {stats.count} of {budget} statements")
+                else:
+                    failures += 1
+                    print(f"[FAIL] {description}: {stats.count} statements, budget {budget}")
+                if verbose or not within:
+                    for sql, n in stats.statements.most_common():
+                        print(f"  {n}x {' '.join(sql.split())[:200]}")
+    finally:
+        cleanup(vendor_id)
+
+    if failures:
+        print(f"\n{failures} hot endpoints are over their query budget.")
+        return 1
+    print("\nAll hot endpoints are within their query budget.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verbose", action="store_true", help="print every endpoint's statements")
+    args = parser.parse_args()
+    sys.exit(main(args.verbose))
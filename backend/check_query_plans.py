@@ -0,0 +1,128 @@
+"""
+EXPLAIN regression check for the hot lookup queries.
+
+Each query is built by the service code the routes call, so a change to a
+filter that stops matching its index shows up here. The SQL sent to the
+database is captured, EXPLAINed with the same parameters, and the plan must
+mention the expected index (or, on a partitioned table, one of its
+per-partition indexes). Everything runs in a transaction that is rolled
+back.
+
+On PostgreSQL sequential scans are disabled for the check, so small
+development tables still report whether an index *can* serve the query.
+
+Point DATABASE_URL at a database migrated to head. Exits with status 1 when
+any plan misses its index.
+
+Usage:
+    python check_query_plans.py [--verbose]
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core import database
+from app.services import auth_service, document_service, otp_store, soc_service, visit_service
+
+# (description, service call, expected index)
+HOT_QUERIES = [
+    ("GET /profiles/detect/{bluetooth_id}",
+     lambda db: soc_service.get_profile_by_bluetooth_id(db, "plan-check"),
+     "ix_soc_profiles_bluetooth_id"),
+    ("OTP verification",
+     lambda db: otp_store.DatabaseOTPStore(ttl_seconds=300, max_attempts=5).verify(db, "plan-check", "register", "0000"),
+     "ix_otps_identifier_purpose_code"),
+    ("Document replacement on upload",
+     lambda db: db.execute(document_service._replace_existing(0, "plan-check")),
+     "ix_documents_vendor_id_document_type"),
+    ("Vendor visit history",
+     lambda db: visit_service.get_visits_by_vendor_id(db, 0),
+     "ix_visits_vendor_id_check_in_time"),
+    ("GET /visits admin page",
+     lambda db: visit_service.page_visits(db, limit=100),
+     "ix_visits_check_in_time_id"),
+    ("GET /visits vendor view (visits to the vendor's company)",
+     lambda db: visit_service.page_visits(db, limit=100, view_vendor_id=0, view_company="plan-check"),
+     "ix_visits_visited_company"),
+    ("Login / registration email lookup",
+     lambda db: auth_service.get_user_by_email(db, "Plan-Check@Example.com"),
+     "uq_users_email_lower"),
+]
+
+
+def explain_prefix(dialect):
+    return "EXPLAIN " if dialect == "postgresql" else "EXPLAIN QUERY PLAN "
+
+
+def capture_statement(conn, call):
+    """Run a service call and return the first statement it sent to the database."""
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(conn, "before_cursor_execute", before_cursor_execute)
+    try:
+        db = Session(bind=conn)
+        call(db)
+        db.close()
+    finally:
+        event.remove(conn, "before_cursor_execute", before_cursor_execute)
+    return captured[0]
+
+
+def index_names(conn, index):
+    """The index plus, on a partitioned table, the per-partition indexes attached to it."""
+    if conn.dialect.name != "postgresql":
+        return {index}
+    children = conn.exec_driver_sql(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = %(name)s", {"name": index}
+    ).scalars()
+    return {index, *children}
+
+
+def plan_text(conn, statement, parameters):
+    rows = conn.exec_driver_sql(explain_prefix(conn.dialect.name) + statement, parameters).all()
+    # PostgreSQL returns one text column; SQLite's detail is the last column
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def main(verbose):
+    failures = 0
+    with database.engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        try:
+            for description, call, index in HOT_QUERIES:
+                statement, parameters = capture_statement(conn, call)
+                plan = plan_text(conn, statement, parameters)
+                uses_index = any(name in plan for name in index_names(conn, index))
+                if uses_index:
+                    print(f"[OK] {description}: uses {index}")
+                else:
+                    failures += 1
+                    print(f"[FAIL] {description}: expected {index}")
+                if verbose or not uses_index:
+                    print("  " + " ".join(statement.split()))
+                    print("  " + plan.replace("\n", "\n  "))
+        finally:
+            conn.rollback()
+
+    if failures:
+        print(f"\n{failures} hot queries do not use their index. Is the database migrated to head?")
+        return 1
+    print("\nAll hot queries use their index.")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verbose", action="store_true", help="print every statement and plan")
+    args = parser.parse_args()
+    sys.exit(main(args.verbose))
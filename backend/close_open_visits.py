@@ -0,0 +1,57 @@
+"""
+Check out visits left open past the auto-close horizon.
+
+Visitors who leave without checking out would otherwise stay "on site"
+forever. Visits still open VISIT_AUTO_CLOSE_AFTER_HOURS after check-in are
+checked out at check-in + horizon, oldest first, one committed batch at a
+time, read through the open-visits index. Their check-out position and
+selfie stay empty, which marks them as auto-closed. The daily rollups count
+them as completed, with dwell time capped at the horizon. API workers pick
+up the new occupancy on their next recount (OCCUPANCY_REFRESH_SECONDS).
+
+Run it hourly from cron; it is safe to rerun, and concurrent runs skip each
+other's rows.
+
+Usage:
+    python close_open_visits.py [--after-hours 24] [--batch-size 500] [--dry-run]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(__file__))
+
+from app.core import database
+from app.core.config import settings
+from app.services import visit_service
+
+
+def main(after_hours, batch_size, dry_run):
+    cutoff = visit_service.auto_close_cutoff(after_hours)
+    print(f"Closing visits open since before {cutoff:%Y-%m-%d %H:%M} UTC")
+
+    if dry_run:
+        with database.unit_of_work() as db:
+            print(f"{visit_service.count_auto_closable(db, cutoff)} visits would be closed")
+        return
+
+    total, start = 0, time.perf_counter()
+    while True:
+        # One transaction per batch keeps row locks short
+        with database.unit_of_work() as db:
+            closed = visit_service.auto_close_batch(db, cutoff, after_hours, batch_size)
+        if not closed:
+            break
+        total += closed
+        print(f"  closed {total} visits ({total / (time.perf_counter() - start):.0f}/s)")
+    print(f"Closed {total} visits")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--after-hours", type=int, default=settings.VISIT_AUTO_CLOSE_AFTER_HOURS)
+    parser.add_argument("--batch-size", type=int, default=settings.VISIT_AUTO_CLOSE_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="only count the visits that would be closed")
+    args = parser.parse_args()
+    main(args.after_hours, args.batch_size, args.dry_run)
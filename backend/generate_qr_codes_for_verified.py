@@ -30,6 +30,7 @@ def generate_qr_codes_for_verified_vendors():
                 print(f"Generating QR code for vendor {vendor.id} ({vendor.company_name})...")
                 qr_url = generate_and_save_qr_code(db, vendor)
                 if qr_url:
+                    db.commit()
                     print(f"  ✓ Success: {qr_url}")
                     success_count += 1
                 else:
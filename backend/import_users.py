@@ -0,0 +1,57 @@
+"""
+Bulk-import users with vendor or SOC profiles from a CSV or NDJSON file.
+
+Columns / keys: email, password, full_name, phone_number, account_type
+('vendor' or 'soc'), company_name, office_address, role_type,
+service_category, bluetooth_id, device_id.
+
+Usage:
+    python import_users.py users.csv [--format csv|ndjson] [--chunk-size 1000] [--workers 8]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(__file__))
+
+from app.core.database import SessionLocal
+from app.services import bulk_import_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "ndjson"])
+    parser.add_argument("--chunk-size", type=int)
+    parser.add_argument("--workers", type=int, help="Password hashing processes (default: CPU count)")
+    parser.add_argument("--report", help="Write per-row results as NDJSON to this file")
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if args.path.lower().endswith((".ndjson", ".jsonl")) else "csv")
+    with open(args.path, encoding="utf-8-sig") as f:
+        rows = bulk_import_service.parse_rows(f.read(), fmt)
+
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        summary = bulk_import_service.import_users(db, rows, chunk_size=args.chunk_size, hash_workers=args.workers)
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"Imported {summary['total']} rows in {elapsed:.1f}s: "
+          f"{summary['created']} created, {summary['skipped']} skipped, {summary['failed']} failed")
+    for result in summary["results"]:
+        if result["status"] != "created":
+            print(f"  row {result['row']} ({result.get('email')}): {result['status']} - {result.get('error')}")
+
+    if args.report:
+        with open(args.report, "w") as f:
+            for result in summary["results"]:
+                f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    main()
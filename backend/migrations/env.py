@@ -14,6 +14,11 @@ from app.models.vendor import Vendor
 from app.models.visit import Visit
 from app.models.document import Document
 from app.models.agent import Agent
+from app.models.refresh_token import RefreshToken
+from app.models.visit_archive import VisitArchive
+from app.models.visit_daily_stat import VisitDailyStat
+from app.models.visit_sync_event import VisitSyncEvent
+from app.models.selfie_upload import SelfieUpload
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,133 @@
+"""add_visited_company
+
+Adds visits.visited_company (and the same on visits_archive): the
+normalized name of the company visited, which the vendor visit view now
+matches with an index lookup instead of purpose ILIKE 'Visiting: X%'.
+
+Existing rows are backfilled from their purpose text in chunks of
+BACKFILL_CHUNK rows, walking the primary key, with every UPDATE committed
+on its own so the tables stay writable throughout. Backfilled rows are
+skipped, so an interrupted run can simply be restarted. The
+indexes are built concurrently (per partition on a partitioned visits
+table) and the pg_trgm purpose indexes, now unused, are dropped.
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import re
+from collections import defaultdict
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7b8c9d0e1f2'
+down_revision: Union[str, None] = 'f6a7b8c9d0e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_CHUNK = 5000
+
+# Frozen copies of app.utils.company as of this revision
+_VISITING_PREFIX = re.compile(r"^Visiting: (.+?)(?:\. |$)", re.DOTALL)
+
+
+def _company_key(purpose):
+    match = _VISITING_PREFIX.match(purpose or "")
+    if not match:
+        return None
+    return " ".join(match.group(1).split()).casefold() or None
+
+
+def _visit_partitions(bind):
+    return list(bind.execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'visits' AND p.relnamespace = current_schema()::regnamespace"
+    )).scalars())
+
+
+def _backfill(bind, table):
+    select_chunk = sa.text(
+        f"SELECT id, check_in_time, purpose FROM {table} "
+        f"WHERE id > :after AND visited_company IS NULL AND purpose LIKE 'Visiting: %' ORDER BY id LIMIT :chunk"
+    )
+    # One autocommitted UPDATE per company in the chunk; the check-in range
+    # lets PostgreSQL prune it to the partitions the chunk lives in
+    update = sa.text(
+        f"UPDATE {table} SET visited_company = :key "
+        f"WHERE id IN :ids AND check_in_time BETWEEN :first AND :last"
+    ).bindparams(sa.bindparam("ids", expanding=True))
+    # Unpartitioned tables may hold visits without a check-in time
+    update_by_id = sa.text(f"UPDATE {table} SET visited_company = :key WHERE id IN :ids").bindparams(
+        sa.bindparam("ids", expanding=True))
+    after, total = 0, 0
+    while True:
+        rows = bind.execute(select_chunk, {"after": after, "chunk": BACKFILL_CHUNK}).all()
+        if not rows:
+            break
+        ids_by_key = defaultdict(list)
+        for row in rows:
+            key = _company_key(row.purpose)
+            if key:
+                ids_by_key[key].append(row.id)
+        times = [row.check_in_time for row in rows]
+        for key, ids in ids_by_key.items():
+            if None in times:
+                bind.execute(update_by_id, {"key": key, "ids": ids})
+            else:
+                bind.execute(update, {"key": key, "ids": ids, "first": min(times), "last": max(times)})
+        after, total = rows[-1].id, total + sum(map(len, ids_by_key.values()))
+    print(f"Backfilled visited_company on {total} {table} rows")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    is_postgres = bind.dialect.name == 'postgresql'
+    # Adding a nullable column is a catalog-only change. Skipped if present,
+    # so a run interrupted during the backfill can be restarted.
+    inspector = sa.inspect(bind)
+    for table in ('visits', 'visits_archive'):
+        if 'visited_company' not in {c['name'] for c in inspector.get_columns(table)}:
+            op.add_column(table, sa.Column('visited_company', sa.String(), nullable=True))
+
+    partitions = _visit_partitions(bind) if is_postgres else []
+    with op.get_context().autocommit_block():
+        _backfill(bind, 'visits')
+        _backfill(bind, 'visits_archive')
+
+        if partitions:
+            op.execute('CREATE INDEX IF NOT EXISTS ix_visits_visited_company ON ONLY visits (visited_company)')
+            for partition in partitions:
+                op.create_index(f'{partition}_visited_company_idx', partition, ['visited_company'], unique=False,
+                                if_not_exists=True, postgresql_concurrently=True)
+                op.execute(f'ALTER INDEX ix_visits_visited_company ATTACH PARTITION {partition}_visited_company_idx')
+        else:
+            op.create_index('ix_visits_visited_company', 'visits', ['visited_company'], unique=False,
+                            if_not_exists=True, postgresql_concurrently=True)
+        op.create_index('ix_visits_archive_visited_company', 'visits_archive', ['visited_company'], unique=False,
+                        if_not_exists=True, postgresql_concurrently=True)
+
+        if is_postgres:
+            # Indexes on a partitioned table cannot be dropped concurrently
+            op.drop_index('ix_visits_purpose_trgm', table_name='visits', if_exists=True,
+                          postgresql_concurrently=not partitions)
+            op.drop_index('ix_visits_archive_purpose_trgm', table_name='visits_archive', if_exists=True,
+                          postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_index('ix_visits_archive_purpose_trgm', 'visits_archive', ['purpose'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'purpose': 'gin_trgm_ops'})
+        op.create_index('ix_visits_purpose_trgm', 'visits', ['purpose'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'purpose': 'gin_trgm_ops'})
+    op.drop_index('ix_visits_archive_visited_company', table_name='visits_archive')
+    op.drop_index('ix_visits_visited_company', table_name='visits')
+    op.drop_column('visits_archive', 'visited_company')
+    op.drop_column('visits', 'visited_company')
@@ -0,0 +1,40 @@
+"""add_visit_daily_stats
+
+Daily visit rollups per (day, vendor_id, company) for GET /visits/stats.
+The table starts empty: until `python rebuild_visit_stats.py` has run once
+after deploying, the stats only reflect visits checked in since the deploy.
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8c9d0e1f2a3'
+down_revision: Union[str, None] = 'a7b8c9d0e1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('visit_daily_stats',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('vendor_id', sa.Integer(), nullable=False),
+    sa.Column('company', sa.String(), nullable=False),
+    sa.Column('visit_count', sa.Integer(), nullable=False),
+    sa.Column('completed_count', sa.Integer(), nullable=False),
+    sa.Column('dwell_seconds', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'vendor_id', 'company')
+    )
+    op.create_index(op.f('ix_visit_daily_stats_vendor_id'), 'visit_daily_stats', ['vendor_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_visit_daily_stats_vendor_id'), table_name='visit_daily_stats')
+    op.drop_table('visit_daily_stats')
@@ -0,0 +1,50 @@
+"""add_selfie_uploads
+
+Background selfie uploads for check-in and check-out. Visits checked in
+while an upload is pending have no selfie URL yet, so check_in_selfie_url
+is no longer implied to be set.
+
+Revision ID: d0e1f2a3b4c5
+Revises: c9d0e1f2a3b4
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd0e1f2a3b4c5'
+down_revision: Union[str, None] = 'c9d0e1f2a3b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('selfie_uploads',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('visit_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('spool_path', sa.String(), nullable=False),
+    sa.Column('spool_host', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('url', sa.String(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_selfie_uploads_id'), 'selfie_uploads', ['id'], unique=False)
+    op.create_index(op.f('ix_selfie_uploads_visit_id'), 'selfie_uploads', ['visit_id'], unique=False)
+    op.create_index('ix_selfie_uploads_status_next_attempt_at', 'selfie_uploads', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_selfie_uploads_status_next_attempt_at', table_name='selfie_uploads')
+    op.drop_index(op.f('ix_selfie_uploads_visit_id'), table_name='selfie_uploads')
+    op.drop_index(op.f('ix_selfie_uploads_id'), table_name='selfie_uploads')
+    op.drop_table('selfie_uploads')
@@ -0,0 +1,63 @@
+"""add_hot_query_indices
+
+Indexes for the lookups the API runs on every request path: bluetooth
+detection, OTP verification, document replacement, the vendor visit view
+and case-insensitive email login.
+
+Every index is built with CREATE INDEX CONCURRENTLY outside the migration
+transaction, so writes to these tables are not blocked while it runs. If a
+concurrent build fails it leaves an INVALID index behind; drop it and rerun.
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d9e1f2a4b5
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e5f6a7b8c9'
+down_revision: Union[str, None] = 'c3d9e1f2a4b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, columns or expressions)
+INDEXES = [
+    ('ix_soc_profiles_bluetooth_id', 'soc_profiles', ['bluetooth_id']),
+    ('ix_otps_identifier_purpose_code', 'otps', ['identifier', 'purpose', 'code']),
+    ('ix_documents_vendor_id_document_type', 'documents', ['vendor_id', 'document_type']),
+    ('ix_visits_vendor_id_check_in_time', 'visits', ['vendor_id', 'check_in_time']),
+    ('ix_users_email_lower', 'users', [sa.text('lower(email)')]),
+]
+
+
+def _existing_tables():
+    # soc_profiles and otps are created by the app (create_all), not by earlier revisions
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def upgrade() -> None:
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    tables = _existing_tables()
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            if table in tables:
+                op.create_index(name, table, columns, unique=False, if_not_exists=True, postgresql_concurrently=True)
+        if is_postgres and 'visits' in tables:
+            op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            op.create_index('ix_visits_purpose_trgm', 'visits', ['purpose'], unique=False, if_not_exists=True,
+                            postgresql_using='gin', postgresql_ops={'purpose': 'gin_trgm_ops'},
+                            postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    tables = _existing_tables()
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_visits_purpose_trgm', table_name='visits', if_exists=True, postgresql_concurrently=True)
+        for name, table, _ in reversed(INDEXES):
+            if table in tables:
+                op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
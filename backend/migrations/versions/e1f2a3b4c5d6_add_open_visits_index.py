@@ -0,0 +1,61 @@
+"""add_open_visits_index
+
+Partial index on visits that are still open (check_out_time IS NULL), for
+GET /visits/open, the occupancy recount and close_open_visits.py. It only
+holds the visits in progress, so it stays small whatever the history. On
+PostgreSQL it also carries vendor_id and visited_company, so the occupancy
+recount is an index-only scan.
+
+Built like ix_visits_check_in_time_id: on a partitioned visits table the
+index is created ON ONLY the parent, built concurrently on each partition
+and attached, so writes are not blocked.
+
+Revision ID: e1f2a3b4c5d6
+Revises: d0e1f2a3b4c5
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1f2a3b4c5d6'
+down_revision: Union[str, None] = 'd0e1f2a3b4c5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OPEN = sa.text('check_out_time IS NULL')
+
+
+def _visit_partitions(bind):
+    return list(bind.execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'visits' AND p.relnamespace = current_schema()::regnamespace"
+    )).scalars())
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    partitions = _visit_partitions(bind) if bind.dialect.name == 'postgresql' else []
+    with op.get_context().autocommit_block():
+        if partitions:
+            op.execute('CREATE INDEX IF NOT EXISTS ix_visits_open ON ONLY visits (check_in_time, id) '
+                       'INCLUDE (vendor_id, visited_company) WHERE check_out_time IS NULL')
+            for partition in partitions:
+                op.create_index(f'{partition}_open_idx', partition, ['check_in_time', 'id'], unique=False,
+                                if_not_exists=True, postgresql_concurrently=True, postgresql_where=OPEN,
+                                postgresql_include=['vendor_id', 'visited_company'])
+                op.execute(f'ALTER INDEX ix_visits_open ATTACH PARTITION {partition}_open_idx')
+        else:
+            op.create_index('ix_visits_open', 'visits', ['check_in_time', 'id'], unique=False,
+                            if_not_exists=True, postgresql_concurrently=True, postgresql_where=OPEN,
+                            postgresql_include=['vendor_id', 'visited_company'], sqlite_where=OPEN)
+
+
+def downgrade() -> None:
+    # Dropping the parent index drops the attached partition indexes
+    op.drop_index('ix_visits_open', table_name='visits')
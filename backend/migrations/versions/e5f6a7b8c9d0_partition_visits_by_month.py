@@ -0,0 +1,143 @@
+"""partition_visits_by_month
+
+Adds visits_archive for closed visits moved out by archive_visits.py and, on
+PostgreSQL, rebuilds visits as a table range-partitioned by month of
+check_in_time: one partition per month from the oldest visit through three
+months ahead, plus a default partition. archive_visits.py keeps creating
+partitions ahead after that.
+
+The rebuild copies every row while holding an exclusive lock on visits, so
+run it in a maintenance window. Visits without a check-in time get the epoch
+(the partition key must be set). The primary key becomes (id, check_in_time),
+as PostgreSQL requires for partitioned tables; ids keep their sequence.
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from datetime import datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f6a7b8c9d0'
+down_revision: Union[str, None] = 'd4e5f6a7b8c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+VISIT_INDEXES = [
+    ('ix_visits_id', ['id'], {}),
+    ('ix_visits_vendor_id', ['vendor_id'], {}),
+    ('ix_visits_vendor_id_check_in_time', ['vendor_id', 'check_in_time'], {}),
+    ('ix_visits_purpose_trgm', ['purpose'], {'postgresql_using': 'gin', 'postgresql_ops': {'purpose': 'gin_trgm_ops'}}),
+]
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _create_archive_table(is_postgres):
+    op.create_table('visits_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('vendor_id', sa.Integer(), nullable=False),
+    sa.Column('agent_id', sa.Integer(), nullable=True),
+    sa.Column('check_in_time', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('check_out_time', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('check_in_latitude', sa.Float(), nullable=True),
+    sa.Column('check_in_longitude', sa.Float(), nullable=True),
+    sa.Column('check_out_latitude', sa.Float(), nullable=True),
+    sa.Column('check_out_longitude', sa.Float(), nullable=True),
+    sa.Column('area', sa.String(), nullable=True),
+    sa.Column('pincode', sa.String(), nullable=True),
+    sa.Column('city', sa.String(), nullable=True),
+    sa.Column('state', sa.String(), nullable=True),
+    sa.Column('check_in_location', sa.Text(), nullable=True),
+    sa.Column('check_out_location', sa.Text(), nullable=True),
+    sa.Column('check_in_selfie_url', sa.String(), nullable=True),
+    sa.Column('check_out_selfie_url', sa.String(), nullable=True),
+    sa.Column('purpose', sa.String(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_visits_archive_vendor_id_check_in_time', 'visits_archive', ['vendor_id', 'check_in_time'], unique=False)
+    if is_postgres:
+        op.create_index('ix_visits_archive_purpose_trgm', 'visits_archive', ['purpose'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'purpose': 'gin_trgm_ops'})
+
+
+def _partition_visits():
+    bind = op.get_bind()
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Keep the id sequence alive when the old table is dropped
+    op.execute('ALTER SEQUENCE visits_id_seq OWNED BY NONE')
+    op.execute('CREATE TABLE visits_partitioned (LIKE visits INCLUDING DEFAULTS) PARTITION BY RANGE (check_in_time)')
+
+    oldest = bind.execute(sa.text('SELECT min(check_in_time) FROM visits')).scalar()
+    now = datetime.now(timezone.utc)
+    month = (oldest or now).astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last = _add_months(now.replace(day=1, hour=0, minute=0, second=0, microsecond=0), MONTHS_AHEAD)
+    while month <= last:
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE visits_{month:%Y_%m} PARTITION OF visits_partitioned "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{upper:%Y-%m-%d} 00:00:00+00')"
+        )
+        month = upper
+    op.execute('CREATE TABLE visits_default PARTITION OF visits_partitioned DEFAULT')
+
+    columns = [c['name'] for c in sa.inspect(bind).get_columns('visits')]
+    select_list = ', '.join("COALESCE(check_in_time, 'epoch')" if c == 'check_in_time' else c for c in columns)
+    op.execute(f"INSERT INTO visits_partitioned ({', '.join(columns)}) SELECT {select_list} FROM visits")
+
+    op.execute('DROP TABLE visits')
+    op.execute('ALTER TABLE visits_partitioned RENAME TO visits')
+    op.execute('ALTER TABLE visits ADD CONSTRAINT visits_pkey PRIMARY KEY (id, check_in_time)')
+    op.execute('ALTER SEQUENCE visits_id_seq OWNED BY visits.id')
+    op.create_foreign_key('visits_vendor_id_fkey', 'visits', 'vendors', ['vendor_id'], ['id'])
+    op.create_foreign_key('visits_agent_id_fkey', 'visits', 'agents', ['agent_id'], ['id'])
+    for name, columns, kwargs in VISIT_INDEXES:
+        op.create_index(name, 'visits', columns, unique=False, **kwargs)
+
+
+def _unpartition_visits():
+    op.execute('ALTER SEQUENCE visits_id_seq OWNED BY NONE')
+    op.execute('CREATE TABLE visits_unpartitioned (LIKE visits INCLUDING DEFAULTS)')
+    op.execute('INSERT INTO visits_unpartitioned SELECT * FROM visits')
+    op.execute('DROP TABLE visits')  # drops every partition with it
+    op.execute('ALTER TABLE visits_unpartitioned RENAME TO visits')
+    op.execute('ALTER TABLE visits ALTER COLUMN check_in_time DROP NOT NULL')
+    op.execute('ALTER TABLE visits ADD CONSTRAINT visits_pkey PRIMARY KEY (id)')
+    op.execute('ALTER SEQUENCE visits_id_seq OWNED BY visits.id')
+    op.create_foreign_key('visits_vendor_id_fkey', 'visits', 'vendors', ['vendor_id'], ['id'])
+    op.create_foreign_key('visits_agent_id_fkey', 'visits', 'agents', ['agent_id'], ['id'])
+    for name, columns, kwargs in VISIT_INDEXES:
+        op.create_index(name, 'visits', columns, unique=False, **kwargs)
+
+
+def upgrade() -> None:
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+    _create_archive_table(is_postgres)
+    if is_postgres:
+        _partition_visits()
+
+
+def downgrade() -> None:
+    # Archived visits go back to the live table first
+    op.execute('INSERT INTO visits (id, vendor_id, agent_id, check_in_time, check_out_time, check_in_latitude, '
+               'check_in_longitude, check_out_latitude, check_out_longitude, area, pincode, city, state, '
+               'check_in_location, check_out_location, check_in_selfie_url, check_out_selfie_url, purpose) '
+               'SELECT id, vendor_id, agent_id, check_in_time, check_out_time, check_in_latitude, '
+               'check_in_longitude, check_out_latitude, check_out_longitude, area, pincode, city, state, '
+               'check_in_location, check_out_location, check_in_selfie_url, check_out_selfie_url, purpose '
+               'FROM visits_archive')
+    if op.get_bind().dialect.name == 'postgresql':
+        _unpartition_visits()
+    op.drop_table('visits_archive')
@@ -0,0 +1,49 @@
+"""unique_users_email_lower
+
+Login looks users up by lower(email), so two accounts whose emails differ
+only in case would both match and the user would get whichever row comes
+first. Replaces the plain ix_users_email_lower with the unique
+uq_users_email_lower, so such accounts can no longer be created.
+
+Existing case-insensitive duplicates have to be merged or renamed by hand
+first; the upgrade lists them and stops if there are any. Both indexes are
+built and dropped concurrently, and the old one is only dropped once the
+new one exists, so logins keep their index throughout.
+
+Revision ID: f2a3b4c5d6e7
+Revises: e1f2a3b4c5d6
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a3b4c5d6e7'
+down_revision: Union[str, None] = 'e1f2a3b4c5d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    duplicates = op.get_bind().execute(sa.text(
+        "SELECT lower(email), count(*) FROM users GROUP BY lower(email) HAVING count(*) > 1 ORDER BY 1"
+    )).all()
+    if duplicates:
+        listed = ", ".join(f"{email} ({count} accounts)" for email, count in duplicates)
+        raise RuntimeError(f"Emails registered more than once in different case, resolve them first: {listed}")
+
+    with op.get_context().autocommit_block():
+        op.create_index('uq_users_email_lower', 'users', [sa.text('lower(email)')], unique=True,
+                        if_not_exists=True, postgresql_concurrently=True)
+        op.drop_index('ix_users_email_lower', table_name='users', if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)')], unique=False,
+                        if_not_exists=True, postgresql_concurrently=True)
+        op.drop_index('uq_users_email_lower', table_name='users', if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,56 @@
+"""add_visits_keyset_indices
+
+(check_in_time, id) indexes for the keyset-paginated GET /visits.
+
+PostgreSQL cannot build an index CONCURRENTLY on a partitioned table, so on
+a partitioned visits table the index is created ON ONLY the parent (invalid
+until every partition has one), built concurrently on each partition and
+attached. Writes are not blocked at any point.
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6a7b8c9d0e1'
+down_revision: Union[str, None] = 'e5f6a7b8c9d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _visit_partitions(bind):
+    return list(bind.execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'visits' AND p.relnamespace = current_schema()::regnamespace"
+    )).scalars())
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    partitions = _visit_partitions(bind) if bind.dialect.name == 'postgresql' else []
+    with op.get_context().autocommit_block():
+        if partitions:
+            op.execute('CREATE INDEX IF NOT EXISTS ix_visits_check_in_time_id ON ONLY visits (check_in_time, id)')
+            for partition in partitions:
+                op.create_index(f'{partition}_check_in_time_id_idx', partition, ['check_in_time', 'id'], unique=False,
+                                if_not_exists=True, postgresql_concurrently=True)
+                op.execute(f'ALTER INDEX ix_visits_check_in_time_id ATTACH PARTITION {partition}_check_in_time_id_idx')
+        else:
+            op.create_index('ix_visits_check_in_time_id', 'visits', ['check_in_time', 'id'], unique=False,
+                            if_not_exists=True, postgresql_concurrently=True)
+        op.create_index('ix_visits_archive_check_in_time_id', 'visits_archive', ['check_in_time', 'id'], unique=False,
+                        if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_visits_archive_check_in_time_id', table_name='visits_archive')
+    # Dropping the parent index drops the attached partition indexes
+    op.drop_index('ix_visits_check_in_time_id', table_name='visits')
@@ -0,0 +1,59 @@
+"""
+Recompute the visit_daily_stats rollups from visits and visits_archive.
+
+Check-in and check-out keep the rollups current; run this after deploying
+the rollup migration, after bulk edits to visits, or whenever the numbers
+are in doubt. Each day range is rebuilt in one transaction. On PostgreSQL,
+check-ins wait for that transaction rather than being lost.
+
+Usage:
+    python rebuild_visit_stats.py [--since 2026-01-01] [--until 2026-02-01] [--days-per-batch 31]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(__file__))
+
+from sqlalchemy import func
+
+from app.core import database
+from app.models.visit import Visit
+from app.models.visit_archive import VisitArchive
+from app.services import visit_stats_service
+
+
+def history_bounds():
+    with database.unit_of_work() as db:
+        starts = [db.query(func.min(model.check_in_time)).scalar() for model in (Visit, VisitArchive)]
+    starts = [visit_stats_service.stat_day(s) for s in starts if s is not None]
+    today = datetime.now(timezone.utc).date()
+    return (min(starts) if starts else today), today + timedelta(days=1)
+
+
+def main(since, until, days_per_batch):
+    first, last = history_bounds()
+    since, until = since or first, until or last
+    print(f"Rebuilding visit rollups for {since} to {until} (exclusive)")
+
+    start, total = time.perf_counter(), 0
+    day = since
+    while day < until:
+        batch_end = min(day + timedelta(days=days_per_batch), until)
+        # Short transactions keep the rollup lock brief for concurrent check-ins
+        with database.unit_of_work() as db:
+            total += visit_stats_service.rebuild(db, day, batch_end)
+        print(f"  {day} .. {batch_end}: {total} rollup rows so far")
+        day = batch_end
+    print(f"Rebuilt {total} rollup rows in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", type=date.fromisoformat, help="first check-in day (default: oldest visit)")
+    parser.add_argument("--until", type=date.fromisoformat, help="day after the last one (default: tomorrow)")
+    parser.add_argument("--days-per-batch", type=int, default=31)
+    args = parser.parse_args()
+    main(args.since, args.until, args.days_per_batch)
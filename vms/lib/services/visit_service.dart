@@ -10,16 +10,31 @@ class VisitService extends ChangeNotifier {
   List<Visit> _pendingVisits = [];
   List<Visit> get pendingVisits => _pendingVisits;
 
+  // Largest page GET /visits/ serves (VISITS_PAGE_SIZE_MAX on the backend)
+  static const int _visitsPageSize = 500;
+
   Future<List<dynamic>?> getMyVisits(String token) async {
     try {
-      final response = await http.get(
-        Uri.parse('${ApiConstants.baseUrl}/visits/'),
-        headers: {'Authorization': 'Bearer $token'},
-      );
-      if (response.statusCode == 200) {
-        return json.decode(response.body);
-      }
-      return null;
+      // GET /visits/ is paged: follow X-Next-Cursor until the last page so
+      // callers still get the whole register
+      final visits = <dynamic>[];
+      String? cursor;
+      String? previous;
+      do {
+        previous = cursor;
+        final query = {'limit': '$_visitsPageSize', if (cursor != null) 'cursor': cursor};
+        final response = await http.get(
+          Uri.parse('${ApiConstants.baseUrl}/visits/').replace(queryParameters: query),
+          headers: {'Authorization': 'Bearer $token'},
+        );
+        if (response.statusCode != 200) {
+          return null;
+        }
+        visits.addAll(json.decode(response.body));
+        cursor = response.headers['x-next-cursor'];
+        // A cursor that doesn't advance would refetch the same page forever
+      } while (cursor != null && cursor.isNotEmpty && cursor != previous);
+      return visits;
     } catch (e) {
       debugPrint('Get visits error: $e');
       return null;